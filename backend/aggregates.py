@@ -0,0 +1,105 @@
+import threading
+from collections import Counter
+
+from storage import user_key
+
+
+class Aggregates:
+    """Counters for `/api/health` and `/api/stats`.
+
+    With a single-process storage (`JsonStorage`) users per role and
+    attendance per tanggal and per (mata_kuliah, tanggal) are rebuilt once
+    from storage at startup, streaming the attendance log one record at a
+    time, and then updated by a storage write listener, so reads are dict
+    lookups that never touch disk.
+
+    A storage shared by several worker processes (`storage.shared`, i.e.
+    SQLite) receives writes this process never sees, so in-process counters
+    would drift apart between workers; the counts are then read from the
+    storage's indexed COUNT queries instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._storage = None
+        self._reset()
+
+    def _reset(self):
+        self._user_roles = {}
+        self.users_by_role = Counter()
+        self.attendance_total = 0
+        self.by_date = Counter()
+        self.by_course_date = {}
+
+    def attach(self, storage):
+        """Rebuild from `storage` and follow its writes (call before serving)."""
+        if getattr(storage, 'shared', False):
+            self._storage = storage
+            return self
+        with self._lock:
+            self._reset()
+            self._add_users(storage.list_users())
+            self._add_attendance(storage.iter_attendance())
+        storage.add_listener(self.on_write)
+        return self
+
+    def on_write(self, kind, items):
+        with self._lock:
+            if kind == 'users':
+                self._add_users(items)
+            elif kind == 'attendance':
+                self._add_attendance(items)
+
+    def _add_users(self, users):
+        for user in users:
+            if not isinstance(user, dict):
+                continue
+            key = user_key(user)
+            old = self._user_roles.get(key, False)
+            role = user.get('role')
+            if old is not False:
+                self.users_by_role[old] -= 1
+            self._user_roles[key] = role
+            self.users_by_role[role] += 1
+
+    def _add_attendance(self, records):
+        for record in records:
+            tanggal = record.get('tanggal')
+            self.attendance_total += 1
+            self.by_date[tanggal] += 1
+            course = self.by_course_date.setdefault(record.get('mata_kuliah'), {})
+            day = course.get(tanggal)
+            if day is None:
+                day = course[tanggal] = {'hadir': 0, 'sessions': set()}
+            day['hadir'] += 1
+            if record.get('session_id'):
+                day['sessions'].add(record['session_id'])
+
+    # ---- reads ----
+    def count_users(self, role=None):
+        if self._storage is not None:
+            return self._storage.count_users(role)
+        if role is None:
+            return len(self._user_roles)
+        return self.users_by_role.get(role, 0)
+
+    def count_attendance(self, tanggal=None):
+        if self._storage is not None:
+            return self._storage.count_attendance(tanggal)
+        return self.attendance_total if tanggal is None else self.by_date.get(tanggal, 0)
+
+    def summary(self, tanggal=None, mata_kuliah=None):
+        """Per (mata_kuliah, tanggal): jumlah hadir dan jumlah sesi, terbaru dulu."""
+        if self._storage is not None:
+            return self._storage.attendance_summary(tanggal=tanggal, mata_kuliah=mata_kuliah)
+        with self._lock:
+            courses = [mata_kuliah] if mata_kuliah else list(self.by_course_date)
+            rows = []
+            for course in courses:
+                for day, counts in self.by_course_date.get(course, {}).items():
+                    if tanggal is not None and day != tanggal:
+                        continue
+                    rows.append({'mata_kuliah': course, 'tanggal': day,
+                                 'hadir': counts['hadir'], 'sesi': len(counts['sessions'])})
+        rows.sort(key=lambda r: (str(r['tanggal'] or ''), str(r['mata_kuliah'] or '')), reverse=True)
+        return rows
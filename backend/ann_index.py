@@ -0,0 +1,97 @@
+import numpy as np
+
+
+class IVFIndex:
+    """Inverted-file (IVF) approximate nearest-neighbour index, pure NumPy.
+
+    Gallery rows are bucketed by their nearest k-means centroid. A query only
+    scans the rows of its `n_probe` nearest buckets; the shortlist is then
+    re-ranked exactly by `FaceGallery`, so the tolerance check is unchanged
+    and only recall (not precision) depends on `n_probe`.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, train_sample=50, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.train_sample = train_sample
+        self.seed = seed
+        self.centroids = None
+        self._assign = np.empty((0,), dtype=np.int32)
+        self._size = 0
+        self._lists = None
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def _nearest_centroid(self, vectors):
+        c = self.centroids
+        d2 = (vectors * vectors).sum(axis=1)[:, None] + (c * c).sum(axis=1)[None, :] - 2.0 * (vectors @ c.T)
+        return np.argmin(d2, axis=1).astype(np.int32)
+
+    def train(self, matrix):
+        """Run k-means on (a sample of) the gallery and bucket every row."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        n = len(matrix)
+        if n == 0:
+            self.centroids = None
+            self._assign = np.empty((0,), dtype=np.int32)
+            self._size = 0
+            self._lists = None
+            return
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+        rng = np.random.default_rng(self.seed)
+
+        sample_size = min(n, n_lists * self.train_sample)
+        sample = matrix[rng.choice(n, sample_size, replace=False)] if sample_size < n else matrix
+        self.centroids = np.array(sample[rng.choice(len(sample), n_lists, replace=False)])
+        for _ in range(self.n_iter):
+            labels = self._nearest_centroid(sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, sample)
+            filled = counts > 0
+            self.centroids[filled] = sums[filled] / counts[filled, None]
+
+        self._assign = self._nearest_centroid(matrix)
+        self._size = n
+        self._lists = None
+
+    def add(self, row, vector):
+        """Bucket one (new or replaced) row."""
+        if not self.trained:
+            return
+        if row >= len(self._assign):
+            grown = np.empty((max(row + 1, len(self._assign) * 2),), dtype=np.int32)
+            grown[:len(self._assign)] = self._assign
+            self._assign = grown
+        self._assign[row] = self._nearest_centroid(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        self._size = max(self._size, row + 1)
+        self._lists = None
+
+    def move(self, src, dst):
+        """Row `src` was moved to `dst` and the last row dropped (swap-remove)."""
+        if not self.trained:
+            return
+        self._assign[dst] = self._assign[src]
+        self._size -= 1
+        self._lists = None
+
+    def _build_lists(self):
+        assign = self._assign[:self._size]
+        order = np.argsort(assign, kind='stable')
+        bounds = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1))
+        self._lists = (order, bounds)
+        return self._lists
+
+    def candidates(self, query, n_probe=None):
+        """Row ids in the `n_probe` buckets nearest to one query."""
+        order, bounds = self._lists or self._build_lists()
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        q = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        c = self.centroids
+        d2 = (c * c).sum(axis=1) - 2.0 * (c @ q[0])
+        probes = np.argpartition(d2, n_probe - 1)[:n_probe] if n_probe < len(c) else np.arange(len(c))
+        return np.concatenate([order[bounds[p]:bounds[p + 1]] for p in probes])
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left
+
+
+def _nama_key(nama):
+    return str(nama or '').replace('_', ' ').strip().lower()
+
+
+class AttendanceLog:
+    """Append-only JSON-lines attendance log with in-memory indexes.
+
+    Every check-in appends one line instead of rewriting the whole history.
+    At startup the log is streamed once to rebuild the indexes keyed by
+    (tanggal, nama), tanggal, session_id and mahasiswa_id, so the "sudah
+    absen hari ini" check is a set lookup. The records themselves stay on
+    disk: only the byte offset and length of every line are kept, and
+    queries read back the lines they return.
+    """
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._reset()
+        self._reader = None
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def _reset(self):
+        # Posisi record = urutan di log; index menyimpan posisi, bukan record
+        self._offsets = array('Q')
+        self._lengths = array('I')
+        self._attended = set()
+        self._by_date = {}
+        self._by_session = {}
+        self._by_mahasiswa = {}
+
+    def open(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                self._import_legacy()
+            self._reset()
+            offset = 0
+            line = b'\n'
+            with open(self.path, 'rb') as f:
+                for line_no, line in enumerate(f, 1):
+                    start, offset = offset, offset + len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        print(f"[WARN] {self.path}:{line_no} baris rusak dilewati")
+                        continue
+                    self._index(record, start, len(line))
+            if not line.endswith(b'\n'):
+                # Baris terakhir terpotong (crash saat menulis); mulai baris baru
+                with open(self.path, 'ab') as f:
+                    f.write(b'\n')
+            if self._reader is not None:
+                self._reader.close()
+            # Tanpa buffer: log hanya bertambah, tiap baca langsung dari file
+            self._reader = open(self.path, 'rb', buffering=0)
+        return self
+
+    def close(self):
+        with self._read_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def _import_legacy(self):
+        # Migrasi satu kali dari attendance.json (array JSON) ke log JSON-lines
+        records = []
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, 'r') as f:
+                    records = json.load(f) or []
+            except ValueError:
+                records = []
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        os.replace(tmp_path, self.path)
+        if records:
+            print(f"[INFO] {len(records)} absensi dipindahkan dari {self.legacy_path} ke {self.path}")
+
+    def _index(self, record, offset, length):
+        pos = len(self._offsets)
+        self._offsets.append(offset)
+        self._lengths.append(length)
+        tanggal = record.get('tanggal')
+        self._attended.add((tanggal, _nama_key(record.get('nama'))))
+        self._by_date.setdefault(tanggal, array('I')).append(pos)
+        if record.get('session_id'):
+            self._by_session.setdefault(record['session_id'], array('I')).append(pos)
+        if record.get('mahasiswa_id'):
+            self._by_mahasiswa.setdefault(record['mahasiswa_id'], array('I')).append(pos)
+
+    def _write(self, records):
+        lines = [(json.dumps(record) + '\n').encode() for record in records]
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            f.write(b''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        for record, line in zip(records, lines):
+            self._index(record, offset, len(line))
+            offset += len(line)
+
+    def _read(self, pos):
+        with self._read_lock:
+            self._reader.seek(self._offsets[pos])
+            line = self._reader.read(self._lengths[pos])
+        return json.loads(line)
+
+    def append(self, record):
+        """Persist one record (single appended line) and index it."""
+        with self._lock:
+            self._write([record])
+        return record
+
+    def append_many(self, records):
+        """Persist a batch with one write and one fsync (group commit)."""
+        if not records:
+            return 0
+        with self._lock:
+            self._write(records)
+        return len(records)
+
+    def has_attended(self, tanggal, nama):
+        return (tanggal, _nama_key(nama)) in self._attended
+
+    def by_date(self, tanggal):
+        return [self._read(i) for i in self._by_date.get(tanggal, ())]
+
+    def by_session(self, session_id):
+        return [self._read(i) for i in self._by_session.get(session_id, ())]
+
+    def by_mahasiswa(self, mahasiswa_id):
+        return [self._read(i) for i in self._by_mahasiswa.get(mahasiswa_id, ())]
+
+    def page(self, tanggal=None, before=None, limit=None, where=None):
+        """Newest-first records with log position < `before`.
+
+        Returns `(records, next_before)`; `next_before` is None on the last
+        page. `where(record)` filters without materializing the whole day.
+        """
+        positions = self._by_date.get(tanggal, ()) if tanggal is not None else range(len(self._offsets))
+        end = bisect_left(positions, before) if before is not None else len(positions)
+        found = []
+        for i in range(end - 1, -1, -1):
+            record = self._read(positions[i])
+            if where is not None and not where(record):
+                continue
+            if limit is not None and len(found) == limit:
+                return [r for _, r in found], found[-1][0]
+            found.append((positions[i], record))
+        return [r for _, r in found], None
+
+    def iter_dates(self, date_from=None, date_to=None):
+        """Yield records ordered by tanggal (then log order), read one at a time."""
+        # Snapshot di bawah lock: append paralel bisa menambah tanggal / posisi baru
+        with self._lock:
+            days = [(t, positions, len(positions)) for t, positions in self._by_date.items()
+                    if (date_from is None or (t is not None and t >= date_from))
+                    and (date_to is None or (t is not None and t <= date_to))]
+        days.sort(key=lambda day: day[0] or '')
+        for _, positions, count in days:
+            for i in range(count):
+                yield self._read(positions[i])
+
+    def count_on(self, tanggal):
+        return len(self._by_date.get(tanggal, []))
+
+    def all(self):
+        return [self._read(i) for i in range(len(self._offsets))]
@@ -0,0 +1,164 @@
+"""Streaming attendance exports and per-course presence matrices.
+
+Records are streamed from `storage.iter_attendance` through generators, so
+an export of a whole semester is written in chunks and never held in
+memory as one list:
+
+    python attendance_report.py export --format csv -o rekap.csv
+    python attendance_report.py presence "Basis Data" --from 2025-09-01 -o basis_data.csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from array import array
+
+import numpy as np
+
+from storage import courses_of, nama_key
+
+EXPORT_COLUMNS = ('tanggal', 'waktu', 'mata_kuliah', 'session_id', 'mahasiswa_id', 'nama', 'dosen', 'status')
+# Ukuran potongan yang dikirim per yield (CSV / JSON-lines)
+CHUNK_BYTES = 64 * 1024
+
+
+def csv_chunks(records, columns=EXPORT_COLUMNS):
+    """CSV text of `records` in chunks of about CHUNK_BYTES."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for record in records:
+        writer.writerow([record.get(column, '') for column in columns])
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_chunks(records):
+    """One JSON object per line, in chunks of about CHUNK_BYTES."""
+    lines, size = [], 0
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield ''.join(lines)
+            lines, size = [], 0
+    yield ''.join(lines)
+
+
+def _student_key(record):
+    return record.get('mahasiswa_id') or nama_key(record.get('nama'))
+
+
+def course_roster(storage, mata_kuliah):
+    """Mahasiswa yang terdaftar di `mata_kuliah` (dipakai endpoint dan CLI, agar rekapnya sama)."""
+    course = nama_key(mata_kuliah)
+    return [u for u in storage.list_users('mahasiswa') if course in courses_of(u)]
+
+
+class PresenceMatrix:
+    """Students x dates boolean matrix of one course.
+
+    Built in a single pass: each record only appends two int32 indexes, and
+    the matrix is filled with one NumPy fancy-indexing assignment. Students
+    from `roster` (list of user records) appear even if never present.
+    """
+
+    def __init__(self, records, roster=()):
+        index, self.student_ids, self.names = {}, [], []
+        for user in roster:
+            key = user.get('id') or nama_key(user.get('nama'))
+            if key not in index:
+                index[key] = len(self.student_ids)
+                self.student_ids.append(key)
+                self.names.append(user.get('nama'))
+        dates = {}
+        rows, cols = array('i'), array('i')
+        for record in records:
+            key = _student_key(record)
+            row = index.get(key)
+            if row is None:
+                row = index[key] = len(self.student_ids)
+                self.student_ids.append(key)
+                self.names.append(record.get('nama'))
+            rows.append(row)
+            cols.append(dates.setdefault(record.get('tanggal'), len(dates)))
+
+        self.dates = sorted(dates, key=lambda t: t or '')
+        column_of = np.empty(len(dates), dtype=np.intp)
+        for position, tanggal in enumerate(self.dates):
+            column_of[dates[tanggal]] = position
+        self.matrix = np.zeros((len(self.student_ids), len(self.dates)), dtype=bool)
+        if len(rows):
+            self.matrix[np.frombuffer(rows, dtype=np.intc), column_of[np.frombuffer(cols, dtype=np.intc)]] = True
+
+    def totals(self):
+        return self.matrix.sum(axis=1)
+
+    def to_dict(self):
+        totals = self.totals()
+        meetings = len(self.dates)
+        return {
+            'tanggal': self.dates,
+            'mahasiswa': [
+                {'id': sid, 'nama': nama, 'hadir': int(total),
+                 'persen': round(100.0 * total / meetings, 1) if meetings else 0.0,
+                 'kehadiran': row.astype(int).tolist()}
+                for sid, nama, total, row in zip(self.student_ids, self.names, totals, self.matrix)
+            ]
+        }
+
+    def csv_chunks(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['id', 'nama'] + self.dates + ['hadir', 'persen'])
+        meetings = len(self.dates)
+        for sid, nama, total, row in zip(self.student_ids, self.names, self.totals(), self.matrix):
+            persen = round(100.0 * total / meetings, 1) if meetings else 0.0
+            writer.writerow([sid, nama] + row.astype(int).tolist() + [int(total), persen])
+            if buffer.tell() >= CHUNK_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+
+if __name__ == '__main__':
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description='Ekspor rekap absensi')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--storage', default=os.environ.get('ABSEN_STORAGE', 'json'), choices=['json', 'sqlite'])
+    parser.add_argument('-o', '--output', help='file tujuan (default: stdout)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='semua record absensi (CSV / JSON-lines)')
+    export.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    export.add_argument('--mata-kuliah')
+    presence = commands.add_parser('presence', help='matriks mahasiswa x tanggal satu mata kuliah (CSV)')
+    presence.add_argument('mata_kuliah')
+    for command in (export, presence):
+        command.add_argument('--from', dest='date_from', help='tanggal awal (YYYY-MM-DD)')
+        command.add_argument('--to', dest='date_to', help='tanggal akhir (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    storage = create_storage(args.storage, args.data_dir).open()
+    if args.command == 'export':
+        records = storage.iter_attendance(args.mata_kuliah, args.date_from, args.date_to)
+        chunks = csv_chunks(records) if args.format == 'csv' else jsonl_chunks(records)
+    else:
+        records = storage.iter_attendance(args.mata_kuliah, args.date_from, args.date_to)
+        chunks = PresenceMatrix(records, course_roster(storage, args.mata_kuliah)).csv_chunks()
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+            print(f"[OK] Rekap ditulis ke {args.output}")
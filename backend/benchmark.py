@@ -0,0 +1,412 @@
+"""Reproducible benchmarks for the recognition and storage hot paths.
+
+    python benchmark.py [--users 10000] [--attendance 100000] [--storage json|sqlite]
+                        [--requests 200] [--concurrency 1] [--real]
+                        [-o hasil.json] [--compare baseline.json]
+
+A synthetic dataset (N users with random 128-d encodings spread over a few
+courses, M attendance rows over a semester of dates) is generated in a
+temporary working directory with the regular storage / embedding store
+classes, then the backend is imported there and measured:
+
+- `load_known_faces`, gallery matching (single and batched queries),
+- storage: user upsert (JSON rewrite), group commit, list / stream,
+- endpoints through the Flask test client (latency percentiles and
+  throughput, optionally from several threads).
+
+By default `face_recognition` / `dlib` are replaced by a deterministic stub
+(the identity is encoded in the first pixel of each synthetic PNG), so
+storage and matching are measured without the model and inference runs
+inline. `--real` uses the installed model with the worker pool and the
+photos in `data_wajah/`. Results are written as JSON; `--compare` prints the
+change of every p50 against an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import date, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_FACES_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'data_wajah')
+COURSES = ['Basis Data', 'Kecerdasan Buatan', 'Pemrograman Mobile', 'Algoritma Pemrograman']
+IMAGE_SHAPE = (240, 320, 3)
+# Perubahan p50 di atas ambang ini ditandai sebagai regresi oleh --compare
+REGRESSION_RATIO = 1.2
+
+
+# ---- synthetic data ----
+
+def synthetic_encodings(n, seed=0):
+    # Skala seperti benchmark_ann: orang berbeda berjarak ~0.9
+    return np.random.default_rng(seed).normal(0, 0.056, size=(n, 128)).astype(np.float32)
+
+
+def synthetic_user(i, row=None):
+    user = {
+        'id': f'M{i:06d}',
+        'nama': f'Mahasiswa {i}',
+        'nim': f'{20250000 + i}',
+        'email': f'mhs{i}@kampus.id',
+        'role': 'mahasiswa',
+        'mata_kuliah': [COURSES[i % len(COURSES)]],
+    }
+    if row is not None:
+        user['encoding_row'] = row
+    return user
+
+
+def generate_data(storage, embedding_store, n_users, n_attendance, seed=0, days=100, chunk=5000):
+    """Fill `storage` / `embedding_store` with `n_users` users and `n_attendance` rows."""
+    encodings = synthetic_encodings(n_users, seed)
+    for start in range(0, n_users, chunk):
+        ids = range(start, min(start + chunk, n_users))
+        rows = embedding_store.put_many([(f'M{i:06d}', encodings[i]) for i in ids])
+        storage.save_users([synthetic_user(i, row) for i, row in zip(ids, rows)])
+
+    rng = np.random.default_rng(seed + 1)
+    first_day = date(2025, 9, 1)
+    records = []
+    for k in range(n_attendance):
+        i = int(rng.integers(0, n_users)) if n_users else k
+        course = COURSES[i % len(COURSES)]
+        day = first_day + timedelta(days=int(rng.integers(0, days)))
+        records.append({
+            'id': f'A{k:08d}',
+            'mahasiswa_id': f'M{i:06d}',
+            'nama': f'Mahasiswa {i}',
+            'mata_kuliah': course,
+            'session_id': f'S{day:%m%d}{COURSES.index(course)}',
+            'dosen': 'Dr. Benchmark',
+            'tanggal': day.isoformat(),
+            'waktu': f'{8 + k % 8:02d}:{k % 60:02d}:00',
+            'status': 'hadir'
+        })
+        if len(records) == chunk:
+            storage.commit_batch(records, {})
+            records = []
+    if records:
+        storage.commit_batch(records, {})
+    return encodings
+
+
+def synthetic_image(identity, variant=0):
+    """PNG of random texture (bright and sharp enough for the frame filter)
+    with `identity` stored in the first pixel for the stub encoder."""
+    import cv2
+    rng = np.random.default_rng(variant)
+    rgb = rng.integers(60, 200, size=IMAGE_SHAPE, dtype=np.uint8)
+    rgb[0, 0] = ((identity >> 16) & 255, (identity >> 8) & 255, identity & 255)
+    rgb[0, 1] = (variant & 255, (variant >> 8) & 255, 0)
+    ok, png = cv2.imencode('.png', cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+    return png.tobytes()
+
+
+# ---- face_recognition stub ----
+
+def install_stub(encodings, noise=0.02):
+    """Register stub `face_recognition`, `face_recognition.api` and `dlib`
+    modules: every image has one face covering it, whose encoding is the
+    synthetic encoding of the identity in its first pixel plus noise."""
+    def identity_of(img):
+        r, g, b = (int(v) for v in img[0, 0])
+        return (r << 16) | (g << 8) | b, int(img[0, 1, 0]) | (int(img[0, 1, 1]) << 8)
+
+    def encoding_of(img):
+        identity, variant = identity_of(img)
+        base = encodings[identity % len(encodings)] if len(encodings) else np.zeros(128, np.float32)
+        return base + np.random.default_rng(variant).normal(0, noise, 128).astype(np.float32)
+
+    def face_locations(img, number_of_times_to_upsample=1, model='hog'):
+        return [(0, img.shape[1], img.shape[0], 0)]
+
+    def face_encodings(img, known_face_locations=None, *args, **kwargs):
+        locations = face_locations(img) if known_face_locations is None else known_face_locations
+        return [encoding_of(img) for _ in locations]
+
+    class FaceEncoder:
+        def compute_face_descriptor(self, images, faces, jitter=1):
+            return [[encoding_of(img) for _ in detections] for img, detections in zip(images, faces)]
+
+    api = types.ModuleType('face_recognition.api')
+    api._raw_face_landmarks = lambda img, locations, model='small': [None for _ in locations]
+    api.face_encoder = FaceEncoder()
+    module = types.ModuleType('face_recognition')
+    module.face_locations = face_locations
+    module.face_encodings = face_encodings
+    module.api = api
+    dlib = types.ModuleType('dlib')
+    dlib.full_object_detections = list
+    sys.modules.update({'face_recognition': module, 'face_recognition.api': api, 'dlib': dlib})
+
+
+# ---- measurement ----
+
+def summarize(latencies, wall, errors=0):
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    if not len(ms):
+        return {'n': 0, 'errors': errors, 'mean_ms': None, 'p50_ms': None, 'p95_ms': None,
+                'p99_ms': None, 'max_ms': None, 'throughput_per_s': None}
+    return {
+        'n': int(len(ms)),
+        'errors': errors,
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+        'throughput_per_s': round(len(ms) / wall, 1) if wall > 0 else None,
+    }
+
+
+def _failed(result):
+    """True for an HTTP response outside 2xx; any other result counts as success."""
+    status = getattr(result, 'status_code', None)
+    return status is not None and not 200 <= status < 300
+
+
+def measure(fn, n, warmup=1, concurrency=1):
+    """Call `fn(i)` n times (from `concurrency` threads); latency stats.
+
+    Calls that return a non-2xx response are counted in `errors` and left
+    out of the latency stats (a fast 4xx would otherwise look like a speedup).
+    """
+    for i in range(warmup):
+        fn(-1 - i)
+    latencies = [None] * n
+    counter = iter(range(n))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            result = fn(i)
+            if not _failed(result):
+                latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    ok = [t for t in latencies if t is not None]
+    return summarize(ok, time.perf_counter() - start, errors=n - len(ok))
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# ---- suite ----
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='absen-bench-')
+    cwd = os.getcwd()
+    os.environ['ABSEN_STORAGE'] = args.storage
+    os.environ['ABSEN_INFERENCE_WORKERS'] = str(args.workers if args.real else 0)
+    results = {}
+    try:
+        os.chdir(workdir)
+        from embedding_store import EmbeddingStore
+        from storage import create_storage
+
+        start = time.perf_counter()
+        storage = create_storage(args.storage, 'data', os.path.join('data', 'absensi.db')).open()
+        store = EmbeddingStore(os.path.join('data', 'embeddings.f32'),
+                               os.path.join('data', 'embeddings_index.json')).open()
+        encodings = generate_data(storage, store, args.users, args.attendance, seed=args.seed)
+        generate_s = time.perf_counter() - start
+        if hasattr(storage, 'close'):
+            storage.close()
+        print(f"[INFO] Data sintetis: {args.users} user, {args.attendance} absensi ({generate_s:.1f}s)")
+
+        images = []
+        if args.real:
+            if os.path.isdir(SAMPLE_FACES_DIR):
+                shutil.copytree(SAMPLE_FACES_DIR, 'data_wajah')
+                for name in sorted(os.listdir('data_wajah')):
+                    with open(os.path.join('data_wajah', name), 'rb') as f:
+                        images.append(f.read())
+            if not images:
+                raise SystemExit(f"[ERROR] Mode --real butuh foto di {SAMPLE_FACES_DIR}")
+        else:
+            install_stub(encodings)
+
+        import flask_api_backend as backend
+        app = backend.create_app(background=False)
+        results['load_known_faces'] = measure(lambda i: backend.load_known_faces(), args.repeat, warmup=0)
+        gallery = backend.gallery
+        print(f"[INFO] Gallery: {len(gallery)} wajah")
+
+        # ---- matching ----
+        rng = np.random.default_rng(args.seed + 2)
+        truth = rng.integers(0, max(len(encodings), 1), size=args.requests)
+        queries = (encodings[truth] + rng.normal(0, 0.035, size=(args.requests, 128))).astype(np.float32) \
+            if len(encodings) else rng.normal(0, 0.056, size=(args.requests, 128)).astype(np.float32)
+        results['gallery_match_1'] = measure(lambda i: gallery.match([queries[i]]), args.requests)
+        batch = queries[:64]
+        results['gallery_match_batch64'] = measure(lambda i: gallery.match(batch), max(args.requests // 10, 1))
+        results['gallery_verify'] = measure(
+            lambda i: gallery.verify(f'M{int(truth[i]):06d}', queries[i]), args.requests)
+
+        # ---- storage ----
+        storage = backend.storage
+        user_ids = rng.integers(0, max(args.users, 1), size=args.requests)
+        results['storage_save_user'] = measure(
+            lambda i: storage.save_user(synthetic_user(int(user_ids[i]))), max(args.requests // 10, 1))
+        results['storage_list_users'] = measure(lambda i: storage.list_users('mahasiswa'), args.repeat)
+        results['storage_commit_batch64'] = measure(lambda i: storage.commit_batch(
+            [{'id': f'B{i}_{k}', 'nama': f'Mahasiswa {k}', 'tanggal': '2026-01-01', 'mata_kuliah': COURSES[0]}
+             for k in range(64)], {}), max(args.requests // 10, 1))
+        results['storage_iter_attendance'] = measure(
+            lambda i: sum(1 for _ in storage.iter_attendance()), args.repeat, warmup=0)
+
+        # ---- endpoints ----
+        client = app.test_client()
+        get = lambda url: (lambda i: client.get(url))
+        tanggal = (date(2025, 9, 1) + timedelta(days=10)).isoformat()
+        endpoints = {
+            'GET /api/health': get('/api/health'),
+            'GET /api/stats': get('/api/stats'),
+            'GET /api/users?limit=100': get('/api/users?limit=100'),
+            'GET /api/attendance?date': get(f'/api/attendance?date={tanggal}'),
+            'GET /api/attendance/summary': get('/api/attendance/summary'),
+        }
+
+        def image_for(i):
+            if args.real:
+                return images[i % len(images)]
+            return synthetic_image(int(truth[i % len(truth)]), variant=i % 65536)
+
+        payloads = [image_for(i) for i in range(args.requests)]
+
+        def recognize(i):
+            backend.recognition_cache.clear()
+            return client.post('/api/recognize', data=payloads[i], content_type='image/png')
+        endpoints['POST /api/recognize'] = recognize
+        endpoints['POST /api/recognize (cached)'] = \
+            lambda i: client.post('/api/recognize', data=payloads[0], content_type='image/png')
+
+        if not args.real:
+            session = backend.session_registry.start('D-bench', 'Dr. Benchmark', COURSES[0])
+            barcode = backend.session_registry.barcode_data(session['session_id'])[0]
+            roster = [int(t) for t in truth if int(t) % len(COURSES) == 0] or [0]
+            # (mahasiswa, foto wajahnya): id yang diklaim selalu cocok dengan wajah di foto,
+            # juga untuk probe fn(-1)
+            checkins = [(roster[i % len(roster)], synthetic_image(roster[i % len(roster)], variant=i % 65536))
+                        for i in range(args.requests)]
+
+            def checkin(i):
+                mahasiswa, payload = checkins[i % len(checkins)]
+                return client.post('/api/mahasiswa/attendance', query_string={
+                    'mahasiswa_id': f'M{mahasiswa:06d}', 'session_id': session['session_id'],
+                    'barcode_data': barcode}, data=payload, content_type='image/png')
+            endpoints['POST /api/mahasiswa/attendance'] = checkin
+
+        for name, fn in endpoints.items():
+            response = fn(-1)
+            body = response.get_json(silent=True) or {}
+            if response.status_code >= 400 or body.get('success') is False:
+                print(f"[WARN] {name} -> HTTP {response.status_code}: {body.get('message')}")
+            results[name] = measure(fn, args.requests, warmup=0, concurrency=args.concurrency)
+            if results[name]['errors']:
+                print(f"[WARN] {name}: {results[name]['errors']} dari {args.requests} request bukan 2xx")
+        backend.inference_engine.shutdown()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'mode': 'real' if args.real else 'stub',
+            'storage': args.storage,
+            'users': args.users,
+            'attendance': args.attendance,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+            'generate_s': round(generate_s, 2),
+        },
+        'results': results,
+    }
+
+
+def print_table(report):
+    print(f"{'benchmark':<36}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}{'gagal':>8}")
+    for name, r in report['results'].items():
+        if not r['n']:
+            print(f"{name:<36}{'-':>10}{'-':>10}{'-':>10}{'-':>10}{r['errors']:>8}")
+            continue
+        print(f"{name:<36}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{(r['throughput_per_s'] or 0):>10.1f}{r['errors']:>8}")
+
+
+def compare(report, baseline):
+    """Print p50 of `report` against `baseline`; returns names that regressed."""
+    regressions = []
+    print(f"{'benchmark':<36}{'baseline':>10}{'now':>10}{'ratio':>8}")
+    for name, r in report['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old or not old.get('p50_ms') or not r['p50_ms']:
+            continue
+        ratio = r['p50_ms'] / old['p50_ms']
+        flag = '  [WARN] regresi' if ratio > REGRESSION_RATIO else ''
+        if flag:
+            regressions.append(name)
+        print(f"{name:<36}{old['p50_ms']:>10.2f}{r['p50_ms']:>10.2f}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark jalur pengenalan dan storage')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--attendance', type=int, default=100000)
+    parser.add_argument('--storage', default='json', choices=['json', 'sqlite'])
+    parser.add_argument('--requests', type=int, default=200, help='jumlah request / query per benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='pengulangan benchmark yang lambat (load, list)')
+    parser.add_argument('--concurrency', type=int, default=1, help='thread klien untuk benchmark endpoint')
+    parser.add_argument('--real', action='store_true', help='model face_recognition asli + foto data_wajah/')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker inference (mode --real)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='tulis hasil JSON ke file ini')
+    parser.add_argument('--compare', help='hasil JSON sebelumnya untuk dibandingkan')
+    args = parser.parse_args()
+
+    report = run(args)
+    print_table(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[OK] Hasil ditulis ke {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(report, json.load(f))
+        if regressed:
+            sys.exit(1)
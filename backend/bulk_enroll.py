@@ -0,0 +1,331 @@
+"""Bulk enrollment of students from a photo archive + CSV.
+
+The archive (zip or tar, optionally compressed) holds one photo per
+student; the CSV has the columns nama, nim, email and optionally foto
+(file name inside the archive), password and mata_kuliah (courses
+separated by ';', used to scope sessions). Without a foto column the
+photo is looked up as `<nim>.jpg` / `<nim>.png` or by the local part of
+the email.
+
+Photos are decoded in a thread pool and encoded in parallel across the
+inference workers. Each chunk is written with one embedding store write
+and one `save_users` call, and progress is checkpointed to a JSON file so
+an interrupted job resumes where it stopped:
+
+    python bulk_enroll.py foto.zip [daftar.csv] [--data-dir data] [--job-id ID]
+"""
+import argparse
+import csv
+import io
+import os
+import tarfile
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from embedding_store import embedding_key
+from frame_quality import FrameRejected
+from image_pipeline import DECODE_MAX_DIM, DETECT_MAX_DIM, decode_image_bytes
+from storage import load_json_data, save_json_data
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class PhotoBundle:
+    """Read-only view of an enrollment archive; photos are read lazily."""
+
+    def __init__(self, archive, csv_file=None):
+        if isinstance(archive, (str, os.PathLike)):
+            archive = open(archive, 'rb')
+        self._file = archive
+        if zipfile.is_zipfile(archive):
+            archive.seek(0)
+            self._zip = zipfile.ZipFile(archive)
+            self._tar = None
+            members = {name: name for name in self._zip.namelist() if not name.endswith('/')}
+        else:
+            archive.seek(0)
+            self._zip = None
+            self._tar = tarfile.open(fileobj=archive, mode='r:*')
+            members = {m.name: m for m in self._tar.getmembers() if m.isfile()}
+
+        self._photos = {}
+        csv_member = None
+        for name, member in members.items():
+            base = os.path.basename(name).lower()
+            stem, ext = os.path.splitext(base)
+            if ext in IMAGE_EXTENSIONS:
+                self._photos.setdefault(base, member)
+                self._photos.setdefault(stem, member)
+            elif ext == '.csv' and csv_member is None:
+                csv_member = member
+
+        if csv_file is None:
+            if csv_member is None:
+                raise ValueError("File CSV tidak ditemukan di dalam arsip")
+            csv_text = self._read_member(csv_member).decode('utf-8-sig')
+        elif isinstance(csv_file, (str, os.PathLike)):
+            with open(csv_file, 'r', encoding='utf-8-sig') as f:
+                csv_text = f.read()
+        else:
+            data = csv_file.read()
+            csv_text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+        self.rows = [
+            {(k or '').strip().lower(): (v or '').strip() for k, v in row.items()}
+            for row in csv.DictReader(io.StringIO(csv_text))
+        ]
+
+    def _read_member(self, member):
+        if self._zip is not None:
+            return self._zip.read(member)
+        f = self._tar.extractfile(member)
+        return f.read() if f is not None else None
+
+    def photo_of(self, row):
+        """Raw bytes of the photo for a CSV row, or None if it is missing."""
+        candidates = [row.get('foto'), row.get('nim'), (row.get('email') or '').split('@')[0]]
+        for name in candidates:
+            if not name:
+                continue
+            name = os.path.basename(name).lower()
+            member = self._photos.get(name) or self._photos.get(os.path.splitext(name)[0])
+            if member is not None:
+                return self._read_member(member)
+        return None
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _largest_face(locations, encodings):
+    areas = [(bottom - top) * (right - left) for top, right, bottom, left in locations]
+    return encodings[areas.index(max(areas))] if len(areas) == len(encodings) else encodings[0]
+
+
+class BulkEnroller:
+    """Enroll many students in chunks, checkpointing progress per chunk.
+
+    A job holds at most `max_slots` of the engine's inference slots (by
+    default half of `max_pending`), so live registrations and check-ins on
+    the same engine keep the rest while an import runs.
+    """
+
+    def __init__(self, storage, embedding_store, engine, frame_filter=None, chunk_size=64,
+                 decode_threads=4, model='hog', upsample=1, max_slots=None):
+        self.storage = storage
+        self.embedding_store = embedding_store
+        self.engine = engine
+        self.max_slots = max_slots or max(1, engine.max_pending // 2)
+        self.frame_filter = frame_filter
+        self.chunk_size = chunk_size
+        self.decode_threads = decode_threads
+        self.model = model
+        self.upsample = upsample
+        self.progress = None
+        self.enrolled = []
+
+    @staticmethod
+    def new_progress(job_id, total):
+        now = datetime.now().isoformat()
+        return {
+            'job_id': job_id,
+            'status': 'running',
+            'total': total,
+            'processed': 0,
+            'enrolled': [],
+            'failed': {},
+            'skipped': {},
+            'started_at': now,
+            'updated_at': now,
+        }
+
+    def _save_progress(self, progress_path):
+        progress = self.progress
+        progress['processed'] = len(progress['enrolled']) + len(progress['failed']) + len(progress['skipped'])
+        progress['updated_at'] = datetime.now().isoformat()
+        if progress_path:
+            save_json_data(progress_path, progress)
+
+    def _encode(self, images):
+        """Detect + encode `images` split over the inference workers, within `max_slots`."""
+        reserve = max(0, self.engine.max_pending - self.max_slots)
+        # wait=None: tunggu slot dilepas (tanpa polling) alih-alih EngineBusy
+        futures = [self.engine.submit_batch(images[start:stop], model=self.model, upsample=self.upsample,
+                                            wait=None, reserve=reserve)
+                   for start, stop in self.engine.split_batch(len(images), self.max_slots)]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def _decode(self, data):
+        if data is None:
+            return None, 'foto_tidak_ditemukan'
+        rgb = decode_image_bytes(data, max_dim=DECODE_MAX_DIM)
+        if rgb is None:
+            return None, 'gambar_tidak_valid'
+        if self.frame_filter is not None:
+            try:
+                self.frame_filter.check_image(rgb)
+            except FrameRejected as e:
+                return None, e.reason
+        return rgb, None
+
+    def run(self, bundle, progress_path=None, job_id=None, update_existing=False, on_progress=None,
+            on_chunk=None):
+        """Enroll every CSV row of `bundle`.
+
+        Rows already enrolled or skipped according to the progress file are
+        not processed again (failed rows are retried). Existing users (by
+        email) are skipped unless `update_existing`. `on_chunk` receives the
+        `(user, encoding)` pairs of every chunk as soon as it is stored, so
+        the caller can update the gallery while the job runs. Returns all
+        pairs enrolled in this run.
+        """
+        progress = load_json_data(progress_path) if progress_path and os.path.exists(progress_path) else None
+        if not isinstance(progress, dict) or 'enrolled' not in progress:
+            progress = self.new_progress(job_id or uuid.uuid4().hex[:12], len(bundle.rows))
+        progress['status'] = 'running'
+        self.progress = progress
+        done = set(progress['enrolled']) | set(progress['skipped'])
+
+        existing = {}
+        for user in self.storage.list_users():
+            email = str(user.get('email', '')).lower()
+            if email:
+                existing.setdefault(email, user)
+
+        todo = []
+        seen = set()
+        for line, row in enumerate(bundle.rows, start=2):
+            email = row.get('email', '').lower()
+            if not email or not row.get('nama'):
+                progress['failed'][email or f"baris_{line}"] = 'data_tidak_lengkap'
+                continue
+            if email in done:
+                continue
+            if email in seen:
+                progress['skipped'][email] = 'duplikat_di_csv'
+                continue
+            seen.add(email)
+            if email in existing and not update_existing:
+                progress['skipped'][email] = 'sudah_terdaftar'
+                continue
+            progress['failed'].pop(email, None)
+            todo.append(row)
+        self._save_progress(progress_path)
+
+        self.enrolled = enrolled = []
+        with ThreadPoolExecutor(max_workers=self.decode_threads) as pool:
+            for start in range(0, len(todo), self.chunk_size):
+                chunk = todo[start:start + self.chunk_size]
+                # Baca arsip berurutan (tarfile tidak thread-safe), decode paralel
+                photos = [bundle.photo_of(row) for row in chunk]
+                decoded = list(pool.map(self._decode, photos))
+                ready = [(row, rgb) for row, (rgb, error) in zip(chunk, decoded) if rgb is not None]
+                for row, (rgb, error) in zip(chunk, decoded):
+                    if error:
+                        progress['failed'][row['email'].lower()] = error
+
+                results = self._encode([rgb for _, rgb in ready]) if ready else []
+                users, encodings = [], []
+                for (row, _), result in zip(ready, results):
+                    email = row['email'].lower()
+                    if isinstance(result, FrameRejected):
+                        progress['failed'][email] = 'wajah_tidak_terdeteksi' if result.reason == 'no_face' \
+                            else result.reason
+                        continue
+                    locations, face_encodings = result
+                    if not len(face_encodings):
+                        progress['failed'][email] = 'wajah_tidak_terdeteksi'
+                        continue
+                    user = dict(existing[email]) if email in existing else {
+                        'id': f"M{uuid.uuid4().hex[:8]}",
+                        'email': row['email'],
+                        'role': 'mahasiswa',
+                        'created_at': datetime.now().isoformat(),
+                    }
+                    user['nama'] = row['nama']
+                    if row.get('nim'):
+                        user['nim'] = row['nim']
+                    if row.get('password'):
+                        user['password'] = row['password']
+                    if row.get('mata_kuliah'):
+                        user['mata_kuliah'] = [c.strip() for c in row['mata_kuliah'].split(';') if c.strip()]
+                    users.append(user)
+                    encodings.append(_largest_face(locations, face_encodings))
+
+                if users:
+                    # Satu tulis ke embedding store + satu save_users per chunk
+                    rows = self.embedding_store.put_many([(embedding_key(u), e) for u, e in zip(users, encodings)])
+                    for user, row in zip(users, rows):
+                        user['encoding_row'] = row
+                        user.pop('encoding', None)
+                    self.storage.save_users(users)
+                    progress['enrolled'].extend(u['email'].lower() for u in users)
+                    enrolled.extend(zip(users, encodings))
+                    if on_chunk:
+                        on_chunk(list(zip(users, encodings)))
+                self._save_progress(progress_path)
+                if on_progress:
+                    on_progress(progress)
+
+        progress['status'] = 'done'
+        self._save_progress(progress_path)
+        return enrolled
+
+
+if __name__ == '__main__':
+    from embedding_store import EmbeddingStore
+    from frame_quality import FrameFilter
+    from inference_engine import InferenceEngine
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description='Registrasi wajah mahasiswa secara massal')
+    parser.add_argument('archive', help='arsip zip/tar berisi foto (dan CSV)')
+    parser.add_argument('csv', nargs='?', help='CSV nama,nim,email[,foto,password] (default: CSV di dalam arsip)')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--storage', default=os.environ.get('ABSEN_STORAGE', 'json'), choices=['json', 'sqlite'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--job-id', help='lanjutkan job sebelumnya (progress di data/bulk_jobs/<job-id>.json)')
+    parser.add_argument('--update-existing', action='store_true', help='perbarui wajah user yang sudah terdaftar')
+    args = parser.parse_args()
+
+    storage = create_storage(args.storage, args.data_dir).open()
+    store = EmbeddingStore(os.path.join(args.data_dir, 'embeddings.f32'),
+                           os.path.join(args.data_dir, 'embeddings_index.json')).open()
+    frame_filter = FrameFilter()
+    engine = InferenceEngine(workers=args.workers, detect_max_dim=DETECT_MAX_DIM, frame_filter=frame_filter).start()
+    # CLI: tidak ada request live di engine ini, job boleh memakai semua slot
+    enroller = BulkEnroller(storage, store, engine, frame_filter=frame_filter, chunk_size=max(64, args.workers * 8),
+                            max_slots=engine.max_pending)
+    job_id = args.job_id or uuid.uuid4().hex[:12]
+    jobs_dir = os.path.join(args.data_dir, 'bulk_jobs')
+    os.makedirs(jobs_dir, exist_ok=True)
+
+    def report(progress):
+        print(f"[INFO] {progress['processed']}/{progress['total']} diproses, "
+              f"{len(progress['enrolled'])} terdaftar, {len(progress['failed'])} gagal")
+
+    try:
+        with PhotoBundle(args.archive, args.csv) as bundle:
+            enroller.run(bundle, os.path.join(jobs_dir, f"{job_id}.json"), job_id=job_id,
+                         update_existing=args.update_existing, on_progress=report)
+    finally:
+        engine.shutdown()
+    progress = enroller.progress
+    print(f"[OK] Job {job_id}: {len(progress['enrolled'])} terdaftar, "
+          f"{len(progress['skipped'])} dilewati, {len(progress['failed'])} gagal")
+    for email, reason in sorted(progress['failed'].items()):
+        print(f"[WARN] {email}: {reason}")
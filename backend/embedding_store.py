@@ -0,0 +1,219 @@
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: hanya satu proses penulis
+    fcntl = None
+
+ENCODING_DIM = 128
+MAGIC = b'AWEMB001'
+HEADER_SIZE = 16
+
+
+class EmbeddingStore:
+    """Binary float32 store for face encodings, separate from `users.json`.
+
+    Layout: a 16 byte header (magic + dim) followed by fixed-stride float32
+    rows. The file is memory-mapped read-only for zero-copy loading. Rows
+    are write-once: new encodings and re-enrollments are appended, and the
+    row a re-enrolled id pointed to is left behind as unreferenced space, so
+    arrays handed out by `rows()` never change underneath their users. A
+    small JSON index maps user id -> row, and user records reference their
+    row through `encoding_row`.
+
+    Several server processes may write to the same store: writers hold an
+    exclusive `flock` on the data file and first pick up rows and index
+    entries added by the other processes.
+    """
+
+    def __init__(self, data_path, index_path, dim=ENCODING_DIM):
+        self.data_path = data_path
+        self.index_path = index_path
+        self.dim = dim
+        self.stride = dim * 4
+        self.index = {}
+        self._pending = {}
+        self._index_stat = None
+        self._mmap = np.empty((0, dim), dtype=np.float32)
+        self._lock = threading.RLock()
+
+    def open(self):
+        with self._lock:
+            if not os.path.exists(self.data_path) or os.path.getsize(self.data_path) < HEADER_SIZE:
+                with open(self.data_path, 'wb') as f:
+                    f.write(MAGIC + np.array([self.dim, 0], dtype='<u4').tobytes())
+            with open(self.data_path, 'rb') as f:
+                header = f.read(HEADER_SIZE)
+            dim = int(np.frombuffer(header[8:12], dtype='<u4')[0])
+            if header[:8] != MAGIC or dim != self.dim:
+                raise ValueError(f"File embedding tidak valid: {self.data_path}")
+
+            self.index = self._read_index()
+            self._remap()
+        return self
+
+    def _read_index(self):
+        try:
+            self._index_stat = self._stat(self.index_path)
+            with open(self.index_path, 'r') as f:
+                return {str(k): int(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive write section, also across processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.data_path, 'rb') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # Baris / entry index yang ditambahkan proses lain sejak terakhir dibaca
+                    if self._stat(self.index_path) != self._index_stat:
+                        self.index = {**self._read_index(), **self._pending}
+                    if (os.path.getsize(self.data_path) - HEADER_SIZE) // self.stride != len(self._mmap):
+                        self._remap()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return len(self._mmap)
+
+    def __contains__(self, user_id):
+        return str(user_id) in self.index
+
+    def _remap(self):
+        rows = (os.path.getsize(self.data_path) - HEADER_SIZE) // self.stride
+        if rows > 0:
+            self._mmap = np.memmap(self.data_path, dtype=np.float32, mode='r',
+                                   offset=HEADER_SIZE, shape=(rows, self.dim))
+        else:
+            self._mmap = np.empty((0, self.dim), dtype=np.float32)
+
+    def row_of(self, user_id):
+        return self.index.get(str(user_id))
+
+    def rows(self, row_ids):
+        """Encodings for the given rows as an (n, dim) float32 array
+        (the memmap itself, without copy, when all rows are requested)."""
+        with self._lock:
+            row_ids = np.asarray(row_ids, dtype=np.int64)
+            if len(row_ids) == len(self._mmap) and np.array_equal(row_ids, np.arange(len(row_ids))):
+                return self._mmap
+            return self._mmap[row_ids]
+
+    def get(self, user_id):
+        row = self.row_of(user_id)
+        if row is None or row >= len(self._mmap):
+            return None
+        return np.array(self._mmap[row])
+
+    def put(self, user_id, encoding, save_index=True):
+        """Store one encoding; returns its row. Re-enrollment appends a new row."""
+        return self.put_many([(user_id, encoding)], save_index=save_index)[0]
+
+    def put_many(self, items, save_index=True):
+        """Store several `(user_id, encoding)` pairs with one append + one fsync;
+        returns their rows in order."""
+        vecs = [np.asarray(enc, dtype='<f4').reshape(self.dim) for _, enc in items]
+        with self._writing():
+            if not vecs:
+                return []
+            # Baris yang sudah ditulis tidak pernah diubah: memmap (dan gallery yang
+            # dibangun di atasnya tanpa salinan) tetap konsisten dengan norm-nya
+            with open(self.data_path, 'ab') as f:
+                start = (f.tell() - HEADER_SIZE) // self.stride
+                f.write(np.stack(vecs).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            rows = []
+            for row, (user_id, _) in enumerate(items, start):
+                self.index[str(user_id)] = row
+                self._pending[str(user_id)] = row
+                rows.append(row)
+            if save_index:
+                self._save_index()
+            self._remap()
+            return rows
+
+    def remove(self, user_id):
+        """Forget a user id; its row is left behind as unreferenced space."""
+        with self._writing():
+            self._pending.pop(str(user_id), None)
+            if self.index.pop(str(user_id), None) is None:
+                return False
+            self._save_index()
+            return True
+
+    def flush(self):
+        with self._writing():
+            self._save_index()
+
+    def _save_index(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+        self._index_stat = self._stat(self.index_path)
+        self._pending = {}
+
+
+def embedding_key(user):
+    return user.get('id') or user.get('email')
+
+
+def migrate_users(users, store):
+    """Move inline `encoding` lists from user records into the binary store.
+
+    Each migrated record gets `encoding_row` and loses `encoding`. Returns the
+    number of migrated users; the caller saves `users` afterwards.
+    """
+    migrated = 0
+    for user in users:
+        if not isinstance(user, dict) or not user.get('encoding'):
+            continue
+        key = embedding_key(user)
+        try:
+            user['encoding_row'] = store.put(key, user['encoding'], save_index=False)
+        except Exception as e:
+            print(f"[WARN] Invalid encoding for user {key}: {e}")
+            continue
+        del user['encoding']
+        migrated += 1
+    if migrated:
+        store.flush()
+    return migrated
+
+
+if __name__ == '__main__':
+    # python embedding_store.py [data_dir]  -> migrasi encoding dari users.json
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    users_path = os.path.join(data_dir, 'users.json')
+    with open(users_path, 'r') as f:
+        users = json.load(f)
+    store = EmbeddingStore(os.path.join(data_dir, 'embeddings.f32'),
+                           os.path.join(data_dir, 'embeddings_index.json')).open()
+    count = migrate_users(users, store)
+    if count:
+        tmp_path = users_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(users, f, indent=2)
+        os.replace(tmp_path, users_path)
+    print(f"[OK] {count} encoding dipindahkan ke {store.data_path}")
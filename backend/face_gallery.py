@@ -0,0 +1,354 @@
+import copy
+import threading
+
+import numpy as np
+
+ENCODING_DIM = 128
+DEFAULT_TOLERANCE = 0.6
+
+
+class FaceGallery:
+    """In-memory gallery of known face encodings.
+
+    All encodings live in one contiguous float32 (N, 128) matrix together with
+    their precomputed squared norms, so a batch of queries is matched against
+    the whole gallery with a single matrix product instead of the separate
+    `compare_faces` + `face_distance` scans.
+
+    Rows are stored in a buffer with spare capacity and indexed by user id, so
+    a single enrollment (`upsert` / `remove`) costs O(1) amortized instead of
+    a full reload.
+
+    An optional ANN `index` (e.g. `ann_index.IVFIndex`) is used to shortlist
+    candidates once the gallery holds at least `index_min_size` rows; the
+    shortlist is always re-ranked with exact distances. The index is trained
+    on a snapshot outside the lock (`train_index`, started in the background
+    by the first match that needs it); until it is ready matches are exact.
+    """
+
+    def __init__(self, dim=ENCODING_DIM, index=None, index_min_size=0):
+        self.dim = dim
+        self.index = index
+        self.index_min_size = index_min_size
+        self._index_stale = True
+        self._training = False
+        self._version = 0
+        self._lock = threading.RLock()
+        self._buf = np.empty((0, dim), dtype=np.float32)
+        self._norm_buf = np.empty((0,), dtype=np.float32)
+        self.names = []
+        self.user_ids = []
+        self._row_of = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, user_id):
+        return user_id in self._row_of
+
+    @property
+    def matrix(self):
+        return self._buf[:len(self.names)]
+
+    @property
+    def sq_norms(self):
+        return self._norm_buf[:len(self.names)]
+
+    def row_of(self, user_id):
+        return self._row_of.get(user_id)
+
+    def _reserve(self, size):
+        capacity = len(self._buf)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 64)
+        buf = np.empty((capacity, self.dim), dtype=np.float32)
+        norm_buf = np.empty((capacity,), dtype=np.float32)
+        n = len(self.names)
+        buf[:n] = self._buf[:n]
+        norm_buf[:n] = self._norm_buf[:n]
+        self._buf, self._norm_buf = buf, norm_buf
+
+    def _ensure_writable(self):
+        # Gallery bisa dibangun langsung di atas memmap read-only (zero-copy);
+        # salin hanya saat pertama kali diubah.
+        if not self._buf.flags.writeable:
+            self._buf = np.array(self._buf)
+
+    def rebuild(self, encodings, names, user_ids=None):
+        """Replace the whole gallery content in one go."""
+        if user_ids is None:
+            user_ids = [None] * len(names)
+        if not (len(encodings) == len(names) == len(user_ids)):
+            raise ValueError("encodings, names dan user_ids harus sama panjang")
+
+        if len(encodings):
+            matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim))
+        else:
+            matrix = np.empty((0, self.dim), dtype=np.float32)
+
+        with self._lock:
+            self._buf = matrix
+            self._norm_buf = np.einsum('ij,ij->i', matrix, matrix)
+            self.names = list(names)
+            self.user_ids = list(user_ids)
+            self._row_of = {uid: row for row, uid in enumerate(self.user_ids) if uid is not None}
+            self._index_stale = True
+            self._version += 1
+
+    def upsert(self, user_id, name, encoding):
+        """Add one identity, or replace its encoding/name if the id is already known."""
+        vec = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            self._ensure_writable()
+            row = self._row_of.get(user_id) if user_id is not None else None
+            if row is None:
+                row = len(self.names)
+                self._reserve(row + 1)
+                self.names.append(name)
+                self.user_ids.append(user_id)
+                if user_id is not None:
+                    self._row_of[user_id] = row
+            else:
+                self.names[row] = name
+            self._buf[row] = vec
+            self._norm_buf[row] = float(vec @ vec)
+            self._version += 1
+            if self.index is not None and not self._index_stale:
+                self.index.add(row, vec)
+            return row
+
+    def upsert_many(self, user_ids, names, encodings):
+        """`upsert` for several identities under one lock and one buffer resize."""
+        with self._lock:
+            self._reserve(len(self.names) + len(names))
+            return [self.upsert(uid, name, enc) for uid, name, enc in zip(user_ids, names, encodings)]
+
+    def remove(self, user_id):
+        """Drop one identity by swapping the last row into its place."""
+        with self._lock:
+            row = self._row_of.pop(user_id, None)
+            if row is None:
+                return False
+            last = len(self.names) - 1
+            if row != last:
+                self._ensure_writable()
+                self._buf[row] = self._buf[last]
+                self._norm_buf[row] = self._norm_buf[last]
+                self.names[row] = self.names[last]
+                self.user_ids[row] = self.user_ids[last]
+                if self.user_ids[row] is not None:
+                    self._row_of[self.user_ids[row]] = row
+            self.names.pop()
+            self.user_ids.pop()
+            self._version += 1
+            if self.index is not None and not self._index_stale:
+                self.index.move(last, row)
+            return True
+
+    def _use_index(self):
+        if self.index is None or len(self) < max(self.index_min_size, 1):
+            return False
+        if self._index_stale or not self.index.trained:
+            # Training (k-means) tidak boleh menahan lock match; sementara itu brute force
+            if not self._training:
+                self._training = True
+                threading.Thread(target=self.train_index, name='ann-train', daemon=True).start()
+            return False
+        return True
+
+    def train_index(self):
+        """Train a fresh copy of the index on a snapshot of the gallery and
+        swap it in; retried if the gallery changed meanwhile."""
+        try:
+            while True:
+                with self._lock:
+                    if self.index is None:
+                        return
+                    matrix = np.array(self.matrix)
+                    version = self._version
+                    index = copy.copy(self.index)
+                index.train(matrix)
+                with self._lock:
+                    if version == self._version:
+                        self.index = index
+                        self._index_stale = False
+                        return
+        finally:
+            self._training = False
+
+    def distances(self, queries):
+        """Euclidean distance matrix (Q, N) between queries and the gallery."""
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        q_sq = np.einsum('ij,ij->i', q, q)
+        with self._lock:
+            d2 = q_sq[:, None] + self.sq_norms[None, :] - 2.0 * (q @ self.matrix.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2)
+
+    def match(self, queries, k=1, tolerance=DEFAULT_TOLERANCE, n_probe=None):
+        """Top-k nearest identities for every query encoding.
+
+        Returns one list per query, each sorted by distance and holding dicts
+        with `index`, `nama`, `user_id`, `distance`, `confidence` and `match`
+        (distance <= tolerance). `n_probe` overrides the ANN index probe count.
+        """
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            n = len(self)
+            if n == 0 or len(q) == 0:
+                return [[] for _ in range(len(q))]
+
+            k = max(1, min(int(k), n))
+            if self._use_index():
+                shortlists = [self.index.candidates(qi, n_probe) for qi in q]
+            else:
+                shortlists = [None] * len(q)
+                dist = self.distances(q)
+
+            results = []
+            for i, cand in enumerate(shortlists):
+                if cand is None:
+                    row_dist, rows = dist[i], None
+                else:
+                    qi = q[i]
+                    d2 = float(qi @ qi) + self.sq_norms[cand] - 2.0 * (self.matrix[cand] @ qi)
+                    row_dist, rows = np.sqrt(np.maximum(d2, 0.0)), cand
+                top = self._top_k(row_dist, k)
+                row = []
+                for pos in top.tolist():
+                    idx = int(rows[pos]) if rows is not None else pos
+                    row.append(self._entry(idx, float(row_dist[pos]), tolerance))
+                results.append(row)
+            return results
+
+    def assign(self, queries, tolerance=DEFAULT_TOLERANCE, user_ids=None):
+        """One-to-one assignment of query faces to identities.
+
+        The whole (Q, N) distance matrix is computed at once and solved as a
+        minimum-cost assignment over the pairs within `tolerance`: as many
+        faces as possible get a distinct identity, ties broken by the lowest
+        total distance. `user_ids` limits the identities (e.g. a course
+        roster). Returns one dict (as in `match`) or None per query.
+        """
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            if len(self) == 0 or len(q) == 0:
+                return [None] * len(q)
+            if user_ids is None:
+                rows = np.arange(len(self))
+                dist = self.distances(q)
+            else:
+                rows = np.array(sorted({self._row_of[u] for u in user_ids if u in self._row_of}), dtype=np.int64)
+                if len(rows) == 0:
+                    return [None] * len(q)
+                q_sq = np.einsum('ij,ij->i', q, q)
+                d2 = q_sq[:, None] + self.sq_norms[rows][None, :] - 2.0 * (q @ self.matrix[rows].T)
+                dist = np.sqrt(np.maximum(d2, 0.0))
+            within = dist <= tolerance
+            # Hanya identitas yang punya kandidat dalam toleransi ikut dihitung
+            cols = np.nonzero(within.any(axis=0))[0]
+            result = [None] * len(q)
+            if len(cols) == 0:
+                return result
+            # Kolom dummy (tidak dikenali) lebih mahal dari total jarak semua pasangan valid,
+            # jadi jumlah wajah yang cocok dimaksimalkan dulu, baru total jaraknya
+            unmatched = len(q) * max(tolerance, 1.0) + 1.0
+            cost = np.full((len(q), len(cols) + len(q)), unmatched + 1.0)
+            cost[:, :len(cols)] = np.where(within[:, cols], dist[:, cols], unmatched + 1.0)
+            cost[:, len(cols):] = unmatched
+            for i, j in enumerate(_min_cost_assignment(cost).tolist()):
+                if j < len(cols) and within[i, cols[j]]:
+                    result[i] = self._entry(int(rows[cols[j]]), float(dist[i, cols[j]]), tolerance)
+            return result
+
+    def verify(self, user_id, encoding, tolerance=DEFAULT_TOLERANCE):
+        """1:1 check of `encoding` against the stored template of `user_id`.
+
+        Costs one distance regardless of gallery size. Returns the match dict
+        (with `match` evaluated at `tolerance`) or None if the id is unknown.
+        """
+        q = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            row = self._row_of.get(user_id)
+            if row is None:
+                return None
+            diff = self._buf[row] - q
+            return self._entry(row, float(np.sqrt(diff @ diff)), tolerance)
+
+    def match_among(self, queries, user_ids, tolerance=DEFAULT_TOLERANCE):
+        """Nearest identity per query, searching only the given user ids
+        (e.g. the students enrolled in a course). One dict or None per query."""
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            rows = np.array(sorted({self._row_of[u] for u in user_ids if u in self._row_of}), dtype=np.int64)
+            if len(rows) == 0:
+                return [None] * len(q)
+            q_sq = np.einsum('ij,ij->i', q, q)
+            d2 = q_sq[:, None] + self.sq_norms[rows][None, :] - 2.0 * (q @ self.matrix[rows].T)
+            dist = np.sqrt(np.maximum(d2, 0.0))
+            best = np.argmin(dist, axis=1)
+            return [self._entry(int(rows[b]), float(dist[i, b]), tolerance) for i, b in enumerate(best.tolist())]
+
+    def _entry(self, idx, distance, tolerance):
+        return {
+            'index': idx,
+            'nama': self.names[idx],
+            'user_id': self.user_ids[idx],
+            'distance': distance,
+            'confidence': 1.0 - distance,
+            'match': distance <= tolerance,
+        }
+
+    @staticmethod
+    def _top_k(row_dist, k):
+        k = min(k, len(row_dist))
+        if k == 0:
+            return np.empty((0,), dtype=np.int64)
+        if k < len(row_dist):
+            top = np.argpartition(row_dist, k - 1)[:k]
+        else:
+            top = np.arange(len(row_dist))
+        return top[np.argsort(row_dist[top])]
+
+
+def _min_cost_assignment(cost):
+    """Column chosen for every row of `cost` (rows <= columns), all distinct,
+    minimizing the total cost (Hungarian method with potentials, O(n^2 m))."""
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)  # baris (1-based) pemilik kolom j; 0 = bebas
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        min_v = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < min_v[1:])
+            min_v[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, min_v[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            done = np.nonzero(used)[0]
+            u[owner[done]] += delta
+            v[done] -= delta
+            min_v[1:][free] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+    assignment = np.full(n, -1, dtype=np.int64)
+    for j in range(1, m + 1):
+        if owner[j]:
+            assignment[owner[j] - 1] = j - 1
+    return assignment
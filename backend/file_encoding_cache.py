@@ -0,0 +1,86 @@
+import json
+import os
+
+import numpy as np
+
+
+class FileEncodingCache:
+    """On-disk cache of face encodings computed from image files.
+
+    Entries are keyed by file path and validated against the file's size and
+    mtime, so an unchanged image in `data_wajah` is never decoded or encoded
+    again. Images without a detectable face are cached too (encoding `None`).
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+
+    @staticmethod
+    def _signature(file_path):
+        st = os.stat(file_path)
+        return st.st_size, st.st_mtime_ns
+
+    def load(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+            self.entries = data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            self.entries = {}
+        self._dirty = False
+        return self
+
+    def lookup(self, file_path):
+        """Return `(hit, encoding)`; encoding is None if the image had no face."""
+        entry = self.entries.get(os.path.normpath(file_path))
+        try:
+            size, mtime = self._signature(file_path)
+        except OSError:
+            return False, None
+        if entry and entry.get('size') == size and entry.get('mtime_ns') == mtime:
+            self.hits += 1
+            enc = entry.get('encoding')
+            return True, (np.array(enc) if enc is not None else None)
+        self.misses += 1
+        return False, None
+
+    def store(self, file_path, encoding):
+        key = os.path.normpath(file_path)
+        try:
+            size, mtime = self._signature(file_path)
+        except OSError:
+            return
+        self.entries[key] = {
+            'size': size,
+            'mtime_ns': mtime,
+            'encoding': encoding.tolist() if encoding is not None else None,
+        }
+        self._dirty = True
+
+    def prune(self, existing_paths):
+        """Drop entries whose image file no longer exists."""
+        existing = {os.path.normpath(p) for p in existing_paths}
+        stale = [key for key in self.entries if key not in existing]
+        for key in stale:
+            del self.entries[key]
+        if stale:
+            self._dirty = True
+        return len(stale)
+
+    def save(self):
+        if not self._dirty:
+            return True
+        tmp_path = self.cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.cache_path)
+            self._dirty = False
+            return True
+        except Exception as e:
+            print(f"[ERROR] Save encoding cache: {e}")
+            return False
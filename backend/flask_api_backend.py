@@ -1,28 +1,188 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import cv2
-import face_recognition
+from werkzeug.exceptions import RequestEntityTooLarge
 import numpy as np
 import os
+import re
+import threading
+import time
 from datetime import datetime
-import json
-import base64
 from io import BytesIO
-from PIL import Image
-import qrcode
+from concurrent.futures import TimeoutError as FutureTimeout
+import base64
+import gzip
+import hashlib
+import json
 import uuid
 
-app = Flask(__name__)
-CORS(app)
+from face_gallery import FaceGallery, DEFAULT_TOLERANCE
+from ann_index import IVFIndex
+from file_encoding_cache import FileEncodingCache
+from embedding_store import EmbeddingStore, embedding_key, migrate_users
+from storage import create_storage, load_json_data, save_json_data
+from write_batcher import GroupCommitWriter
+from inference_engine import InferenceEngine, EngineBusy
+from micro_batcher import MicroBatcher
+from recognition_cache import RecognitionCache, image_key
+from frame_quality import FrameFilter, FrameRejected
+from bulk_enroll import BulkEnroller, PhotoBundle
+from session_registry import SessionRegistry
+from shared_gallery import SharedFaceGallery
+from aggregates import Aggregates
+from metrics import Metrics
+from readiness import NotReady, Readiness
+from attendance_report import PresenceMatrix, course_roster, csv_chunks, jsonl_chunks
+from image_pipeline import DECODE_MAX_DIM, DETECT_MAX_DIM, decode_base64_image, decode_image_bytes
+
+# Semua endpoint ada di blueprint ini; aplikasi dibuat oleh create_app() (lihat bawah)
+api = Blueprint('api', __name__)
+
+# Batas ukuran gambar yang di-upload (multipart / body image/jpeg mentah)
+MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+# Batas body endpoint gambar; base64 di dalam JSON ~33% lebih besar dari gambarnya
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES * 4 // 3 + 64 * 1024
+# Batas tertinggi (arsip foto bulk enrollment); endpoint gambar dibatasi MAX_REQUEST_BYTES
+MAX_BULK_UPLOAD_BYTES = 512 * 1024 * 1024
+RAW_IMAGE_TYPES = ('image/jpeg', 'image/png', 'application/octet-stream')
 
 PATH_WAJAH = 'data_wajah'
 PATH_DATA = 'data'
 PATH_USERS = os.path.join(PATH_DATA, 'users.json')
 PATH_ATTENDANCE = os.path.join(PATH_DATA, 'attendance.json')
 PATH_SESSIONS = os.path.join(PATH_DATA, 'sessions.json')
+PATH_ENCODING_CACHE = os.path.join(PATH_DATA, 'encoding_cache.json')
+PATH_EMBEDDINGS = os.path.join(PATH_DATA, 'embeddings.f32')
+PATH_EMBEDDING_INDEX = os.path.join(PATH_DATA, 'embeddings_index.json')
+PATH_DB = os.path.join(PATH_DATA, 'absensi.db')
+PATH_BULK_JOBS = os.path.join(PATH_DATA, 'bulk_jobs')
+PATH_GALLERY = os.path.join(PATH_DATA, 'gallery.bin')
+PATH_GALLERY_JOURNAL = os.path.join(PATH_DATA, 'gallery.journal')
+
+# Backend penyimpanan: 'json' (file data/*.json) atau 'sqlite' (data/absensi.db, WAL)
+STORAGE_BACKEND = os.environ.get('ABSEN_STORAGE', 'json')
+
+# Batas jarak wajah yang dianggap cocok (server-side; klien tidak bisa melonggarkan)
+MATCH_TOLERANCE = float(os.environ.get('ABSEN_MATCH_TOLERANCE', DEFAULT_TOLERANCE))
+
+# Index ANN (IVF) opt-in: default brute force (exact). Di benchmark_ann.py IVF belum mencapai
+# recall@1 >= 0.99 sambil tetap lebih cepat (20k: 0.970 pada n_probe=16, 100k: 0.915), jadi
+# aktifkan hanya setelah diukur pada data sendiri: ABSEN_ANN_MIN_GALLERY=<jumlah wajah minimum>
+ANN_MIN_GALLERY = int(os.environ.get('ABSEN_ANN_MIN_GALLERY', '0'))
+ANN_N_PROBE = int(os.environ.get('ABSEN_ANN_N_PROBE', '32'))
+ann_index = IVFIndex(n_probe=ANN_N_PROBE) if ANN_MIN_GALLERY > 0 else None
+
+# Gallery bersama untuk beberapa proses worker (gunicorn -w N): satu matriks encoding
+# di PATH_GALLERY (mmap) untuk semua worker, registrasi di worker mana pun dicatat di
+# PATH_GALLERY_JOURNAL dan dipakai worker lain lewat nomor generasi. ABSEN_SHARED_GALLERY=1
+SHARED_GALLERY = os.environ.get('ABSEN_SHARED_GALLERY', '0') == '1'
+if SHARED_GALLERY:
+    gallery = SharedFaceGallery(PATH_GALLERY, PATH_GALLERY_JOURNAL, index=ann_index, index_min_size=ANN_MIN_GALLERY)
+else:
+    gallery = FaceGallery(index=ann_index, index_min_size=ANN_MIN_GALLERY)
+embedding_store = EmbeddingStore(PATH_EMBEDDINGS, PATH_EMBEDDING_INDEX)
+storage = create_storage(STORAGE_BACKEND, PATH_DATA, PATH_DB)
+# Deteksi + encoding wajah dijalankan di pool proses (model dlib dimuat sekali per worker)
+INFERENCE_WORKERS = int(os.environ.get('ABSEN_INFERENCE_WORKERS', os.cpu_count() or 1))
+# Model deteksi face_locations ('hog' di CPU, 'cnn' butuh GPU) dan jumlah upsample
+FACE_DETECT_MODEL = os.environ.get('ABSEN_DETECT_MODEL', 'hog')
+FACE_DETECT_UPSAMPLE = int(os.environ.get('ABSEN_DETECT_UPSAMPLE', 1))
+# Instrumentasi: latensi per tahap + per endpoint, diekspor di /api/metrics (format
+# Prometheus). ABSEN_METRICS=0 mematikan pencatatan; request yang lebih lambat dari
+# ABSEN_SLOW_REQUEST_MS ditulis ke log beserta rincian tahapnya (0 = mati)
+METRICS_ENABLED = os.environ.get('ABSEN_METRICS', '1') != '0'
+SLOW_REQUEST_MS = float(os.environ.get('ABSEN_SLOW_REQUEST_MS', 2000))
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+metrics = Metrics(enabled=METRICS_ENABLED)
+
+# Cascade pre-filter: cek cahaya/blur di thread request (beberapa ms), lalu di worker
+# deteksi cepat resolusi rendah dan ukuran wajah minimum sebelum encoder dijalankan
+MIN_FACE_SIZE = 60
+frame_filter = FrameFilter(min_face_size=MIN_FACE_SIZE)
+frame_rejections = {}
+# Deteksi pada salinan yang diperkecil (DETECT_MAX_DIM), encoding pada gambar hasil decode
+inference_engine = InferenceEngine(workers=INFERENCE_WORKERS, detect_max_dim=DETECT_MAX_DIM,
+                                   frame_filter=frame_filter, on_timing=metrics.observe_stage)
+
+# Request pengenalan yang datang bersamaan digabung dalam satu batch (window 10 ms)
+RECOGNITION_BATCH_WINDOW = 0.01
+RECOGNITION_MAX_BATCH = 16
+recognition_batcher = MicroBatcher(inference_engine, gallery, window=RECOGNITION_BATCH_WINDOW,
+                                   max_batch=RECOGNITION_MAX_BATCH, model=FACE_DETECT_MODEL,
+                                   upsample=FACE_DETECT_UPSAMPLE, on_timing=metrics.observe_stage)
+
+# Cache hasil deteksi + encoding per isi gambar (retry / double-tap dalam 60 detik)
+recognition_cache = RecognitionCache(max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=60)
 
-encoded_known_faces = []
-names = []
+# Opt-in (ABSEN_RESTRICT_SESSION_TO_COURSE=1): sesi hanya mencocokkan mahasiswa yang mengambil
+# mata kuliahnya (field 'mata_kuliah' di record user, mis. dari CSV bulk enrollment). Mahasiswa
+# yang mendaftar lewat aplikasi belum punya field ini, jadi aktifkan hanya jika semua data
+# peserta sudah lengkap. Mata kuliah tanpa data peserta tetap memakai seluruh gallery.
+RESTRICT_SESSION_TO_COURSE = os.environ.get('ABSEN_RESTRICT_SESSION_TO_COURSE', '0') == '1'
+# Roster per sesi aktif; dibuang saat sesi berakhir atau data user berubah
+session_rosters = {}
+
+# Absensi foto kelas: wajah kecil di foto ruang kuliah -> resolusi decode lebih tinggi,
+# deteksi tanpa cascade dengan upsample
+CLASS_PHOTO_MAX_IMAGES = 3
+CLASS_PHOTO_MAX_DIM = 2048
+CLASS_PHOTO_UPSAMPLE = 1
+
+# Job registrasi massal di proses ini (job_id -> BulkEnroller); progress juga di data/bulk_jobs
+bulk_jobs = {}
+
+# Sesi absen aktif di memori (write-through ke storage), berakhir otomatis setelah
+# SESSION_DURATION. QR berisi token HMAC yang berganti tiap QR_TOKEN_PERIOD detik;
+# set ABSEN_QR_SECRET agar token tetap valid setelah server restart
+SESSION_DURATION = 2 * 3600
+QR_TOKEN_PERIOD = 60
+QR_SECRET = os.environ.get('ABSEN_QR_SECRET')
+
+def render_qr_png(text):
+    import qrcode
+    buffer = BytesIO()
+    qrcode.make(text).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+session_registry = SessionRegistry(storage, secret=QR_SECRET, token_period=QR_TOKEN_PERIOD,
+                                   default_duration=SESSION_DURATION, render_qr=render_qr_png)
+
+# Daftar users / absensi: halaman berbasis cursor (?limit=&cursor=), proyeksi field
+# (?fields=), ETag + 304 untuk polling dashboard, gzip untuk respons besar
+PAGE_DEFAULT_LIMIT = 100
+PAGE_MAX_LIMIT = 500
+USER_HIDDEN_FIELDS = ('password',)
+USER_DEFAULT_EXCLUDE = ('encoding',)
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+
+# Jumlah user per role dan absensi per hari / mata kuliah / sesi. JSON (satu proses): dihitung
+# sekali saat start lalu di-update setiap kali storage menulis. SQLite (bisa beberapa worker):
+# dibaca dari COUNT ber-index agar semua worker melihat angka yang sama
+aggregates = Aggregates()
+
+# Semua penulisan absensi lewat satu writer (group commit per 10 ms / 64 record)
+attendance_writer = GroupCommitWriter(storage, max_batch=64, interval=0.01)
+
+# Storage, gallery dan model wajah dimuat di thread background (create_app), jadi
+# proses langsung menjawab /api/health; /api/ready baru 200 setelah semuanya siap.
+# Endpoint yang komponennya belum siap dijawab 503 + Retry-After, tidak menunggu
+# model dimuat di dalam request. ABSEN_WARMUP=0 melewati inference pemanasan
+WARMUP_ENABLED = os.environ.get('ABSEN_WARMUP', '1') != '0'
+readiness = Readiness(('storage', 'gallery', 'model'))
+# Endpoint yang tetap dilayani selama loading
+READY_EXEMPT = ('health', 'ready', 'metrics_endpoint')
+# Endpoint yang butuh gallery / model wajah; endpoint lain cukup storage
+ENDPOINT_REQUIRES = {
+    'login': ('storage', 'gallery'),
+    'register_mahasiswa': ('storage', 'gallery', 'model'),
+    'register_dosen': ('storage', 'gallery', 'model'),
+    'mahasiswa_attendance': ('storage', 'gallery', 'model'),
+    'start_attendance': ('storage', 'gallery', 'model'),
+    'class_photo_attendance': ('storage', 'gallery', 'model'),
+    'register_face': ('storage', 'gallery', 'model'),
+    'recognize_face': ('storage', 'gallery', 'model'),
+    'bulk_enroll': ('storage', 'gallery', 'model'),
+}
 
 # Inisialisasi direktori dan file data
 def initialize_data():
@@ -31,18 +191,12 @@ def initialize_data():
     if not os.path.exists(PATH_DATA):
         os.makedirs(PATH_DATA)
     
-    # Inisialisasi file JSON jika belum ada
-    if not os.path.exists(PATH_USERS):
-        with open(PATH_USERS, 'w') as f:
-            json.dump([], f)
-    
-    if not os.path.exists(PATH_ATTENDANCE):
-        with open(PATH_ATTENDANCE, 'w') as f:
-            json.dump([], f)
-    
-    if not os.path.exists(PATH_SESSIONS):
-        with open(PATH_SESSIONS, 'w') as f:
-            json.dump([], f)
+    # Inisialisasi storage (file JSON / database) jika belum ada
+    storage.open()
+    aggregates.attach(storage)
+    embedding_store.open()
+    attendance_writer.start()
+    session_registry.load().start_reaper()
 
 # Data dosen pre-registered
 PREREGISTERED_DOSEN = {
@@ -62,84 +216,340 @@ PREREGISTERED_DOSEN = {
 
 # Load wajah terdaftar
 def load_known_faces():
-    """Load all known face encodings from `users.json`.
+    """Load all known face encodings referenced from the user store.
+    Encodings live in the binary embedding store (`encoding_row`); records
+    that still carry an inline `encoding` list are migrated first.
     Backwards-compatible: also scan `data_wajah` image files if present.
     """
-    global encoded_known_faces, names
     encoded_known_faces = []
     names = []
+    user_ids = []
+    rows = []
+
+    # Load from the user store (single consolidated store)
+    users_data = storage.list_users()
+    migrated = migrate_users(users_data, embedding_store)
+    if migrated:
+        storage.save_users(users_data)
+        print(f"[INFO] {migrated} encoding dipindahkan dari data user ke {PATH_EMBEDDINGS}")
 
-    # Load from users JSON (single consolidated store)
-    users_data = load_json_data(PATH_USERS)
-    print("[INFO] Memuat wajah terdaftar dari users.json...")
+    print("[INFO] Memuat wajah terdaftar dari embedding store...")
     for user in users_data:
-        # encoding may be stored as 'encoding' (list) inside user record
-        if user and isinstance(user, dict) and 'encoding' in user and user['encoding']:
-            try:
-                encoding = np.array(user['encoding'])
-                encoded_known_faces.append(encoding)
-                # Normalize name to underscore-lowercase to keep compatibility
-                nama_key = user.get('nama') or user.get('name') or user.get('email')
-                if isinstance(nama_key, str):
-                    norm_name = nama_key.replace(' ', '_').lower()
-                else:
-                    norm_name = str(nama_key).lower()
-                names.append(norm_name)
-                print(f"[OK] {norm_name} → loaded from users.json")
-            except Exception as e:
-                print(f"[WARN] Invalid encoding for user {user}: {e}")
+        if user and isinstance(user, dict) and user.get('encoding_row') is not None:
+            row = int(user['encoding_row'])
+            if row >= len(embedding_store):
+                print(f"[WARN] encoding_row {row} tidak ada untuk user {embedding_key(user)}")
+                continue
+            rows.append(row)
+            names.append(face_name_of(user))
+            user_ids.append(user.get('id'))
 
     # Also load any remaining image files for backwards compatibility during transition
     if os.path.exists(PATH_WAJAH):
         print("[INFO] Memuat wajah lama dari file...")
+        # Encoding file lama di-cache di disk (key: path + size + mtime)
+        cache = FileEncodingCache(PATH_ENCODING_CACHE).load()
+        known = {name.lower() for name in names}
+        image_paths = []
         for filename in os.listdir(PATH_WAJAH):
             if filename.endswith(('.jpg', '.png', '.jpeg')):
+                img_path = os.path.join(PATH_WAJAH, filename)
+                image_paths.append(img_path)
                 # Check if this face is already in names to avoid duplicates
                 name_from_file = "_".join(os.path.splitext(filename)[0].split("_")[:-1])
                 name_from_file = name_from_file.strip().lower()
 
-                if name_from_file not in [name.lower() for name in names]:
-                    img_path = os.path.join(PATH_WAJAH, filename)
-                    img = cv2.imread(img_path)
-                    if img is not None:
+                if name_from_file not in known:
+                    hit, encoding = cache.lookup(img_path)
+                    if not hit:
+                        import cv2
+                        import face_recognition
+                        img = cv2.imread(img_path)
+                        if img is None:
+                            continue
                         img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
                         enc = face_recognition.face_encodings(img_rgb)
-                        if enc:
-                            encoded_known_faces.append(enc[0])
-                            names.append(name_from_file)
-                            print(f"[OK] {filename} → {name_from_file} (from file)")
+                        encoding = enc[0] if enc else None
+                        cache.store(img_path, encoding)
+                    if encoding is not None:
+                        encoded_known_faces.append(encoding)
+                        names.append(name_from_file)
+                        user_ids.append(None)
+                        known.add(name_from_file)
+                        print(f"[OK] {filename} → {name_from_file} (from {'cache' if hit else 'file'})")
 
-# Load data dari JSON
-def load_json_data(file_path):
-    try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    except:
-        return []
+        cache.prune(image_paths)
+        cache.save()
+
+    # Baris dari memmap dipakai langsung (zero-copy) jika tidak ada wajah lama
+    stored = embedding_store.rows(rows)
+    if encoded_known_faces:
+        stored = np.vstack([stored, np.asarray(encoded_known_faces, dtype=np.float32)])
+    gallery.rebuild(stored, names, user_ids)
+
+# Normalize name to underscore-lowercase to keep compatibility
+def face_name_of(user):
+    nama_key = user.get('nama') or user.get('name') or user.get('email')
+    if isinstance(nama_key, str):
+        return nama_key.replace(' ', '_').lower()
+    return str(nama_key).lower()
+
+# Simpan encoding ke embedding store dan referensikan dari record user
+def store_user_encoding(user, encoding):
+    user['encoding_row'] = embedding_store.put(embedding_key(user), encoding)
+    user.pop('encoding', None)
+
+# Update satu identitas di gallery tanpa reload seluruh users.json
+def update_known_face(user, encoding):
+    gallery.upsert(user.get('id'), face_name_of(user), encoding)
 
-# Save data ke JSON
-def save_json_data(file_path, data):
+# Toleransi dari konfigurasi server; klien hanya boleh memperketat (nilai lebih kecil),
+# tidak pernah melonggarkan (mis. tolerance=1.0 untuk absen memakai wajah orang lain)
+def get_tolerance(data):
     try:
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"[ERROR] Save JSON: {e}")
-        return False
+        tolerance = float(data.get('tolerance', MATCH_TOLERANCE))
+    except (TypeError, ValueError):
+        return MATCH_TOLERANCE
+    if tolerance != tolerance:  # NaN
+        return MATCH_TOLERANCE
+    return min(max(tolerance, 0.0), MATCH_TOLERANCE)
+
+# Antrian inference penuh -> 503 cepat dengan Retry-After
+def busy_response(e):
+    response = jsonify({'success': False, 'message': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+# Frame ditolak cascade -> 400 dengan alasan spesifik (too_dark, blurry, ...)
+def rejected_response(e):
+    frame_rejections[e.reason] = frame_rejections.get(e.reason, 0) + 1
+    return jsonify({'success': False, 'message': e.message, 'reason': e.reason}), 400
+
+# Upload terlalu besar -> 413 (juga untuk body yang ditolak Flask sebelum masuk endpoint)
+@api.app_errorhandler(RequestEntityTooLarge)
+def too_large_response(e=None):
+    limit_mb = MAX_UPLOAD_BYTES // (1024 * 1024)
+    return jsonify({'success': False, 'message': f'Ukuran upload melebihi batas (gambar maks {limit_mb} MB)'}), 413
+
+# Field + gambar dari request. Mendukung tiga format:
+# - JSON {"image": "<base64>", ...} (ApiService Flutter saat ini)
+# - multipart/form-data: file 'image' + field form biasa
+# - body image/jpeg atau image/png mentah, field lain lewat query string
+# Gambar biner dikembalikan sebagai bytes dan langsung di-decode tanpa base64/JSON.
+def read_request():
+    if (request.content_length or 0) > MAX_REQUEST_BYTES:
+        raise RequestEntityTooLarge()
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image')
+        image = upload.stream.read(MAX_UPLOAD_BYTES + 1) if upload else request.form.get('image')
+        fields = request.form
+    elif request.mimetype in RAW_IMAGE_TYPES:
+        image = request.stream.read(MAX_UPLOAD_BYTES + 1)
+        fields = request.args
+    else:
+        data = request.get_json(force=True, silent=True) or {}
+        return data, data.get('image')
+    if isinstance(image, bytes) and len(image) > MAX_UPLOAD_BYTES:
+        raise RequestEntityTooLarge()
+    return fields, image or None
+
+# Beberapa gambar dalam satu request (foto kelas): JSON 'images' (list base64) atau 'image',
+# multipart dengan beberapa file 'image', atau satu body gambar mentah
+def read_request_images(max_images):
+    if (request.content_length or 0) > MAX_REQUEST_BYTES * max_images:
+        raise RequestEntityTooLarge()
+    if request.mimetype == 'multipart/form-data':
+        images = [f.stream.read(MAX_UPLOAD_BYTES + 1) for f in request.files.getlist('image')]
+        fields = request.form
+    elif request.mimetype in RAW_IMAGE_TYPES:
+        images = [request.stream.read(MAX_UPLOAD_BYTES + 1)]
+        fields = request.args
+    else:
+        fields = request.get_json(force=True, silent=True) or {}
+        images = fields.get('images') or [fields.get('image')]
+        if not isinstance(images, list):
+            images = [images]
+    if any(isinstance(img, bytes) and len(img) > MAX_UPLOAD_BYTES for img in images):
+        raise RequestEntityTooLarge()
+    return fields, [img for img in images if img]
 
-# Base64 ke OpenCV image
-def base64_to_image(base64_string):
+# Gambar (bytes atau base64) langsung ke array RGB (satu kali decode, resolusi dikurangi saat decode)
+def image_to_rgb(image, max_dim=DECODE_MAX_DIM):
+    with metrics.stage('decode'):
+        if isinstance(image, bytes):
+            rgb = decode_image_bytes(image, max_dim=max_dim)
+        else:
+            rgb = decode_base64_image(image, max_dim=max_dim)
+    if rgb is None:
+        print("[ERROR] Decode image: format gambar tidak valid")
+    return rgb
+
+# Decode + cek kualitas + pengenalan, dengan cache per isi gambar.
+# Return (lokasi, encodings, matches) atau None jika gambar tidak valid.
+# match=False: hanya encoding (matches kosong), untuk verifikasi 1:1.
+def recognize_image(image, tolerance, match=True):
+    with metrics.stage('cache_lookup'):
+        key = image_key(image)
+        cached = recognition_cache.get(key)
+    if cached is not None:
+        lokasi, encodings = cached
+        # Pencocokan tetap dihitung ulang (gallery bisa berubah)
+        with metrics.stage('match'):
+            return lokasi, encodings, recognition_batcher.match(encodings, tolerance) if match else []
+    rgb = image_to_rgb(image)
+    if rgb is None:
+        return None
+    with metrics.stage('quality_check'):
+        frame_filter.check_image(rgb)
+    # Antre di micro-batcher + deteksi/encoding di worker (+ pencocokan batch)
+    with metrics.stage('inference'):
+        lokasi, encodings, matches = recognition_batcher.recognize(rgb, tolerance=tolerance, match=match)
+    recognition_cache.put(key, lokasi, encodings)
+    return lokasi, encodings, matches
+
+# Parameter halaman: (limit, cursor); limit None = tanpa pagination (klien lama)
+def page_args():
+    limit, cursor = request.args.get('limit'), request.args.get('cursor')
+    if limit is None and cursor is None:
+        return None, None
     try:
-        img_data = base64.b64decode(base64_string.split(',')[1] if ',' in base64_string else base64_string)
-        img = Image.open(BytesIO(img_data))
-        return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-    except Exception as e:
-        print(f"[ERROR] Decode image: {e}")
+        limit = min(max(int(limit or PAGE_DEFAULT_LIMIT), 1), PAGE_MAX_LIMIT)
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        raise ValueError('Parameter limit / cursor tidak valid')
+    return limit, cursor
+
+# ?fields=a,b,c -> hanya field itu; tanpa fields -> semua kecuali `exclude`.
+# Field di `hidden` tidak pernah dikirim.
+def project(records, exclude=(), hidden=()):
+    fields = request.args.get('fields')
+    if fields:
+        wanted = [f for f in (f.strip() for f in fields.split(',')) if f and f not in hidden]
+        return [{f: r[f] for f in wanted if f in r} for r in records]
+    dropped = set(exclude) | set(hidden)
+    if not dropped:
+        return records
+    return [{k: v for k, v in r.items() if k not in dropped} for r in records]
+
+# Respons JSON dengan ETag (304 jika If-None-Match cocok) dan gzip jika klien mendukung
+def conditional_json(payload):
+    response = jsonify(payload)
+    response.set_etag(hashlib.blake2b(response.get_data(), digest_size=16).hexdigest(), weak=True)
+    response.make_conditional(request)
+    response.vary.add('Accept-Encoding')
+    if (response.status_code == 200 and request.accept_encodings['gzip']
+            and response.content_length >= GZIP_MIN_BYTES):
+        response.set_data(gzip.compress(response.get_data(), compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+# Mata kuliah yang diambil user: list atau string dipisah koma / titik koma
+# Id mahasiswa peserta mata kuliah sesi (di-cache selama sesi aktif); None = tanpa pembatasan
+def session_roster(session):
+    if not RESTRICT_SESSION_TO_COURSE:
+        return None
+    session_id = session.get('session_id')
+    roster = session_rosters.get(session_id)
+    if roster is None:
+        roster = {u.get('id') for u in course_roster(storage, session.get('mata_kuliah'))}
+        if session.get('is_active'):
+            session_rosters[session_id] = roster
+    return roster or None
+
+def evict_session_rosters(kind, items):
+    if kind == 'users':
+        session_rosters.clear()
+    elif kind == 'sessions':
+        for session in items:
+            if not session.get('is_active'):
+                session_rosters.pop(session.get('session_id'), None)
+
+storage.add_listener(evict_session_rosters)
+
+# Request ID (header X-Request-ID, diteruskan dari klien jika valid) dan waktu mulai
+@api.before_app_request
+def start_request_metrics():
+    incoming = request.headers.get('X-Request-ID', '')
+    g.request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+    g.request_start = time.perf_counter()
+    metrics.begin_request()
+
+# Komponen yang dibutuhkan endpoint belum selesai dimuat -> 503 cepat
+@api.before_app_request
+def check_ready():
+    name = (request.endpoint or '').rsplit('.', 1)[-1]
+    if not name or name in READY_EXEMPT:
         return None
+    try:
+        readiness.require(*ENDPOINT_REQUIRES.get(name, ('storage',)))
+    except NotReady as e:
+        return busy_response(e)
+    return None
+
+# Latensi per endpoint + log request lambat dengan rincian per tahap
+@api.after_app_request
+def finish_request_metrics(response):
+    request_id = getattr(g, 'request_id', None) or uuid.uuid4().hex
+    response.headers['X-Request-ID'] = request_id
+    elapsed = time.perf_counter() - getattr(g, 'request_start', time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe('http_request_duration_seconds', elapsed, method=request.method, endpoint=endpoint)
+    metrics.inc('http_requests_total', method=request.method, endpoint=endpoint, status=response.status_code)
+    stages = metrics.end_request()
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        breakdown = ', '.join(f'{stage}={seconds * 1000:.1f}ms' for stage, seconds in stages)
+        print(f"[WARN] Request lambat {request_id}: {request.method} {request.path} -> "
+              f"{response.status_code} dalam {elapsed * 1000:.0f} ms ({breakdown or 'tanpa rincian'})")
+    return response
+
+# Ukuran file data yang ada (bytes)
+def store_file_sizes():
+    paths = {
+        'users.json': PATH_USERS,
+        'sessions.json': PATH_SESSIONS,
+        'attendance.jsonl': os.path.join(PATH_DATA, 'attendance.jsonl'),
+        'embeddings.f32': PATH_EMBEDDINGS,
+        'absensi.db': PATH_DB,
+        'gallery.bin': PATH_GALLERY,
+        'gallery.journal': PATH_GALLERY_JOURNAL,
+    }
+    return {name: os.path.getsize(path) for name, path in paths.items() if os.path.exists(path)}
+
+metrics.describe('stage_duration_seconds', 'Durasi per tahap pemrosesan (decode, inference, match, ...)')
+metrics.describe('http_request_duration_seconds', 'Latensi request per endpoint')
+metrics.describe('http_requests_total', 'Jumlah request per endpoint dan status')
+metrics.gauge('gallery_faces', lambda: len(gallery), 'Jumlah wajah di gallery')
+if SHARED_GALLERY:
+    metrics.gauge('gallery_generation', lambda: gallery.generation, 'Generasi gallery bersama yang sudah dipakai proses ini')
+metrics.gauge('inference_pending', lambda: inference_engine.pending, 'Gambar yang antre / diproses di pool inference')
+metrics.gauge('inference_busy_rejections', lambda: inference_engine.rejected, 'Request yang ditolak karena server sibuk')
+metrics.gauge('batcher_queue_depth', lambda: recognition_batcher.pending(), 'Antrean micro-batcher pengenalan')
+metrics.gauge('writer_queue_depth', lambda: attendance_writer.pending(), 'Antrean group commit absensi')
+metrics.gauge('active_sessions', lambda: len(session_registry), 'Sesi absen aktif')
+metrics.gauge('recognition_cache_entries', lambda: len(recognition_cache), 'Entry cache pengenalan')
+metrics.gauge('recognition_cache_hit_ratio', lambda: recognition_cache.stats()['hit_rate'], 'Hit rate cache pengenalan')
+metrics.gauge('frame_rejections', lambda: dict(frame_rejections), 'Frame ditolak pre-filter per alasan', label='reason')
+metrics.gauge('store_file_bytes', store_file_sizes, 'Ukuran file data', label='file')
+metrics.gauge('store_records', lambda: {'users': aggregates.count_users(), 'attendance': aggregates.count_attendance(),
+                                        'embeddings': len(embedding_store)}, 'Jumlah record per jenis', label='kind')
+
+@api.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not metrics.enabled:
+        return jsonify({'success': False, 'message': 'Metrics dinonaktifkan (ABSEN_METRICS=0)'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Readiness (beda dengan /api/health yang hanya menandakan proses hidup)
+@api.route('/api/ready', methods=['GET'])
+def ready():
+    state = readiness.snapshot()
+    message = 'Server siap' if state['ready'] else 'Server sedang memuat data dan model'
+    return jsonify({'success': state['ready'], 'message': message, **state}), 200 if state['ready'] else 503
 
 # ============ API ENDPOINTS BARU ============
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     try:
         data = request.json
@@ -170,10 +580,9 @@ def login():
         elif role == 'mahasiswa':
             # Cek mahasiswa terdaftar (dari data wajah)
             nama_normalized = email.replace('_', ' ').lower()
-            if nama_normalized in [name.lower() for name in names]:
-                # Load user data dari JSON
-                users_data = load_json_data(PATH_USERS)
-                user_data = next((u for u in users_data if u['nama'].lower() == nama_normalized), None)
+            if nama_normalized in [name.lower() for name in gallery.names]:
+                # Load user data dari storage
+                user_data = storage.find_user(nama=nama_normalized)
                 
                 if user_data:
                     return jsonify({
@@ -191,8 +600,8 @@ def login():
                         'nim': '',
                         'created_at': datetime.now().isoformat()
                     }
-                    users_data.append(user_data)
-                    save_json_data(PATH_USERS, users_data)
+                    with metrics.stage('user_save'):
+                        storage.save_user(user_data)
                     
                     return jsonify({
                         'success': True,
@@ -210,42 +619,43 @@ def login():
 # NOTE: The previous preregister-only `register_dosen_face` handler has been removed
 # to allow registering any dosen via the single `/api/register-dosen` endpoint.
 # The consolidated implementation lives later in this file as `register_dosen`.
-@app.route("/api/register-mahasiswa", methods=["POST"])
+@api.route("/api/register-mahasiswa", methods=["POST"])
 def register_mahasiswa():
     try:
-        data = request.json
+        data, image = read_request()
         # debug incoming payload
         print(f"[DEBUG] /api/register-mahasiswa payload: {data}")
         nama = data.get("nama")
         nim = data.get("nim")
         email = data.get("email")
         password = data.get("password")
-        image = data.get("image")
 
         if not all([nama, nim, email, password, image]):
             return jsonify({"success": False, "message": "Data tidak lengkap"}), 400
 
         # proses wajah
-        img = base64_to_image(image)
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        enc = face_recognition.face_encodings(rgb)
+        rgb = image_to_rgb(image)
+        if rgb is None:
+            return jsonify({"success": False, "message": "Gambar tidak valid"}), 400
+        with metrics.stage('quality_check'):
+            frame_filter.check_image(rgb)
+        with metrics.stage('inference'):
+            enc = inference_engine.encode(rgb, model=FACE_DETECT_MODEL, upsample=FACE_DETECT_UPSAMPLE)
 
         if not enc:
             return jsonify({"success": False, "message": "Wajah tidak terdeteksi"}), 400
 
         encoding = enc[0]
 
-        # Save user with encoding into users.json (single consolidated file)
-        users = load_json_data(PATH_USERS)
-
         # If user exists by email, update; otherwise append new
-        existing = next((u for u in users if isinstance(u, dict) and u.get('email', '').lower() == email.lower()), None)
+        existing = storage.find_user(email=email)
         if existing:
-            existing['encoding'] = encoding.tolist()
+            store_user_encoding(existing, encoding)
             existing['nama'] = nama
             existing['nim'] = nim
             existing['role'] = 'mahasiswa'
             existing['password'] = password
+            user_entry = existing
         else:
             user_entry = {
                 'id': f"M{uuid.uuid4().hex[:8]}",
@@ -254,25 +664,31 @@ def register_mahasiswa():
                 'nim': nim,
                 'role': 'mahasiswa',
                 'password': password,
-                'encoding': encoding.tolist(),
                 'created_at': datetime.now().isoformat()
             }
-            users.append(user_entry)
+            store_user_encoding(user_entry, encoding)
 
-        save_json_data(PATH_USERS, users)
+        with metrics.stage('user_save'):
+            storage.save_user(user_entry)
 
-        # Reload known faces after registration
-        load_known_faces()
+        # Update gallery untuk user ini saja
+        update_known_face(user_entry, encoding)
 
         return jsonify({"success": True, "message": "Registrasi mahasiswa berhasil"})
 
+    except EngineBusy as e:
+        return busy_response(e)
+    except FrameRejected as e:
+        return rejected_response(e)
+    except RequestEntityTooLarge as e:
+        return too_large_response(e)
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
 # ==============================
 # LOGIN DOSEN
 # ==============================
-@app.route("/api/login-dosen", methods=["POST"])
+@api.route("/api/login-dosen", methods=["POST"])
 def login_dosen():
     data = request.json
     email = data.get("email", "").lower()
@@ -295,10 +711,10 @@ def login_dosen():
         "role": "dosen"
     })
 
-@app.route('/api/register-dosen', methods=['POST'])
+@api.route('/api/register-dosen', methods=['POST'])
 def register_dosen():
     try:
-        data = request.json
+        data, image = read_request()
         # debug incoming payload
         print(f"[DEBUG] /api/register-dosen payload: {data}")
 
@@ -307,28 +723,28 @@ def register_dosen():
         mata_kuliah = data.get('mata_kuliah', '').strip()
         email = data.get('email', '').strip()
         password = data.get('password', '').strip()
-        image_base64 = data.get('image')
 
         # Validasi
-        if not nama or not nidn or not email or not image_base64:
+        if not nama or not nidn or not email or not image:
             return jsonify({
                 'success': False,
                 'message': 'Nama, NIDN, Email dan Gambar wajib diisi'
             }), 400
 
-        # Convert Base64 ke gambar
-        img = base64_to_image(image_base64)
-        if img is None:
+        # Decode gambar (base64 atau biner)
+        rgb = image_to_rgb(image)
+        if rgb is None:
             return jsonify({'success': False, 'message': 'Gambar tidak valid'}), 400
+        with metrics.stage('quality_check'):
+            frame_filter.check_image(rgb)
 
         # Encode wajah
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        encodings = face_recognition.face_encodings(rgb)
+        with metrics.stage('inference'):
+            encodings = inference_engine.encode(rgb, model=FACE_DETECT_MODEL, upsample=FACE_DETECT_UPSAMPLE)
         if not encodings:
             return jsonify({'success': False, 'message': 'Wajah tidak terdeteksi'}), 400
 
-        # Simpan user dosen beserta encoding wajah ke users.json (consolidated)
-        users = load_json_data(PATH_USERS)
+        # Simpan user dosen beserta encoding wajah (consolidated user store)
         user_data = {
             'id': f"D{uuid.uuid4().hex[:8]}",
             'nama': nama,
@@ -337,14 +753,14 @@ def register_dosen():
             'role': 'dosen',
             'mata_kuliah': mata_kuliah,
             'password': password,
-            'encoding': encodings[0].tolist(),
             'created_at': datetime.now().isoformat()
         }
-        users.append(user_data)
-        save_json_data(PATH_USERS, users)
+        store_user_encoding(user_data, encodings[0])
+        with metrics.stage('user_save'):
+            storage.save_user(user_data)
 
-        # Reload known faces
-        load_known_faces()
+        # Tambahkan ke gallery tanpa reload
+        update_known_face(user_data, encodings[0])
 
         return jsonify({
             'success': True,
@@ -352,22 +768,27 @@ def register_dosen():
             'data': user_data
         })
 
+    except EngineBusy as e:
+        return busy_response(e)
+    except FrameRejected as e:
+        return rejected_response(e)
+    except RequestEntityTooLarge as e:
+        return too_large_response(e)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/api/mahasiswa/attendance', methods=['POST'])
+@api.route('/api/mahasiswa/attendance', methods=['POST'])
 def mahasiswa_attendance():
     try:
-        data = request.json
+        data, image = read_request()
         mahasiswa_id = data.get('mahasiswa_id')
         session_id = data.get('session_id')
         barcode_data_str = data.get('barcode_data')
-        image_base64 = data.get('image')
         
-        # Verifikasi barcode dan session
-        sessions = load_json_data(PATH_SESSIONS)
-        session = next((s for s in sessions if s['session_id'] == session_id), None)
+        # Verifikasi barcode dan session (lookup di registry, tanpa membaca sessions.json)
+        with metrics.stage('session_lookup'):
+            session = session_registry.get(session_id)
         
         if not session:
             return jsonify({'success': False, 'message': 'Sesi absen tidak valid'}), 400
@@ -375,85 +796,179 @@ def mahasiswa_attendance():
         if not session['is_active']:
             return jsonify({'success': False, 'message': 'Sesi absen sudah berakhir'}), 400
         
-        # Verifikasi barcode data
+        # Verifikasi barcode data: token bertanda tangan yang berganti tiap QR_TOKEN_PERIOD
         try:
             scanned_data = json.loads(barcode_data_str)
-            if scanned_data.get('session_id') != session_id:
-                return jsonify({'success': False, 'message': 'Barcode tidak valid'}), 400
-        except:
+        except (TypeError, ValueError):
             return jsonify({'success': False, 'message': 'Format barcode tidak valid'}), 400
+        if not session_registry.verify_barcode(session_id, scanned_data):
+            return jsonify({'success': False, 'message': 'Barcode tidak valid atau kadaluarsa, scan ulang QR code'}), 400
         
         # Verifikasi wajah mahasiswa
-        if not image_base64:
+        if not image:
             return jsonify({'success': False, 'message': 'Gambar wajah diperlukan'}), 400
         
-        img = base64_to_image(image_base64)
-        if img is None:
+        tolerance = get_tolerance(data)
+        result = recognize_image(image, tolerance, match=False)
+        if result is None:
             return jsonify({'success': False, 'message': 'Format gambar tidak valid'}), 400
-        
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        encodings = face_recognition.face_encodings(rgb)
+        lokasi, encodings, _ = result
         
         if not encodings:
             return jsonify({'success': False, 'message': 'Wajah tidak terdeteksi'}), 400
         
-        encode = encodings[0]
-        if len(encoded_known_faces) == 0:
+        if len(gallery) == 0:
             return jsonify({'success': False, 'message': 'Belum ada wajah terdaftar'}), 400
         
-        hasil = face_recognition.compare_faces(encoded_known_faces, encode, tolerance=0.6)
-        jarak = face_recognition.face_distance(encoded_known_faces, encode)
+        roster = session_roster(session)
+        if mahasiswa_id and mahasiswa_id in gallery:
+            if roster is not None and mahasiswa_id not in roster:
+                return jsonify({'success': False, 'message': 'Mahasiswa tidak terdaftar di mata kuliah ini'}), 403
+            # Verifikasi 1:1 terhadap template mahasiswa yang bersangkutan (biaya konstan,
+            # wajah teman tidak bisa dipakai untuk absen)
+            with metrics.stage('verify'):
+                match = gallery.verify(mahasiswa_id, encodings[0], tolerance)
+            if not match['match']:
+                return jsonify({'success': False, 'message': 'Wajah tidak cocok dengan akun mahasiswa'}), 401
+        elif mahasiswa_id and storage.find_user(user_id=mahasiswa_id) is not None:
+            # Akun dikenal tanpa encoding: jangan jatuh ke pencocokan nama (wajah mirip bisa lolos)
+            return jsonify({'success': False, 'message': 'Wajah belum terdaftar, silakan registrasi wajah terlebih dahulu'}), 400
+        else:
+            # Wajah lama tanpa id: cari di peserta mata kuliah sesi (atau seluruh gallery)
+            if roster is not None:
+                with metrics.stage('match'):
+                    match = gallery.match_among(encodings[:1], roster, tolerance)[0]
+            else:
+                with metrics.stage('match'):
+                    match = recognition_batcher.match(encodings[:1], tolerance)[0]
+            if match and match['match'] and match['user_id'] and mahasiswa_id and match['user_id'] != mahasiswa_id:
+                return jsonify({'success': False, 'message': 'Wajah tidak cocok dengan akun mahasiswa'}), 401
         
-        if len(jarak) > 0:
-            idx_match = np.argmin(jarak)
-            if hasil[idx_match]:
-                nama_mahasiswa = names[idx_match].replace('_', ' ').title()
-                
-                # Catat absensi
-                attendance_data = {
-                    'id': str(uuid.uuid4()),
-                    'mahasiswa_id': mahasiswa_id,
-                    'nama': nama_mahasiswa,
-                    'mata_kuliah': session['mata_kuliah'],
-                    'session_id': session_id,
-                    'dosen': session['dosen_name'],
-                    'tanggal': datetime.now().strftime('%Y-%m-%d'),
-                    'waktu': datetime.now().strftime('%H:%M:%S'),
-                    'status': 'hadir'
-                }
-                
-                # Simpan ke attendance.json
-                attendance_list = load_json_data(PATH_ATTENDANCE)
-                attendance_list.append(attendance_data)
-                save_json_data(PATH_ATTENDANCE, attendance_list)
-                
-                # Update session dengan mahasiswa yang sudah absen
-                if mahasiswa_id not in session['mahasiswa_absen']:
-                    session['mahasiswa_absen'].append(mahasiswa_id)
-                    save_json_data(PATH_SESSIONS, sessions)
-                
-                return jsonify({
-                    'success': True,
-                    'message': f'Absensi berhasil untuk {nama_mahasiswa}',
-                    'data': attendance_data
-                })
+        if match and match['match']:
+            nama_mahasiswa = match['nama'].replace('_', ' ').title()
+            
+            # Catat absensi
+            attendance_data = {
+                'id': str(uuid.uuid4()),
+                'mahasiswa_id': mahasiswa_id,
+                'nama': nama_mahasiswa,
+                'mata_kuliah': session['mata_kuliah'],
+                'session_id': session_id,
+                'dosen': session['dosen_name'],
+                'tanggal': datetime.now().strftime('%Y-%m-%d'),
+                'waktu': datetime.now().strftime('%H:%M:%S'),
+                'status': 'hadir'
+            }
+            
+            # Simpan absensi + update session (mahasiswa_absen) lewat group commit;
+            # kembali setelah batch-nya tersimpan di disk
+            with metrics.stage('attendance_commit'):
+                attendance_writer.add_attendance(attendance_data, session_id=session_id, mahasiswa_id=mahasiswa_id)
+            session_registry.mark_attended(session_id, [mahasiswa_id])
+            
+            return jsonify({
+                'success': True,
+                'message': f'Absensi berhasil untuk {nama_mahasiswa}',
+                'data': attendance_data
+            })
         
         return jsonify({'success': False, 'message': 'Wajah tidak dikenali'}), 401
         
+    except EngineBusy as e:
+        return busy_response(e)
+    except FrameRejected as e:
+        return rejected_response(e)
+    except RequestEntityTooLarge as e:
+        return too_large_response(e)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+@api.route('/api/dosen/start-attendance', methods=['POST'])
+def start_attendance():
+    """Dosen memulai sesi absen; QR code berisi token yang berganti berkala"""
+    try:
+        data, image = read_request()
+        dosen_id = data.get('dosen_id')
+        dosen_name = data.get('dosen_name')
+        mata_kuliah = data.get('mata_kuliah')
+
+        if not dosen_id or not mata_kuliah:
+            return jsonify({'success': False, 'message': 'dosen_id dan mata_kuliah wajib diisi'}), 400
+
+        # Dosen yang wajahnya terdaftar diverifikasi 1:1 sebelum sesi dibuat
+        if dosen_id in gallery:
+            if not image:
+                return jsonify({'success': False, 'message': 'Gambar wajah diperlukan'}), 400
+            tolerance = get_tolerance(data)
+            result = recognize_image(image, tolerance, match=False)
+            if result is None:
+                return jsonify({'success': False, 'message': 'Format gambar tidak valid'}), 400
+            _, encodings, _ = result
+            if not encodings:
+                return jsonify({'success': False, 'message': 'Wajah tidak terdeteksi'}), 400
+            if not gallery.verify(dosen_id, encodings[0], tolerance)['match']:
+                return jsonify({'success': False, 'message': 'Wajah tidak cocok dengan akun dosen'}), 401
+
+        session = session_registry.start(dosen_id, dosen_name or dosen_id, mata_kuliah)
+        png, barcode_data, expires_in = session_registry.qr_png(session['session_id'])
+        print(f"[OK] Sesi {session['session_id']} dimulai: {mata_kuliah} ({dosen_name})")
+
+        return jsonify({
+            'success': True,
+            'message': 'Sesi absen berhasil dimulai',
+            'data': {
+                'session_id': session['session_id'],
+                'mata_kuliah': mata_kuliah,
+                'dosen_name': session['dosen_name'],
+                'timestamp': session['timestamp'],
+                'expires_at': session['expires_at'],
+                'qr_code': 'data:image/png;base64,' + base64.b64encode(png).decode(),
+                'barcode_data': barcode_data,
+                'expires_in': expires_in
+            }
+        })
+
+    except EngineBusy as e:
+        return busy_response(e)
+    except FrameRejected as e:
+        return rejected_response(e)
+    except RequestEntityTooLarge as e:
+        return too_large_response(e)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+@api.route('/api/sessions/<session_id>/qr', methods=['GET'])
+def session_qr(session_id):
+    """QR code sesi saat ini (PNG dirender sekali per rotasi token)"""
+    try:
+        session = session_registry.get(session_id)
+        if not session or not session['is_active']:
+            return jsonify({'success': False, 'message': 'Sesi tidak ditemukan atau sudah berakhir'}), 404
+
+        png, barcode_data, expires_in = session_registry.qr_png(session_id)
+        if request.args.get('format') == 'png':
+            response = Response(png, mimetype='image/png')
+            response.headers['Cache-Control'] = f'max-age={expires_in}'
+            return response
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'session_id': session_id,
+                'qr_code': 'data:image/png;base64,' + base64.b64encode(png).decode(),
+                'barcode_data': barcode_data,
+                'expires_in': expires_in
+            }
+        })
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
-@app.route('/api/sessions/active', methods=['GET'])
+@api.route('/api/sessions/active', methods=['GET'])
 def get_active_sessions():
     """Mendapatkan sesi aktif untuk dosen"""
     try:
         dosen_id = request.args.get('dosen_id')
-        sessions = load_json_data(PATH_SESSIONS)
-        
-        active_sessions = [
-            s for s in sessions 
-            if s['is_active'] and s['dosen_id'] == dosen_id
-        ]
+        active_sessions = session_registry.list_sessions(dosen_id=dosen_id, active=True)
         
         return jsonify({
             'success': True,
@@ -462,21 +977,16 @@ def get_active_sessions():
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
-@app.route('/api/sessions/end', methods=['POST'])
+@api.route('/api/sessions/end', methods=['POST'])
 def end_session():
     """Mengakhiri sesi absen"""
     try:
         data = request.json
         session_id = data.get('session_id')
         
-        sessions = load_json_data(PATH_SESSIONS)
-        session = next((s for s in sessions if s['session_id'] == session_id), None)
+        session = session_registry.end(session_id)
         
         if session:
-            session['is_active'] = False
-            session['waktu_selesai'] = datetime.now().strftime('%H:%M:%S')
-            save_json_data(PATH_SESSIONS, sessions)
-            
             return jsonify({
                 'success': True,
                 'message': 'Sesi absen berhasil diakhiri'
@@ -487,58 +997,155 @@ def end_session():
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
+@api.route('/api/sessions/class-photo', methods=['POST'])
+def class_photo_attendance():
+    """Absensi satu kelas dari 1-3 foto bersama: satu request, satu batch tulis"""
+    try:
+        data, images = read_request_images(CLASS_PHOTO_MAX_IMAGES)
+        session_id = data.get('session_id')
+
+        session = session_registry.get(session_id)
+        if not session:
+            return jsonify({'success': False, 'message': 'Sesi absen tidak valid'}), 400
+        if not session['is_active']:
+            return jsonify({'success': False, 'message': 'Sesi absen sudah berakhir'}), 400
+
+        if not images:
+            return jsonify({'success': False, 'message': 'Foto kelas diperlukan'}), 400
+        if len(images) > CLASS_PHOTO_MAX_IMAGES:
+            return jsonify({'success': False, 'message': f'Maksimal {CLASS_PHOTO_MAX_IMAGES} foto per request'}), 400
+
+        rgbs = []
+        for image in images:
+            rgb = image_to_rgb(image, max_dim=CLASS_PHOTO_MAX_DIM)
+            if rgb is None:
+                return jsonify({'success': False, 'message': 'Format gambar tidak valid'}), 400
+            rgbs.append(rgb)
+
+        # Semua foto dalam satu task; descriptor semua wajah dihitung dalam satu panggilan dlib
+        future = inference_engine.submit_batch(rgbs, model=FACE_DETECT_MODEL, upsample=CLASS_PHOTO_UPSAMPLE,
+                                               group=True)
+        with metrics.stage('inference'):
+            try:
+                results = future.result(inference_engine.timeout)
+            except FutureTimeout:
+                # Pool inference penuh sampai batas waktu: sama seperti antrean penuh (503)
+                raise EngineBusy()
+        encodings = [enc for _, face_encodings in results for enc in face_encodings]
+
+        if not encodings:
+            return jsonify({'success': False, 'message': 'Wajah tidak terdeteksi'}), 400
+        if len(gallery) == 0:
+            return jsonify({'success': False, 'message': 'Belum ada wajah terdaftar'}), 400
+
+        # Matriks jarak wajah x gallery (atau peserta mata kuliah) sekaligus, tiap identitas
+        # dipakai paling banyak sekali
+        with metrics.stage('match'):
+            assigned = gallery.assign(np.asarray(encodings), tolerance=get_tolerance(data),
+                                      user_ids=session_roster(session))
+
+        tanggal = datetime.now().strftime('%Y-%m-%d')
+        waktu = datetime.now().strftime('%H:%M:%S')
+        sudah_tercatat = set(session.get('mahasiswa_absen', []))
+        items, hadir, sudah_absen = [], [], []
+        for best in assigned:
+            if best is None:
+                continue
+            nama_mahasiswa = best['nama'].replace('_', ' ').title()
+            if best['user_id'] in sudah_tercatat:
+                sudah_absen.append(nama_mahasiswa)
+                continue
+            attendance_data = {
+                'id': str(uuid.uuid4()),
+                'mahasiswa_id': best['user_id'],
+                'nama': nama_mahasiswa,
+                'mata_kuliah': session['mata_kuliah'],
+                'session_id': session_id,
+                'dosen': session['dosen_name'],
+                'tanggal': tanggal,
+                'waktu': waktu,
+                'status': 'hadir',
+                'type': 'class_photo',
+                'confidence': round(best['confidence'], 4)
+            }
+            items.append((attendance_data, False, session_id, best['user_id']))
+            hadir.append({'nama': nama_mahasiswa, 'confidence': float(best['confidence'])})
+
+        # Semua absensi masuk group commit yang sama (satu fsync, satu update session)
+        if items:
+            with metrics.stage('attendance_commit'):
+                attendance_writer.add_attendance_many(items)
+            session_registry.mark_attended(session_id, [item[3] for item in items])
+
+        recognized = sum(1 for best in assigned if best is not None)
+        return jsonify({
+            'success': True,
+            'message': f'{len(hadir)} mahasiswa tercatat hadir',
+            'data': {
+                'faces': len(encodings),
+                'recognized': recognized,
+                'unknown': len(encodings) - recognized,
+                'hadir': hadir,
+                'sudah_absen': sudah_absen
+            }
+        })
+
+    except EngineBusy as e:
+        return busy_response(e)
+    except RequestEntityTooLarge as e:
+        return too_large_response(e)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
 # ============ API ENDPOINTS YANG SUDAH ADA (DIUPDATE) ============
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health():
-    users_data = load_json_data(PATH_USERS)
-    mahasiswa_count = len([u for u in users_data if u['role'] == 'mahasiswa'])
-    
     return jsonify({
         'status': 'ok', 
         'message': 'Server running',
-        'registered_users': len(set(names)),
-        'mahasiswa_count': mahasiswa_count,
-        'dosen_count': len(PREREGISTERED_DOSEN)
+        'ready': readiness.is_ready(),
+        'registered_users': len(gallery),
+        'mahasiswa_count': aggregates.count_users('mahasiswa'),
+        'today_attendance': aggregates.count_attendance(datetime.now().strftime('%Y-%m-%d')),
+        'dosen_count': len(PREREGISTERED_DOSEN),
+        'recognition_batching': recognition_batcher.stats(),
+        'frame_rejections': dict(frame_rejections),
+        'recognition_cache': recognition_cache.stats()
     })
 
-@app.route('/api/register', methods=['POST'])
+@api.route('/api/register', methods=['POST'])
 def register_face():
     try:
-        data = request.json
+        data, image = read_request()
         # debug incoming payload
         print(f"[DEBUG] /api/register payload: {data}")
         nama = data.get('nama', '').strip().replace(" ", "_").lower()
-        image_base64 = data.get('image')
         nim = data.get('nim', '')
         
-        if not nama or not image_base64:
+        if not nama or not image:
             return jsonify({'success': False, 'message': 'Nama dan gambar harus diisi'}), 400
         
-        # Convert base64 to image
-        img = base64_to_image(image_base64)
-        if img is None:
+        # Decode gambar (base64 atau biner)
+        rgb = image_to_rgb(image)
+        if rgb is None:
             return jsonify({'success': False, 'message': 'Format gambar tidak valid'}), 400
+        with metrics.stage('quality_check'):
+            frame_filter.check_image(rgb)
         
         # Deteksi wajah
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        encodings = face_recognition.face_encodings(rgb)
+        with metrics.stage('inference'):
+            encodings = inference_engine.encode(rgb, model=FACE_DETECT_MODEL, upsample=FACE_DETECT_UPSAMPLE)
         
         if not encodings:
             return jsonify({'success': False, 'message': 'Wajah tidak terdeteksi. Pastikan wajah terlihat jelas'}), 400
         
-        # Save encoding directly into users.json
-        users_data = load_json_data(PATH_USERS)
-        user_exists = any(u['nama'].lower() == nama.replace('_', ' ').lower() for u in users_data)
-        user_data = None
+        # Save encoding reference into the user store
+        user_data = storage.find_user(nama=nama)
 
-        if user_exists:
+        if user_data:
             # Update existing user's encoding
-            for u in users_data:
-                if isinstance(u, dict) and u.get('nama','').lower() == nama.replace('_', ' ').lower():
-                    u['encoding'] = encodings[0].tolist()
-                    user_data = u
-                    break
+            store_user_encoding(user_data, encodings[0])
         else:
             user_data = {
                 'id': f"M{str(uuid.uuid4())[:8]}",
@@ -546,15 +1153,15 @@ def register_face():
                 'email': f"{nama}@student.kampus.id",
                 'role': 'mahasiswa',
                 'nim': nim,
-                'encoding': encodings[0].tolist(),
                 'created_at': datetime.now().isoformat()
             }
-            users_data.append(user_data)
+            store_user_encoding(user_data, encodings[0])
 
-        save_json_data(PATH_USERS, users_data)
+        with metrics.stage('user_save'):
+            storage.save_user(user_data)
 
-        # Reload known faces
-        load_known_faces()
+        # Update gallery untuk user ini saja
+        update_known_face(user_data, encodings[0])
 
         return jsonify({
             'success': True,
@@ -562,131 +1169,272 @@ def register_face():
             'user_data': user_data
         })
     
+    except EngineBusy as e:
+        return busy_response(e)
+    except FrameRejected as e:
+        return rejected_response(e)
+    except RequestEntityTooLarge as e:
+        return too_large_response(e)
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
-@app.route('/api/recognize', methods=['POST'])
+@api.route('/api/recognize', methods=['POST'])
 def recognize_face():
     try:
-        data = request.json
-        image_base64 = data.get('image')
+        data, image = read_request()
         
-        if not image_base64:
+        if not image:
             return jsonify({'success': False, 'message': 'Gambar tidak ditemukan'}), 400
         
-        # Convert base64 to image
-        img = base64_to_image(image_base64)
-        if img is None:
+        # Decode + deteksi wajah (cache per isi gambar, micro-batch bersama request lain)
+        result = recognize_image(image, get_tolerance(data))
+        if result is None:
             return jsonify({'success': False, 'message': 'Format gambar tidak valid'}), 400
-            
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Deteksi wajah
-        lokasi = face_recognition.face_locations(rgb)
-        encodings = face_recognition.face_encodings(rgb, lokasi)
+        lokasi, encodings, matches = result
         
         if not encodings:
             return jsonify({'success': False, 'message': 'Wajah tidak terdeteksi'})
         
-        if len(encoded_known_faces) == 0:
+        if len(gallery) == 0:
             return jsonify({'success': False, 'message': 'Belum ada wajah terdaftar. Silakan daftar terlebih dahulu'})
         
         results = []
-        for encode in encodings:
-            hasil = face_recognition.compare_faces(encoded_known_faces, encode, tolerance=0.6)
-            jarak = face_recognition.face_distance(encoded_known_faces, encode)
-            
-            if len(jarak) > 0:
-                idx_match = np.argmin(jarak)
-                if hasil[idx_match]:
-                    nama = names[idx_match]
-                    
-                    # Cek absensi hari ini dari JSON
-                    tanggal = datetime.now().strftime('%Y-%m-%d')
-                    attendance_list = load_json_data(PATH_ATTENDANCE)
-                    sudah_absen = any(
-                        a['nama'].lower() == nama.replace('_', ' ').lower() and 
-                        a['tanggal'] == tanggal 
-                        for a in attendance_list
-                    )
-                    
-                    if not sudah_absen:
-                        # Catat absensi otomatis
-                        attendance_data = {
-                            'id': str(uuid.uuid4()),
-                            'nama': nama.replace('_', ' ').title(),
-                            'tanggal': tanggal,
-                            'waktu': datetime.now().strftime('%H:%M:%S'),
-                            'status': 'hadir',
-                            'type': 'direct'
-                        }
-                        attendance_list.append(attendance_data)
-                        save_json_data(PATH_ATTENDANCE, attendance_list)
-                    
-                    results.append({
-                        'nama': nama.replace("_", " ").title(),
-                        'sudah_absen': sudah_absen,
-                        'confidence': float(1 - jarak[idx_match])
-                    })
+        # Semua wajah dicocokkan dalam satu perkalian matriks (bersama batch)
+        for best in matches:
+            if best and best['match']:
+                nama = best['nama']
+                
+                # Catat absensi otomatis jika belum absen hari ini (cek lewat index)
+                tanggal = datetime.now().strftime('%Y-%m-%d')
+                attendance_data = {
+                    'id': str(uuid.uuid4()),
+                    'nama': nama.replace('_', ' ').title(),
+                    'tanggal': tanggal,
+                    'waktu': datetime.now().strftime('%H:%M:%S'),
+                    'status': 'hadir',
+                    'type': 'direct'
+                }
+                with metrics.stage('attendance_commit'):
+                    sudah_absen = not attendance_writer.add_attendance(attendance_data, once=True)
+                
+                results.append({
+                    'nama': nama.replace("_", " ").title(),
+                    'sudah_absen': sudah_absen,
+                    'confidence': float(best['confidence'])
+                })
         
         if results:
             return jsonify({'success': True, 'data': results})
         else:
             return jsonify({'success': False, 'message': 'Wajah tidak dikenali. Silakan daftar terlebih dahulu'})
     
+    except EngineBusy as e:
+        return busy_response(e)
+    except FrameRejected as e:
+        return rejected_response(e)
+    except RequestEntityTooLarge as e:
+        return too_large_response(e)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+# Jalankan bulk enrollment di background; gallery diperbarui setiap chunk selesai disimpan
+def run_bulk_enrollment(job_id, archive_path, csv_path, update_existing):
+    enroller = bulk_jobs[job_id]
+    progress_path = os.path.join(PATH_BULK_JOBS, f"{job_id}.json")
+
+    def upsert_chunk(pairs):
+        gallery.upsert_many([u.get('id') for u, _ in pairs],
+                            [face_name_of(u) for u, _ in pairs],
+                            [enc for _, enc in pairs])
+
+    try:
+        with PhotoBundle(archive_path, csv_path) as bundle:
+            enroller.run(bundle, progress_path, job_id=job_id, update_existing=update_existing,
+                         on_chunk=upsert_chunk)
+        for path in (archive_path, csv_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+        print(f"[OK] Bulk enrollment {job_id}: {len(enroller.enrolled)} mahasiswa terdaftar")
+    except Exception as e:
+        print(f"[ERROR] Bulk enrollment {job_id}: {e}")
+        progress = enroller.progress or BulkEnroller.new_progress(job_id, 0)
+        progress['status'] = 'error'
+        progress['error'] = str(e)
+        enroller.progress = progress
+        save_json_data(progress_path, progress)
+
+@api.route('/api/enroll/bulk', methods=['POST'])
+def bulk_enroll():
+    """Registrasi massal: multipart 'archive' (zip/tar foto) + 'csv' opsional (nama,nim,email).
+    Kirim ulang dengan 'job_id' yang sama untuk melanjutkan job yang terhenti."""
+    try:
+        job_id = request.form.get('job_id') or uuid.uuid4().hex[:12]
+        if not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', job_id):
+            return jsonify({'success': False, 'message': 'job_id tidak valid'}), 400
+        enroller = bulk_jobs.get(job_id)
+        if enroller and (enroller.progress is None or enroller.progress.get('status') == 'running'):
+            return jsonify({'success': False, 'message': 'Job masih berjalan', 'job_id': job_id}), 409
+
+        os.makedirs(PATH_BULK_JOBS, exist_ok=True)
+        archive_path = os.path.join(PATH_BULK_JOBS, f"{job_id}.archive")
+        csv_path = os.path.join(PATH_BULK_JOBS, f"{job_id}.csv")
+        archive = request.files.get('archive')
+        if archive:
+            archive.save(archive_path)
+        elif not os.path.exists(archive_path):
+            return jsonify({'success': False, 'message': 'Arsip foto (archive) wajib diisi'}), 400
+        csv_file = request.files.get('csv')
+        if csv_file:
+            csv_file.save(csv_path)
+        if not os.path.exists(csv_path):
+            csv_path = None
+
+        update_existing = str(request.form.get('update_existing', '')).lower() in ('1', 'true', 'yes')
+        bulk_jobs[job_id] = BulkEnroller(storage, embedding_store, inference_engine, frame_filter=frame_filter,
+                                         model=FACE_DETECT_MODEL, upsample=FACE_DETECT_UPSAMPLE)
+        threading.Thread(target=run_bulk_enrollment, args=(job_id, archive_path, csv_path, update_existing),
+                         name=f"bulk-enroll-{job_id}", daemon=True).start()
+
+        return jsonify({
+            'success': True,
+            'message': 'Registrasi massal dimulai',
+            'job_id': job_id
+        }), 202
+
+    except RequestEntityTooLarge as e:
+        return too_large_response(e)
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
-@app.route('/api/attendance', methods=['GET'])
+@api.route('/api/enroll/bulk/<job_id>', methods=['GET'])
+def bulk_enroll_status(job_id):
+    """Progress job registrasi massal"""
+    enroller = bulk_jobs.get(job_id)
+    progress = enroller.progress if enroller else None
+    if progress is None and re.fullmatch(r'[A-Za-z0-9_-]{1,64}', job_id):
+        progress = load_json_data(os.path.join(PATH_BULK_JOBS, f"{job_id}.json"))
+    if not isinstance(progress, dict) or not progress:
+        if enroller:
+            return jsonify({'success': True, 'data': {'job_id': job_id, 'status': 'starting'}})
+        return jsonify({'success': False, 'message': 'Job tidak ditemukan'}), 404
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'job_id': job_id,
+            'status': progress.get('status'),
+            'total': progress.get('total', 0),
+            'processed': progress.get('processed', 0),
+            'enrolled': len(progress.get('enrolled', [])),
+            'failed': progress.get('failed', {}),
+            'skipped': progress.get('skipped', {}),
+            'error': progress.get('error'),
+            'started_at': progress.get('started_at'),
+            'updated_at': progress.get('updated_at')
+        }
+    })
+
+@api.route('/api/attendance', methods=['GET'])
 def get_attendance():
     try:
         date_filter = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
         mata_kuliah = request.args.get('mata_kuliah')
+        limit, cursor = page_args()
         
-        attendance_list = load_json_data(PATH_ATTENDANCE)
-        
-        filtered_attendance = []
-        for item in attendance_list:
-            if date_filter == 'all' or item.get('tanggal') == date_filter:
-                if not mata_kuliah or item.get('mata_kuliah') == mata_kuliah:
-                    filtered_attendance.append(item)
-        
-        # Sort by time (newest first)
-        filtered_attendance.sort(key=lambda x: x.get('waktu', ''), reverse=True)
+        # Query lewat index tanggal / mata_kuliah di storage, terbaru dulu (urutan catat)
+        filtered_attendance, next_cursor = storage.page_attendance(
+            tanggal=None if date_filter == 'all' else date_filter,
+            mata_kuliah=mata_kuliah,
+            before=cursor,
+            limit=limit
+        )
         
-        return jsonify({'success': True, 'data': filtered_attendance})
+        payload = {'success': True, 'data': project(filtered_attendance)}
+        if limit is not None:
+            payload['next_cursor'] = None if next_cursor is None else str(next_cursor)
+        return conditional_json(payload)
     
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
-@app.route('/api/users', methods=['GET'])
+@api.route('/api/attendance/summary', methods=['GET'])
+def get_attendance_summary():
+    """Rekap hadir per mata kuliah per hari (dari aggregates)"""
+    try:
+        date_filter = request.args.get('date', 'all')
+        rows = aggregates.summary(tanggal=None if date_filter == 'all' else date_filter,
+                                  mata_kuliah=request.args.get('mata_kuliah'))
+        return conditional_json({'success': True, 'data': rows})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+@api.route('/api/reports/attendance', methods=['GET'])
+def export_attendance():
+    """Ekspor absensi (CSV / JSON-lines) secara streaming, urut tanggal"""
+    try:
+        fmt = request.args.get('format', 'csv')
+        if fmt not in ('csv', 'jsonl'):
+            return jsonify({'success': False, 'message': 'Format harus csv atau jsonl'}), 400
+        mata_kuliah = request.args.get('mata_kuliah')
+        records = storage.iter_attendance(mata_kuliah, request.args.get('from'), request.args.get('to'))
+        chunks = csv_chunks(records) if fmt == 'csv' else jsonl_chunks(records)
+        response = Response(stream_with_context(chunks),
+                            mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson')
+        filename = re.sub(r'[^A-Za-z0-9_-]+', '_', mata_kuliah or 'absensi')
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+        return response
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+@api.route('/api/reports/presence', methods=['GET'])
+def presence_report():
+    """Matriks kehadiran mahasiswa x tanggal untuk satu mata kuliah (JSON / CSV)"""
+    try:
+        mata_kuliah = request.args.get('mata_kuliah')
+        if not mata_kuliah:
+            return jsonify({'success': False, 'message': 'mata_kuliah wajib diisi'}), 400
+        records = storage.iter_attendance(mata_kuliah, request.args.get('from'), request.args.get('to'))
+        # Peserta mata kuliah yang tidak pernah hadir tetap muncul (baris nol)
+        report = PresenceMatrix(records, course_roster(storage, mata_kuliah))
+
+        if request.args.get('format') == 'csv':
+            response = Response(report.csv_chunks(), mimetype='text/csv')
+            filename = re.sub(r'[^A-Za-z0-9_-]+', '_', mata_kuliah)
+            response.headers['Content-Disposition'] = f'attachment; filename="kehadiran_{filename}.csv"'
+            return response
+        return conditional_json({'success': True, 'data': dict(report.to_dict(), mata_kuliah=mata_kuliah)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+@api.route('/api/users', methods=['GET'])
 def get_users():
     try:
         role = request.args.get('role', '')
-        users_data = load_json_data(PATH_USERS)
-        
-        if role:
-            filtered_users = [u for u in users_data if u['role'] == role]
-        else:
-            filtered_users = users_data
+        limit, cursor = page_args()
+        filtered_users, next_cursor = storage.page_users(role or None, after=cursor, limit=limit)
         
-        return jsonify({'success': True, 'data': filtered_users})
+        # encoding tidak dikirim kecuali diminta lewat ?fields=, password tidak pernah
+        payload = {'success': True, 'data': project(filtered_users, USER_DEFAULT_EXCLUDE, USER_HIDDEN_FIELDS)}
+        if limit is not None:
+            payload['next_cursor'] = None if next_cursor is None else str(next_cursor)
+        return conditional_json(payload)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
-@app.route('/api/stats', methods=['GET'])
+@api.route('/api/stats', methods=['GET'])
 def get_stats():
     try:
-        total_users = len(set(names))
-        users_data = load_json_data(PATH_USERS)
-        attendance_list = load_json_data(PATH_ATTENDANCE)
-        
+        total_users = len(gallery)
         # Count today's attendance
         tanggal = datetime.now().strftime('%Y-%m-%d')
-        today_count = len([a for a in attendance_list if a.get('tanggal') == tanggal])
+        today_count = aggregates.count_attendance(tanggal)
         
         # Count by role
-        mahasiswa_count = len([u for u in users_data if u['role'] == 'mahasiswa'])
+        mahasiswa_count = aggregates.count_users('mahasiswa')
         dosen_count = len(PREREGISTERED_DOSEN)
         
         return jsonify({
@@ -702,17 +1450,60 @@ def get_stats():
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
+# Langkah loading per proses: storage -> gallery -> model (+ inference pemanasan)
+def load_gallery():
+    if SHARED_GALLERY:
+        # Hanya proses pertama yang membaca storage; worker berikutnya langsung memakai gallery bersama
+        built = gallery.open(build=load_known_faces)
+        print(f"[OK] Gallery bersama {'dibangun' if built else 'dipakai'}: {len(gallery)} wajah "
+              f"(generasi {gallery.generation})")
+        return {'faces': len(gallery), 'shared': True, 'built': built}
+    load_known_faces()
+    print(f"[OK] Gallery dimuat: {len(gallery)} wajah")
+    return {'faces': len(gallery)}
+
+def load_models(warm_up):
+    inference_engine.start()
+    if warm_up:
+        inference_engine.warm_up()
+    print(f"[OK] Model wajah siap ({inference_engine.workers} worker, pemanasan: {'ya' if warm_up else 'tidak'})")
+    return {'workers': inference_engine.workers, 'warm_up': warm_up}
+
+def create_app(warm_up=None, background=True):
+    """Create the Flask app and start loading this process's state.
+
+    Usable as a WSGI entry point, e.g.
+    `gunicorn -w 4 'flask_api_backend:create_app()'`. Each worker process
+    loads storage, the face gallery and the models once, on a background
+    thread unless `background=False`, and reports progress on /api/ready.
+    Do not preload the app in a master process (threads and the inference
+    pool do not survive fork). With several WSGI workers use
+    ABSEN_STORAGE=sqlite, a shared ABSEN_QR_SECRET, ABSEN_SHARED_GALLERY=1
+    (one gallery for all workers) and size ABSEN_INFERENCE_WORKERS per worker.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_BULK_UPLOAD_BYTES
+    app.register_blueprint(api)
+    warm_up = WARMUP_ENABLED if warm_up is None else warm_up
+    readiness.start([
+        ('storage', initialize_data),
+        ('gallery', load_gallery),
+        ('model', lambda: load_models(warm_up)),
+    ], background=background)
+    return app
+
 if __name__ == '__main__':
     print("=" * 50)
     print("SISTEM ABSENSI WAJAH DENGAN ROLE - BACKEND SERVER")
     print("=" * 50)
-    initialize_data()
-    load_known_faces()
-    print(f"\nServer siap di: http://10.91.229.67:5000")
-    print(f"Total wajah terdaftar: {len(set(names))}")
+    app = create_app()
+    print("\nServer siap di: http://10.91.229.67:5000 (status loading: /api/ready)")
     print(f"Dosen terdaftar: {len(PREREGISTERED_DOSEN)}")
+    print(f"Inference worker: {inference_engine.workers}")
     print("Login Dosen:")
     for email, data in PREREGISTERED_DOSEN.items():
         print(f"   Email: {email} | Password: {data['password']}")
     print("=" * 50 + "\n")
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Tanpa reloader: proses induk reloader akan ikut membuat pool inference, warm-up, writer dan reaper
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
\ No newline at end of file
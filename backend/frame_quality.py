@@ -0,0 +1,80 @@
+REJECT_MESSAGES = {
+    'too_dark': 'Gambar terlalu gelap, cari tempat yang lebih terang',
+    'too_bright': 'Gambar terlalu terang, hindari cahaya langsung ke kamera',
+    'blurry': 'Gambar buram, tahan kamera agar tidak bergerak',
+    'face_too_small': 'Wajah terlalu kecil, dekatkan wajah ke kamera',
+    'no_face': 'Wajah tidak terdeteksi, hadapkan wajah ke kamera',
+}
+
+
+class FrameRejected(Exception):
+    """Raised by the pre-filter cascade; `reason` is one of REJECT_MESSAGES."""
+
+    def __init__(self, reason, message=None):
+        message = message or REJECT_MESSAGES.get(reason, reason)
+        super().__init__(reason, message)
+        self.reason = reason
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class FrameFilter:
+    """Cheap checks that reject unusable frames before the face encoder.
+
+    `check_image` measures brightness (mean gray) and sharpness (variance of
+    the Laplacian) on a `sample_dim` copy and runs in the request thread in a
+    few milliseconds. Inside the inference worker, `fast_detect_dim` enables a
+    HOG pass without upsampling on a small copy as a prefilter; the configured
+    detection pass runs only when it finds nothing, and a frame without faces
+    in either is rejected as `no_face`. `check_faces` drops boxes smaller
+    than `min_face_size` pixels before encoding. A threshold of 0 disables a
+    check.
+    """
+
+    def __init__(self, min_brightness=40, max_brightness=220, min_sharpness=20.0,
+                 min_face_size=60, fast_detect_dim=320, sample_dim=320):
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_sharpness = min_sharpness
+        self.min_face_size = min_face_size
+        self.fast_detect_dim = fast_detect_dim
+        self.sample_dim = sample_dim
+
+    def measure(self, rgb):
+        """Return `(brightness, sharpness)` of an RGB uint8 image."""
+        import cv2
+        height, width = rgb.shape[:2]
+        longest = max(height, width)
+        if self.sample_dim and longest > self.sample_dim:
+            scale = self.sample_dim / float(longest)
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            rgb = cv2.resize(rgb, size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        brightness = float(gray.mean())
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        return brightness, sharpness
+
+    def check_image(self, rgb):
+        brightness, sharpness = self.measure(rgb)
+        if self.min_brightness and brightness < self.min_brightness:
+            raise FrameRejected('too_dark')
+        if self.max_brightness and brightness > self.max_brightness:
+            raise FrameRejected('too_bright')
+        if self.min_sharpness and sharpness < self.min_sharpness:
+            raise FrameRejected('blurry')
+        return brightness, sharpness
+
+    def check_faces(self, locations):
+        """Keep faces of at least `min_face_size` px; raise if all are smaller."""
+        if not self.min_face_size or not locations:
+            return list(locations)
+        kept = [
+            (top, right, bottom, left) for top, right, bottom, left in locations
+            if min(bottom - top, right - left) >= self.min_face_size
+        ]
+        if not kept:
+            raise FrameRejected('face_too_small')
+        return kept
+
@@ -0,0 +1,95 @@
+import base64
+import binascii
+from io import BytesIO
+
+import numpy as np
+
+# cv2 dan PIL diimport saat pertama dipakai (import modul ini tetap murah)
+
+# Resolusi maksimum yang disimpan setelah decode (untuk encoding wajah)
+DECODE_MAX_DIM = 1600
+# Resolusi maksimum untuk deteksi wajah (HOG/CNN); waktu deteksi ~ jumlah piksel
+DETECT_MAX_DIM = 640
+
+_REDUCED_FLAGS = (
+    (8, 'IMREAD_REDUCED_COLOR_8'),
+    (4, 'IMREAD_REDUCED_COLOR_4'),
+    (2, 'IMREAD_REDUCED_COLOR_2'),
+)
+
+
+def _reduction_flag(data, max_dim):
+    """Pick the largest IMREAD_REDUCED_* factor that keeps max(w, h) >= max_dim."""
+    import cv2
+    from PIL import Image
+    if not max_dim:
+        return cv2.IMREAD_COLOR
+    try:
+        # PIL hanya membaca header di sini, tidak men-decode piksel
+        width, height = Image.open(BytesIO(data)).size
+    except Exception:
+        return cv2.IMREAD_COLOR
+    longest = max(width, height)
+    for factor, flag in _REDUCED_FLAGS:
+        if longest // factor >= max_dim:
+            return getattr(cv2, flag)
+    return cv2.IMREAD_COLOR
+
+
+def decode_image_bytes(data, max_dim=DECODE_MAX_DIM):
+    """Decode JPEG/PNG bytes straight to an RGB uint8 array.
+
+    Large photos are decoded at reduced resolution (libjpeg DCT scaling) so a
+    12 MP upload never materializes at full size; EXIF orientation is applied
+    by `cv2.imdecode`. Returns None if the bytes are not a valid image.
+    """
+    import cv2
+    buf = np.frombuffer(data, dtype=np.uint8)
+    flag = _reduction_flag(data, max_dim)
+    rgb_flag = getattr(cv2, 'IMREAD_COLOR_RGB', None)
+    if flag == cv2.IMREAD_COLOR and rgb_flag is not None:
+        return cv2.imdecode(buf, rgb_flag)
+    img = cv2.imdecode(buf, flag)
+    if img is None:
+        return None
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def decode_base64_image(base64_string, max_dim=DECODE_MAX_DIM):
+    """Decode a (data-URL or plain) base64 image to RGB; None if invalid."""
+    try:
+        payload = base64_string.split(',', 1)[1] if ',' in base64_string else base64_string
+        data = base64.b64decode(payload)
+    except (binascii.Error, ValueError, AttributeError):
+        return None
+    return decode_image_bytes(data, max_dim)
+
+
+def downscale_for_detection(rgb, max_dim=DETECT_MAX_DIM):
+    """Return `(small, scale)` with max(small.shape[:2]) <= max_dim and
+    scale = original / small (1.0 if no resize was needed)."""
+    import cv2
+    height, width = rgb.shape[:2]
+    longest = max(height, width)
+    if not max_dim or longest <= max_dim:
+        return rgb, 1.0
+    scale = longest / float(max_dim)
+    size = (max(1, int(round(width / scale))), max(1, int(round(height / scale))))
+    return cv2.resize(rgb, size, interpolation=cv2.INTER_AREA), scale
+
+
+def rescale_locations(locations, scale, shape):
+    """Map (top, right, bottom, left) boxes from the detection image back to
+    the original image, clipped to its bounds."""
+    if scale == 1.0:
+        return list(locations)
+    height, width = shape[:2]
+    rescaled = []
+    for top, right, bottom, left in locations:
+        rescaled.append((
+            max(0, int(round(top * scale))),
+            min(width, int(round(right * scale))),
+            min(height, int(round(bottom * scale))),
+            max(0, int(round(left * scale))),
+        ))
+    return rescaled
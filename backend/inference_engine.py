@@ -0,0 +1,359 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class EngineBusy(Exception):
+    """Raised when the inference queue is full; the caller should answer 503."""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Server sedang sibuk, coba lagi sebentar")
+        self.retry_after = retry_after
+
+
+# ---- worker side ----
+
+_face_recognition = None
+_detect_max_dim = None
+_frame_filter = None
+
+
+def _init_worker(detect_max_dim=None, frame_filter=None):
+    # Muat model dlib sekali per proses worker (bukan per request)
+    global _face_recognition, _detect_max_dim, _frame_filter
+    import face_recognition
+    _face_recognition = face_recognition
+    _detect_max_dim = detect_max_dim
+    _frame_filter = frame_filter
+    warmup = np.zeros((64, 64, 3), dtype=np.uint8)
+    _face_recognition.face_locations(warmup)
+
+
+def _warm_up():
+    # Satu pass encoder agar request pertama tidak menanggung inisialisasi model
+    warmup = np.zeros((64, 64, 3), dtype=np.uint8)
+    _face_recognition.face_encodings(warmup, [(0, 64, 64, 0)])
+    return os.getpid()
+
+
+def _locate(rgb, model, upsample, group=False):
+    """Detect on a downscaled copy, return boxes in full-image coordinates.
+
+    With a frame filter, a HOG pass without upsampling on a small copy runs
+    first as a prefilter: the faces it finds are used as they are. Only when
+    it finds nothing does the configured pass (`model`, `upsample`,
+    `detect_max_dim`) run, and a frame without faces there is rejected
+    (`no_face`). Faces below the minimum size raise `FrameRejected` before
+    any encoding work. `group` (class photos with many small faces) detects
+    on the image as given and skips the cascade.
+    """
+    from frame_quality import FrameRejected
+    from image_pipeline import downscale_for_detection, rescale_locations
+    if group:
+        return _face_recognition.face_locations(rgb, number_of_times_to_upsample=upsample, model=model)
+    locations = []
+    if _frame_filter is not None and _frame_filter.fast_detect_dim:
+        small, scale = downscale_for_detection(rgb, _frame_filter.fast_detect_dim)
+        found = _face_recognition.face_locations(small, number_of_times_to_upsample=0, model='hog')
+        locations = rescale_locations(found, scale, rgb.shape)
+    if not locations:
+        small, scale = downscale_for_detection(rgb, _detect_max_dim)
+        found = _face_recognition.face_locations(small, number_of_times_to_upsample=upsample, model=model)
+        locations = rescale_locations(found, scale, rgb.shape)
+    if _frame_filter is not None:
+        if not locations:
+            raise FrameRejected('no_face')
+        locations = _frame_filter.check_faces(locations)
+    return locations
+
+
+def _locate_and_encode_batch(images, model, upsample, group=False, timings=None):
+    """Per image `(locations, encodings)`, or the `FrameRejected` it raised.
+    Stage durations are added to `timings` when given."""
+    from frame_quality import FrameRejected
+    start = time.perf_counter()
+    locations_list, rejected = [], {}
+    for i, img in enumerate(images):
+        try:
+            locations_list.append(_locate(img, model, upsample, group))
+        except FrameRejected as e:
+            locations_list.append([])
+            rejected[i] = e
+    located = time.perf_counter()
+    encodings_list = _batch_encode(images, locations_list)
+    if timings is not None:
+        timings['face_locations'] = located - start
+        timings['face_encodings'] = time.perf_counter() - located
+    return [rejected.get(i, result) for i, result in enumerate(zip(locations_list, encodings_list))]
+
+
+def _detect_and_encode(shm_name, shape, model, upsample, known_locations):
+    # Segment dibuat dan di-unlink oleh proses utama; worker hanya attach + close
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        rgb = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        timings = {}
+        locations, encodings = _locate_and_encode_one(rgb, model, upsample, known_locations, timings)
+        del rgb
+        return locations, [np.asarray(e) for e in encodings], timings
+    finally:
+        shm.close()
+
+
+def _locate_and_encode_one(rgb, model, upsample, known_locations, timings):
+    start = time.perf_counter()
+    locations = _locate(rgb, model, upsample) if known_locations is None else known_locations
+    located = time.perf_counter()
+    encodings = _face_recognition.face_encodings(rgb, locations) if locations else []
+    timings['face_locations'] = located - start
+    timings['face_encodings'] = time.perf_counter() - located
+    return locations, encodings
+
+
+def _batch_encode(images, locations_list):
+    """Descriptors for several images with one batched dlib call.
+
+    Uses `compute_face_descriptor(batch_img, batch_faces)` when the installed
+    dlib supports it, otherwise falls back to per-image `face_encodings`.
+    """
+    import dlib
+    from face_recognition import api
+
+    batch_imgs, batch_faces, owners = [], [], []
+    for i, (img, locations) in enumerate(zip(images, locations_list)):
+        if locations:
+            detections = dlib.full_object_detections()
+            detections.extend(api._raw_face_landmarks(img, locations, model='small'))
+            batch_imgs.append(img)
+            batch_faces.append(detections)
+            owners.append(i)
+
+    encodings = [[] for _ in images]
+    if not batch_imgs:
+        return encodings
+    try:
+        descriptors = api.face_encoder.compute_face_descriptor(batch_imgs, batch_faces, 1)
+    except (TypeError, RuntimeError):
+        for i in owners:
+            encodings[i] = [np.asarray(e) for e in _face_recognition.face_encodings(images[i], locations_list[i])]
+        return encodings
+    for i, per_image in zip(owners, descriptors):
+        encodings[i] = [np.array(d) for d in per_image]
+    return encodings
+
+
+def _detect_and_encode_batch(specs, model, upsample, group=False):
+    segments = [shared_memory.SharedMemory(name=name) for name, _ in specs]
+    try:
+        images = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf) for shm, (_, shape) in zip(segments, specs)]
+        timings = {}
+        results = _locate_and_encode_batch(images, model, upsample, group, timings)
+        del images
+        return results, timings
+    finally:
+        for shm in segments:
+            shm.close()
+
+
+# ---- parent side ----
+
+class InferenceEngine:
+    """Pool of worker processes running face detection + encoding.
+
+    Each worker preloads the dlib models once. Decoded RGB images are passed
+    through shared memory (only the segment name crosses the process
+    boundary). Detection runs on a copy downscaled to `detect_max_dim`;
+    encoding uses the rescaled boxes on the full image; `frame_filter`
+    (see frame_quality) adds a fast low-res pass and a minimum face size.
+    At most `max_pending` images may be queued or running (a batch takes one
+    slot per image); beyond that `EngineBusy` is raised immediately instead
+    of piling up requests. `split_batch` sizes batches so they spread over
+    the workers.
+    With `workers=0` everything runs inline in the calling thread.
+    `on_timing(stage, seconds)` receives the detection / encoding time of
+    every task, measured inside the worker.
+    """
+
+    def __init__(self, workers=None, max_pending=None, timeout=30, detect_max_dim=None, frame_filter=None,
+                 on_timing=None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.on_timing = on_timing
+        self.detect_max_dim = detect_max_dim
+        self.frame_filter = frame_filter
+        self.max_pending = max_pending or max(1, self.workers) * 8
+        self.timeout = timeout
+        self._pending = 0
+        self._slots = threading.Condition()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _acquire(self, n, wait=0, reserve=0):
+        # Satu slot per gambar; batch yang lebih besar dari max_pending hanya jalan saat pool kosong.
+        # `reserve` slot dibiarkan kosong untuk pemanggil lain (job latar belakang)
+        with self._slots:
+            if not self._slots.wait_for(
+                    lambda: self._pending == 0 or self._pending + n <= self.max_pending - reserve, wait):
+                self.rejected += 1
+                raise EngineBusy()
+            self._pending += n
+
+    def _release(self, n):
+        with self._slots:
+            self._pending -= n
+            self._slots.notify_all()
+
+    def _report(self, timings):
+        if self.on_timing is not None:
+            for stage, seconds in timings.items():
+                self.on_timing(stage, seconds)
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                ctx = multiprocessing.get_context('spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx,
+                                                 initializer=_init_worker, initargs=(self.detect_max_dim, self.frame_filter))
+            return self._pool
+
+    def start(self):
+        if self.workers > 0:
+            self._get_pool()
+        return self
+
+    def warm_up(self, timeout=None):
+        """Start the workers and run one detection + encoding pass in each
+        before any request arrives; returns the number of worker processes
+        that answered (0 when running inline)."""
+        if self.workers <= 0:
+            if _face_recognition is None:
+                _init_worker(self.detect_max_dim, self.frame_filter)
+            _warm_up()
+            return 0
+        pool = self._get_pool()
+        futures = [pool.submit(_warm_up) for _ in range(self.workers)]
+        return len({future.result(timeout) for future in futures})
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def detect_and_encode(self, rgb, model='hog', upsample=1, locations=None):
+        """Return `(locations, encodings)` for an RGB uint8 image."""
+        self._acquire(1)
+        try:
+            if self.workers <= 0:
+                if _face_recognition is None:
+                    _init_worker(self.detect_max_dim, self.frame_filter)
+                return self._run_inline(rgb, model, upsample, locations)
+            return self._run_pool(rgb, model, upsample, locations)
+        finally:
+            self._release(1)
+
+    def split_batch(self, count, max_size=None):
+        """`(start, stop)` ranges splitting `count` images over the workers,
+        each at most `max_size` (default `max_pending`) images."""
+        parts = max(1, min(self.workers or 1, count))
+        size = max(1, min(-(-count // parts), max_size or self.max_pending))
+        return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+    def submit_batch(self, images, model='hog', upsample=1, group=False, wait=0, reserve=0):
+        """Detect + encode several images as one task; returns a Future of
+        `[(locations, encodings) or FrameRejected, ...]`. Raises `EngineBusy`
+        when no slot frees up within `wait` seconds (`wait=None` blocks until
+        one does). `reserve` slots stay free for other callers, so background
+        work cannot starve live requests. `group=True` is for class photos
+        (see `_locate`)."""
+        n = len(images)
+        self._acquire(n, wait, reserve)
+
+        def release(_):
+            self._release(n)
+
+        future = Future()
+        if self.workers <= 0:
+            try:
+                if _face_recognition is None:
+                    _init_worker(self.detect_max_dim, self.frame_filter)
+                timings = {}
+                results = _locate_and_encode_batch(images, model, upsample, group, timings)
+                self._report(timings)
+                future.set_result(results)
+            except Exception as e:
+                future.set_exception(e)
+            release(future)
+            return future
+
+        segments = []
+        try:
+            specs = []
+            for rgb in images:
+                rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+                shm = shared_memory.SharedMemory(create=True, size=max(rgb.nbytes, 1))
+                segments.append(shm)
+                np.ndarray(rgb.shape, dtype=np.uint8, buffer=shm.buf)[...] = rgb
+                specs.append((shm.name, rgb.shape))
+            task = self._get_pool().submit(_detect_and_encode_batch, specs, model, upsample, group)
+        except Exception:
+            self._close_segments(segments)
+            release(None)
+            raise
+
+        def done(f):
+            self._close_segments(segments)
+            release(f)
+            try:
+                results, timings = f.result()
+            except Exception as e:
+                future.set_exception(e)
+                return
+            self._report(timings)
+            future.set_result(results)
+        task.add_done_callback(done)
+        return future
+
+    @staticmethod
+    def _close_segments(segments):
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+
+    def encode(self, rgb, model='hog', upsample=1):
+        """Encodings only (same as `face_recognition.face_encodings(rgb)`)."""
+        return self.detect_and_encode(rgb, model=model, upsample=upsample)[1]
+
+    def _run_inline(self, rgb, model, upsample, locations):
+        timings = {}
+        result = _locate_and_encode_one(rgb, model, upsample, locations, timings)
+        self._report(timings)
+        return result
+
+    def _run_pool(self, rgb, model, upsample, locations):
+        rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+        shm = shared_memory.SharedMemory(create=True, size=max(rgb.nbytes, 1))
+        try:
+            np.ndarray(rgb.shape, dtype=np.uint8, buffer=shm.buf)[...] = rgb
+            future = self._get_pool().submit(_detect_and_encode, shm.name, rgb.shape, model, upsample, locations)
+            try:
+                locations, encodings, timings = future.result(self.timeout)
+            except FutureTimeout:
+                # Worker tidak selesai dalam batas waktu: sibuk (503), bukan error 500
+                future.cancel()
+                self.rejected += 1
+                raise EngineBusy()
+            self._report(timings)
+            return locations, encodings
+        finally:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,171 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Batas bucket histogram latensi (detik)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    """Latency histograms, counters and scrape-time gauges in Prometheus format.
+
+    `stage(name)` times one step of a request (`absen_stage_duration_seconds`)
+    and also records it for the current thread, so a slow request can be
+    logged with its breakdown. Gauges are callables evaluated only when
+    `/api/metrics` is scraped. With `enabled=False`, `stage()` returns a
+    shared no-op context manager and observations return immediately.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS, prefix='absen'):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = []
+        self._help = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # ---- recording ----
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe_stage(self, stage, seconds):
+        """Record a stage duration (usable as an `on_timing` callback)."""
+        if not self.enabled:
+            return
+        self.observe('stage_duration_seconds', seconds, stage=stage)
+        stages = getattr(self._local, 'stages', None)
+        if stages is not None:
+            stages.append((stage, seconds))
+
+    def stage(self, name):
+        return _StageTimer(self, name) if self.enabled else _NULL_TIMER
+
+    def gauge(self, name, fn, help='', label='label'):
+        """Register `fn() -> number | {label_value: number}`; dict keys become `label`."""
+        self._gauges.append((name, fn, label))
+        if help:
+            self._help[name] = help
+
+    def describe(self, name, help):
+        self._help[name] = help
+
+    # ---- per-request breakdown ----
+    def begin_request(self):
+        self._local.stages = [] if self.enabled else None
+
+    def end_request(self):
+        stages = getattr(self._local, 'stages', None) or []
+        self._local.stages = None
+        return stages
+
+    # ---- export ----
+    def render(self):
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name in seen:
+                return
+            seen.add(name)
+            help_text = self._help.get(name)
+            if help_text:
+                lines.append(f'# HELP {self.prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {self.prefix}_{name} {kind}')
+
+        with self._lock:
+            histograms = sorted((k, (list(h.counts), h.sum, h.count)) for k, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        for (name, labels), (counts, total, count) in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.prefix}_{name}_bucket{_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{self.prefix}_{name}_sum{_labels(labels)} {total:.6f}')
+            lines.append(f'{self.prefix}_{name}_count{_labels(labels)} {count}')
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f'{self.prefix}_{name}{_labels(labels)} {value}')
+
+        for name, fn, label_name in self._gauges:
+            try:
+                value = fn()
+            except Exception as e:
+                print(f"[WARN] Metric {name}: {e}")
+                continue
+            header(name, 'gauge')
+            if isinstance(value, dict):
+                for label, v in sorted(value.items()):
+                    lines.append(f'{self.prefix}_{name}{_labels(((label_name, label),))} {v}')
+            elif value is not None:
+                lines.append(f'{self.prefix}_{name} {value}')
+        return '\n'.join(lines) + '\n'
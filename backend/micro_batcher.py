@@ -0,0 +1,212 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import numpy as np
+
+from face_gallery import DEFAULT_TOLERANCE
+from inference_engine import EngineBusy
+
+
+class _Request:
+    __slots__ = ('rgb', 'tolerance', 'match', 'future', 'enqueued')
+
+    def __init__(self, rgb, tolerance, match=True):
+        self.rgb = rgb
+        self.tolerance = tolerance
+        self.match = match
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+def _best(rows, tolerance):
+    if not rows:
+        return None
+    best = dict(rows[0])
+    best['match'] = best['distance'] <= tolerance
+    return best
+
+
+class MicroBatcher:
+    """Micro-batching in front of face encoding and gallery matching.
+
+    Recognition requests that arrive within `window` seconds (or until
+    `max_batch` requests are waiting) are split over the inference workers,
+    one task per worker whose descriptors are computed with one batched dlib
+    call. Each image takes one engine slot; while the engine is saturated
+    the batcher waits (up to `timeout`) and new requests queue here, so
+    `max_queue` is the backpressure limit. All resulting encodings are then
+    matched against the gallery with a single matrix product and the results
+    fanned back out to the waiting requests.
+    Batch sizes and queue waits are tracked in `stats()` for tuning `window`;
+    `on_timing('batch_match', seconds)` receives the gallery matching time.
+    """
+
+    def __init__(self, engine, gallery, window=0.01, max_batch=16, max_queue=64,
+                 model='hog', upsample=1, timeout=30, on_timing=None):
+        self.engine = engine
+        self.on_timing = on_timing
+        self.gallery = gallery
+        self.window = window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.model = model
+        self.upsample = upsample
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._last_batch_size = 0
+        self._max_batch_seen = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='recognition-batcher', daemon=True)
+                self._thread.start()
+        return self
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def recognize(self, rgb, tolerance=DEFAULT_TOLERANCE, match=True):
+        """Return `(locations, encodings, matches)` for one image.
+
+        `matches[i]` is the best gallery candidate for face i (dict as from
+        `FaceGallery.match`, with `match` evaluated at `tolerance`) or None.
+        With `match=False` only the encodings are computed (`matches` is
+        empty), e.g. when the caller verifies 1:1 against a claimed id.
+        """
+        if self._queue.qsize() >= self.max_queue:
+            self.engine.rejected += 1
+            raise EngineBusy()
+        request = _Request(rgb, tolerance, match)
+        if self._thread is None:
+            self.start()
+        self._queue.put(request)
+        try:
+            return request.future.result(self.timeout)
+        except FutureTimeout:
+            # Engine jenuh sampai batas waktu: jawab 503 seperti antrean penuh, bukan 500
+            self.engine.rejected += 1
+            raise EngineBusy()
+
+    def match(self, encodings, tolerance=DEFAULT_TOLERANCE):
+        """Gallery matches for already computed encodings (e.g. from a cache),
+        in the same format as the `matches` returned by `recognize`."""
+        if not len(encodings):
+            return []
+        rows = self.gallery.match(np.asarray(encodings).reshape(-1, 128), k=1)
+        return [_best(r, tolerance) for r in rows]
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        now = time.monotonic()
+        waits = [now - r.enqueued for r in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._last_batch_size = len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+        parts = []
+        for start, stop in self.engine.split_batch(len(batch)):
+            part = batch[start:stop]
+            try:
+                future = self.engine.submit_batch([r.rgb for r in part], model=self.model, upsample=self.upsample,
+                                                  wait=self.timeout)
+            except Exception as e:
+                for r in part:
+                    r.future.set_exception(e)
+                continue
+            parts.append((part, future))
+        if not parts:
+            return
+        remaining = [len(parts)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            self._fan_out(parts)
+        for _, future in parts:
+            future.add_done_callback(done)
+
+    def _fan_out(self, parts):
+        batch, results = [], []
+        for part, future in parts:
+            try:
+                part_results = future.result()
+            except Exception as e:
+                for r in part:
+                    r.future.set_exception(e)
+                continue
+            batch.extend(part)
+            results.extend(part_results)
+        try:
+            flat = [
+                enc for r, result in zip(batch, results)
+                if r.match and not isinstance(result, Exception) for enc in result[1]
+            ]
+            start = time.perf_counter()
+            candidates = self.gallery.match(np.asarray(flat).reshape(-1, 128), k=1) if flat else []
+            if flat and self.on_timing is not None:
+                self.on_timing('batch_match', time.perf_counter() - start)
+        except Exception as e:
+            for r in batch:
+                if not r.future.done():
+                    r.future.set_exception(e)
+            return
+
+        pos = 0
+        for r, result in zip(batch, results):
+            # Frame yang ditolak cascade (FrameRejected) hanya menggagalkan request-nya sendiri
+            if isinstance(result, Exception):
+                r.future.set_exception(result)
+                continue
+            locations, encodings = result
+            matches = []
+            if not r.match:
+                r.future.set_result((locations, encodings, matches))
+                continue
+            for _ in encodings:
+                rows = candidates[pos] if pos < len(candidates) else []
+                pos += 1
+                matches.append(_best(rows, r.tolerance))
+            r.future.set_result((locations, encodings, matches))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'batches': self._batches,
+                'requests': self._requests,
+                'avg_batch_size': round(self._requests / self._batches, 2) if self._batches else 0,
+                'last_batch_size': self._last_batch_size,
+                'max_batch_size': self._max_batch_seen,
+                'avg_queue_wait_ms': round(self._wait_total / self._requests * 1000, 2) if self._requests else 0,
+                'max_queue_wait_ms': round(self._wait_max * 1000, 2),
+                'queue_depth': self._queue.qsize(),
+                'window_ms': self.window * 1000,
+            }
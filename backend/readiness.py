@@ -0,0 +1,84 @@
+import threading
+import time
+
+
+class NotReady(Exception):
+    """Raised while a component a request needs is still loading (503)."""
+
+    def __init__(self, components, retry_after=2):
+        self.components = list(components)
+        super().__init__(f"Server sedang memuat {', '.join(self.components)}, coba lagi sebentar")
+        self.retry_after = retry_after
+
+
+class Readiness:
+    """Load state of the components requests depend on.
+
+    Every component moves from `pending` to `loading` to `ready` (or
+    `failed`, with the error). `start(steps)` runs `(component, fn)` steps in
+    order on a daemon thread, so the process answers liveness checks while
+    the gallery and the face models load; `fn` may return a dict that is
+    reported with the component (e.g. the number of faces). A failed step
+    does not stop the steps after it.
+    """
+
+    def __init__(self, components):
+        self._state = {name: {'status': 'pending'} for name in components}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._started = False
+        self.started_at = time.time()
+
+    def start(self, steps, background=True):
+        """Run `steps` once per process; later calls are no-ops."""
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+        if background:
+            threading.Thread(target=self._run, args=(steps,), name='warm-up', daemon=True).start()
+        else:
+            self._run(steps)
+        return self
+
+    def _set(self, name, **state):
+        with self._lock:
+            self._state[name] = state
+
+    def _run(self, steps):
+        try:
+            for name, fn in steps:
+                self._set(name, status='loading')
+                start = time.perf_counter()
+                try:
+                    info = fn() or {}
+                except Exception as e:
+                    print(f"[ERROR] Gagal memuat {name}: {e}")
+                    self._set(name, status='failed', error=str(e), seconds=round(time.perf_counter() - start, 3))
+                    continue
+                self._set(name, status='ready', seconds=round(time.perf_counter() - start, 3), **info)
+        finally:
+            self._done.set()
+
+    def wait(self, timeout=None):
+        """Block until all steps ran; False on timeout."""
+        return self._done.wait(timeout)
+
+    def is_ready(self, *names):
+        with self._lock:
+            return all(self._state[n]['status'] == 'ready' for n in (names or self._state))
+
+    def require(self, *names):
+        with self._lock:
+            missing = [n for n in names if self._state[n]['status'] != 'ready']
+        if missing:
+            raise NotReady(missing)
+
+    def snapshot(self):
+        with self._lock:
+            components = {name: dict(state) for name, state in self._state.items()}
+        return {
+            'ready': all(s['status'] == 'ready' for s in components.values()),
+            'uptime': round(time.time() - self.started_at, 3),
+            'components': components,
+        }
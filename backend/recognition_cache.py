@@ -0,0 +1,91 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Perkiraan overhead per entry (key, tuple, list lokasi) di luar array encoding
+_ENTRY_OVERHEAD = 256
+
+
+def image_key(image):
+    """Content hash of an uploaded image (raw bytes or base64 string)."""
+    data = image if isinstance(image, (bytes, bytearray, memoryview)) else str(image).encode('ascii', 'ignore')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class RecognitionCache:
+    """In-memory LRU cache of `(locations, encodings)` per image content.
+
+    Retries and double taps upload the exact same bytes within seconds; a
+    hit skips decoding, the quality checks and the inference pool entirely
+    (matching against the gallery is still done fresh). Entries expire after
+    `ttl` seconds and the least recently used ones are evicted once
+    `max_entries` or `max_bytes` is exceeded.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _size(locations, encodings):
+        return _ENTRY_OVERHEAD + sum(getattr(e, 'nbytes', 0) for e in encodings) + 32 * len(locations)
+
+    def get(self, key):
+        """Return `(locations, encodings)` or None on a miss / expired entry."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, locations, encodings):
+        size = self._size(locations, encodings)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, list(locations), list(encodings), size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions,
+                'ttl_s': self.ttl,
+            }
@@ -0,0 +1,233 @@
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+
+class SessionRegistry:
+    """In-memory registry of attendance sessions.
+
+    Sessions are kept in a dict keyed by `session_id` and indexed by
+    `dosen_id`; every change is written through to `storage`, so a check-in
+    validates its session with a dict lookup instead of parsing
+    `sessions.json`. Sessions end automatically at `expires_at`: a heap of
+    deadlines is drained by a reaper thread (and on every access).
+
+    With storage shared by several worker processes (`storage.shared`,
+    SQLite) a session may have been started or ended by another worker, so
+    lookups and listings read storage and the dict only serves this
+    worker's expiry heap. Sessions read from storage are checked against
+    `expires_ts` as well. Storage I/O never runs under the registry lock.
+
+    The QR code of a session encodes a short-lived token signed with HMAC
+    that rotates every `token_period` seconds; the previous token stays
+    valid for one more period. QR images are rendered once per rotation by
+    `render_qr(text) -> bytes` and served from cache.
+    """
+
+    def __init__(self, storage, secret=None, token_period=60, default_duration=2 * 3600, render_qr=None):
+        self.storage = storage
+        self.secret = secret or os.urandom(32)
+        if isinstance(self.secret, str):
+            self.secret = self.secret.encode()
+        self.token_period = token_period
+        self.default_duration = default_duration
+        self.render_qr = render_qr
+        self.shared = getattr(storage, 'shared', False)
+        self._sessions = {}
+        self._by_dosen = {}
+        self._heap = []
+        self._qr_cache = {}
+        self._cond = threading.Condition(threading.RLock())
+        self._thread = None
+
+    # ---- lifecycle ----
+    def load(self):
+        """Load active sessions from storage (e.g. after a restart)."""
+        sessions = self.storage.list_sessions(active=True)
+        with self._cond:
+            for session in sessions:
+                if session.get('session_id'):
+                    self._add(session)
+        self._expire_due()
+        return self
+
+    def start_reaper(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._reap, name='session-reaper', daemon=True)
+                self._thread.start()
+        return self
+
+    def _reap(self):
+        while True:
+            self._expire_due()
+            with self._cond:
+                if self._heap and self._heap[0][0] <= time.time():
+                    continue
+                timeout = self._heap[0][0] - time.time() if self._heap else None
+                self._cond.wait(timeout)
+
+    def _add(self, session):
+        session_id = session['session_id']
+        self._sessions[session_id] = session
+        self._by_dosen.setdefault(session.get('dosen_id'), set()).add(session_id)
+        expires = session.get('expires_ts')
+        if expires:
+            heapq.heappush(self._heap, (expires, session_id))
+            self._cond.notify_all()
+
+    def _forget(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            ids = self._by_dosen.get(session.get('dosen_id'))
+            if ids is not None:
+                ids.discard(session_id)
+            for key in [k for k in self._qr_cache if k[0] == session_id]:
+                del self._qr_cache[key]
+        return session
+
+    def _expire_due(self, now=None):
+        now = time.time() if now is None else now
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                _, session_id = heapq.heappop(self._heap)
+                session = self._sessions.get(session_id)
+                if session is not None and session.get('expires_ts', now + 1) <= now:
+                    due.append(session_id)
+        for session_id in due:
+            self.end(session_id, reason='expired')
+
+    def _check_stored(self, session):
+        """A session read from storage: end it if past `expires_ts`, drop the
+        local copy if another worker already ended it."""
+        if session is None:
+            return None
+        session_id = session.get('session_id')
+        if session.get('is_active'):
+            if session.get('expires_ts') and session['expires_ts'] <= time.time():
+                return self.end(session_id, reason='expired') or self.storage.get_session(session_id)
+            return session
+        with self._cond:
+            self._forget(session_id)
+        return session
+
+    # ---- sessions ----
+    def start(self, dosen_id, dosen_name, mata_kuliah, duration=None):
+        now = datetime.now()
+        duration = duration or self.default_duration
+        session = {
+            'session_id': f"S{uuid.uuid4().hex[:10]}",
+            'dosen_id': dosen_id,
+            'dosen_name': dosen_name,
+            'mata_kuliah': mata_kuliah,
+            'tanggal': now.strftime('%Y-%m-%d'),
+            'waktu_mulai': now.strftime('%H:%M:%S'),
+            'timestamp': now.isoformat(),
+            'expires_ts': time.time() + duration,
+            'is_active': True,
+            'mahasiswa_absen': []
+        }
+        session['expires_at'] = datetime.fromtimestamp(session['expires_ts']).isoformat()
+        self.storage.save_session(session)
+        with self._cond:
+            self._add(session)
+        return session
+
+    def get(self, session_id):
+        self._expire_due()
+        with self._cond:
+            session = self._sessions.get(session_id)
+        if session_id and (session is None or self.shared):
+            # Sesi yang sudah berakhir tidak disimpan di memori; dengan storage bersama
+            # sesi bisa dimulai / diakhiri worker lain
+            session = self._check_stored(self.storage.get_session(session_id))
+        return session
+
+    def list_sessions(self, dosen_id=None, active=True):
+        if not active:
+            return self.storage.list_sessions(dosen_id=dosen_id, active=active)
+        self._expire_due()
+        if self.shared:
+            sessions = [self._check_stored(s) for s in self.storage.list_sessions(dosen_id=dosen_id, active=True)]
+            return [s for s in sessions if s.get('is_active')]
+        with self._cond:
+            if dosen_id is None:
+                return [dict(s) for s in self._sessions.values()]
+            return [dict(self._sessions[sid]) for sid in self._by_dosen.get(dosen_id, ())]
+
+    def end(self, session_id, reason=None):
+        """End an active session (of any worker); None if unknown or already ended."""
+        with self._cond:
+            session = self._forget(session_id)
+        fields = {'waktu_selesai': datetime.now().strftime('%H:%M:%S')}
+        if reason:
+            fields['end_reason'] = reason
+        # mahasiswa_absen di memori digabung dengan yang sudah ditulis writer ke storage,
+        # dalam satu read-modify-write storage (lock / transaksi yang sama dengan commit_batch)
+        return self.storage.end_session(session_id, fields, (session or {}).get('mahasiswa_absen', []))
+
+    def mark_attended(self, session_id, mahasiswa_ids):
+        """Mirror `mahasiswa_absen` after the writer committed check-ins."""
+        with self._cond:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            absen = session.setdefault('mahasiswa_absen', [])
+            for mahasiswa_id in mahasiswa_ids:
+                if mahasiswa_id and mahasiswa_id not in absen:
+                    absen.append(mahasiswa_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    # ---- rotating QR tokens ----
+    def _period(self, now=None):
+        return int((time.time() if now is None else now) // self.token_period)
+
+    def _sign(self, session_id, period):
+        digest = hmac.new(self.secret, f"{session_id}:{period}".encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:12]).decode()
+
+    def barcode_data(self, session_id, now=None):
+        """Current QR payload (JSON string) and seconds until it rotates."""
+        now = time.time() if now is None else now
+        period = self._period(now)
+        payload = json.dumps({'session_id': session_id, 't': period, 'sig': self._sign(session_id, period)})
+        return payload, int((period + 1) * self.token_period - now)
+
+    def verify_barcode(self, session_id, scanned, now=None):
+        """True if `scanned` (dict from the QR) carries a valid, unexpired token."""
+        if not isinstance(scanned, dict) or scanned.get('session_id') != session_id:
+            return False
+        try:
+            period = int(scanned.get('t'))
+        except (TypeError, ValueError):
+            return False
+        if self._period(now) - period not in (0, 1):
+            return False
+        return hmac.compare_digest(str(scanned.get('sig', '')), self._sign(session_id, period))
+
+    def qr_png(self, session_id, now=None):
+        """`(png_bytes, barcode_data, expires_in)`; rendered once per rotation."""
+        now = time.time() if now is None else now
+        period = self._period(now)
+        key = (session_id, period)
+        with self._cond:
+            cached = self._qr_cache.get(key)
+        if cached is None:
+            payload, _ = self.barcode_data(session_id, now)
+            cached = (self.render_qr(payload), payload)
+            with self._cond:
+                for old in [k for k in self._qr_cache if k[0] == session_id and k[1] < period]:
+                    del self._qr_cache[old]
+                self._qr_cache[key] = cached
+        png, payload = cached
+        return png, payload, int((period + 1) * self.token_period - now)
@@ -0,0 +1,322 @@
+import json
+import mmap
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from face_gallery import DEFAULT_TOLERANCE, ENCODING_DIM, FaceGallery
+
+try:
+    import fcntl
+except ImportError:  # Windows: gallery bersama tidak tersedia
+    fcntl = None
+
+MAGIC = b'AWGAL001'
+HEADER_SIZE = 64
+# Field header (u64 little-endian setelah magic)
+_DIM, _CAPACITY, _COUNT, _EPOCH, _GENERATION, _VALID, _JOURNAL_LINES = range(7)
+# Journal dipadatkan (diganti satu snapshot) setelah lebih dari max(ini, 2 x jumlah wajah) baris
+COMPACT_MIN_LINES = 1024
+
+
+class SharedFaceGallery(FaceGallery):
+    """FaceGallery whose encoding matrix is shared by several processes.
+
+    The rows live in one memory-mapped file (`path`), so every worker process
+    of the server matches against the same physical pages instead of its
+    own copy. Names, user ids and squared norms stay per process and are kept
+    in step through an append-only journal (`journal_path`, one JSON line
+    per change). The header carries a generation number that is bumped on
+    every change; before each call a process compares it with the one it
+    has applied and replays only the new journal lines. Once the journal
+    holds more than `max(compact_min_lines, 2 * count)` lines (count from
+    the header), the writer replaces it with one snapshot line under a new
+    epoch, so it stays proportional to the gallery size.
+
+    Changes take an exclusive `flock` on the journal and reads a shared one,
+    so a match never sees a half-applied enrollment of another process.
+    `open(build)` elects the first process as builder: it runs `build()`
+    (normally a full `rebuild` from storage) while the others wait, and
+    processes started later attach without loading anything. Every member
+    keeps a shared lock on the gallery file for its lifetime, so the next
+    cold start (no live member left) rebuilds from storage again.
+    """
+
+    def __init__(self, path, journal_path, dim=ENCODING_DIM, index=None, index_min_size=0,
+                 compact_min_lines=COMPACT_MIN_LINES):
+        if fcntl is None:
+            raise RuntimeError("Gallery bersama membutuhkan fcntl (Linux / macOS)")
+        self.path = path
+        self.journal_path = journal_path
+        self.compact_min_lines = compact_min_lines
+        self._fd = None
+        self._journal_fd = None
+        self._header = None
+        self._mmap = None
+        self._capacity = 0
+        self._epoch = 0
+        self._generation = 0
+        self._offset = 0
+        self._depth = 0
+        super().__init__(dim=dim, index=index, index_min_size=index_min_size)
+
+    # ---- names: attribut dibaca langsung oleh pemanggil (mis. login) ----
+    @property
+    def names(self):
+        header = self._header
+        if header is not None and self._depth == 0 and \
+                (header[_GENERATION] != self._generation or header[_EPOCH] != self._epoch):
+            with self._shared():
+                pass
+        return self._names
+
+    @names.setter
+    def names(self, value):
+        self._names = value
+
+    @property
+    def generation(self):
+        return self._generation
+
+    # ---- membership ----
+    def open(self, build):
+        """Join the shared gallery; runs `build()` if no live process has it.
+        Returns True if this process built it."""
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._journal_fd = os.open(self.journal_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        while True:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Proses lain hidup (atau sedang membangun): tunggu lalu pakai bersama
+                fcntl.flock(self._fd, fcntl.LOCK_SH)
+                self._map()
+                if self._header[_VALID]:
+                    with self._shared():
+                        pass
+                    return False
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                time.sleep(0.05)
+                continue
+            try:
+                if os.fstat(self._fd).st_size < HEADER_SIZE:
+                    os.ftruncate(self._fd, HEADER_SIZE)
+                self._map()
+                self._header[_DIM] = self.dim
+                self._header[_VALID] = 0
+                build()
+                if not self._header[_VALID]:
+                    # build() tidak memanggil rebuild: mulai dari gallery kosong
+                    self.rebuild(np.empty((0, self.dim), dtype=np.float32), [])
+            except BaseException:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                raise
+            fcntl.flock(self._fd, fcntl.LOCK_SH)
+            return True
+
+    def close(self):
+        """Leave the shared gallery (releases the membership lock)."""
+        with self._lock:
+            for fd in (self._journal_fd, self._fd):
+                if fd is not None:
+                    os.close(fd)
+            self._fd = self._journal_fd = None
+
+    def _map(self):
+        size = os.fstat(self._fd).st_size
+        # mmap men-dup fd-nya sendiri; pakai fd terpisah agar lock membership ikut lepas saat close()
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        if self._mmap[:8] not in (MAGIC, b'\0' * 8):
+            raise ValueError(f"File gallery tidak valid: {self.path}")
+        self._mmap[:8] = MAGIC
+        self._header = np.ndarray((7,), dtype='<u8', buffer=self._mmap, offset=8)
+        if self._header[_DIM] not in (0, self.dim):
+            raise ValueError(f"Dimensi gallery {int(self._header[_DIM])} != {self.dim}: {self.path}")
+        self._capacity = (size - HEADER_SIZE) // (self.dim * 4)
+        self._buf = np.ndarray((self._capacity, self.dim), dtype=np.float32, buffer=self._mmap, offset=HEADER_SIZE)
+        if len(self._norm_buf) < self._capacity:
+            norm_buf = np.empty((self._capacity,), dtype=np.float32)
+            norm_buf[:len(self._norm_buf)] = self._norm_buf
+            self._norm_buf = norm_buf
+
+    @contextmanager
+    def _shared(self, exclusive=False, refresh=True):
+        with self._lock:
+            outer = self._depth == 0 and self._journal_fd is not None
+            if outer:
+                fcntl.flock(self._journal_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._depth += 1
+            try:
+                if outer and refresh:
+                    self._refresh()
+                yield
+            finally:
+                self._depth -= 1
+                if outer:
+                    fcntl.flock(self._journal_fd, fcntl.LOCK_UN)
+
+    # ---- sinkronisasi dari journal ----
+    def _refresh(self):
+        header = self._header
+        if header[_EPOCH] == self._epoch and header[_GENERATION] == self._generation:
+            return
+        if header[_CAPACITY] != self._capacity:
+            self._map()
+        if header[_EPOCH] != self._epoch:
+            self._offset = 0
+        size = os.fstat(self._journal_fd).st_size
+        data = os.pread(self._journal_fd, size - self._offset, self._offset)
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            self._apply(json.loads(line))
+        self._offset += end
+        self._epoch = int(header[_EPOCH])
+        self._generation = int(header[_GENERATION])
+
+    def _apply(self, record):
+        op = record['op']
+        self._version += 1
+        if op == 'rebuild':
+            n = len(record['names'])
+            self._names = list(record['names'])
+            self.user_ids = list(record['user_ids'])
+            self._row_of = {uid: row for row, uid in enumerate(self.user_ids) if uid is not None}
+            matrix = self._buf[:n]
+            self._norm_buf[:n] = np.einsum('ij,ij->i', matrix, matrix)
+            self._index_stale = True
+        elif op == 'upsert':
+            row, user_id = record['row'], record['id']
+            if row == len(self._names):
+                self._names.append(record['nama'])
+                self.user_ids.append(user_id)
+            else:
+                self._names[row] = record['nama']
+                self.user_ids[row] = user_id
+            if user_id is not None:
+                self._row_of[user_id] = row
+            vec = self._buf[row]
+            self._norm_buf[row] = float(vec @ vec)
+            if self.index is not None and not self._index_stale:
+                self.index.add(row, vec)
+        elif op == 'remove':
+            row = self._row_of.pop(record['id'], None)
+            if row is None:
+                return
+            last = len(self._names) - 1
+            if row != last:
+                self._norm_buf[row] = self._norm_buf[last]
+                self._names[row] = self._names[last]
+                self.user_ids[row] = self.user_ids[last]
+                if self.user_ids[row] is not None:
+                    self._row_of[self.user_ids[row]] = row
+            self._names.pop()
+            self.user_ids.pop()
+            if self.index is not None and not self._index_stale:
+                self.index.move(last, row)
+
+    def _log(self, records):
+        data = ''.join(json.dumps(r) + '\n' for r in records).encode()
+        os.write(self._journal_fd, data)
+        self._offset = os.fstat(self._journal_fd).st_size
+        self._header[_COUNT] = len(self._names)
+        self._header[_JOURNAL_LINES] += len(records)
+        self._header[_GENERATION] += 1
+        self._generation = int(self._header[_GENERATION])
+        if self._header[_JOURNAL_LINES] > max(self.compact_min_lines, 2 * int(self._header[_COUNT])):
+            self._restart_journal()
+
+    def _restart_journal(self):
+        # Journal diganti satu record 'rebuild' (names / user_ids saat ini) dengan epoch baru:
+        # worker lain memutar ulang dari awal; baris matriks sudah ada di file gallery
+        os.ftruncate(self._journal_fd, 0)
+        self._offset = 0
+        self._header[_EPOCH] += 1
+        self._epoch = int(self._header[_EPOCH])
+        self._header[_GENERATION] = 0
+        self._header[_JOURNAL_LINES] = 0
+        self._log([{'op': 'rebuild', 'names': self._names, 'user_ids': self.user_ids}])
+
+    # ---- penulisan (exclusive) ----
+    def _reserve(self, size):
+        if self._fd is None:
+            return super()._reserve(size)
+        if size <= self._capacity:
+            return
+        capacity = max(size, self._capacity * 2, 64)
+        os.ftruncate(self._fd, HEADER_SIZE + capacity * self.dim * 4)
+        self._map()
+        self._header[_CAPACITY] = capacity
+
+    def rebuild(self, encodings, names, user_ids=None):
+        if self._fd is None:
+            return super().rebuild(encodings, names, user_ids)
+        if user_ids is None:
+            user_ids = [None] * len(names)
+        if not (len(encodings) == len(names) == len(user_ids)):
+            raise ValueError("encodings, names dan user_ids harus sama panjang")
+        n = len(names)
+        with self._shared(exclusive=True, refresh=False):
+            self._reserve(n)
+            if n:
+                self._buf[:n] = np.asarray(encodings, dtype=np.float32).reshape(n, self.dim)
+            self._apply({'op': 'rebuild', 'names': list(names), 'user_ids': list(user_ids)})
+            self._restart_journal()
+            self._header[_VALID] = 1
+
+    def upsert(self, user_id, name, encoding):
+        with self._shared(exclusive=True):
+            row = super().upsert(user_id, name, encoding)
+            if self._fd is not None:
+                self._log([{'op': 'upsert', 'row': row, 'id': user_id, 'nama': name}])
+            return row
+
+    def upsert_many(self, user_ids, names, encodings):
+        with self._shared(exclusive=True):
+            self._reserve(len(self._names) + len(names))
+            rows = [FaceGallery.upsert(self, uid, name, enc) for uid, name, enc in zip(user_ids, names, encodings)]
+            if self._fd is not None and rows:
+                self._log([{'op': 'upsert', 'row': row, 'id': uid, 'nama': name}
+                           for row, uid, name in zip(rows, user_ids, names)])
+            return rows
+
+    def remove(self, user_id):
+        with self._shared(exclusive=True):
+            removed = super().remove(user_id)
+            if removed and self._fd is not None:
+                self._log([{'op': 'remove', 'id': user_id}])
+            return removed
+
+    # ---- pembacaan (shared) ----
+    def __contains__(self, user_id):
+        with self._shared():
+            return super().__contains__(user_id)
+
+    def row_of(self, user_id):
+        with self._shared():
+            return super().row_of(user_id)
+
+    def distances(self, queries):
+        with self._shared():
+            return super().distances(queries)
+
+    def match(self, queries, k=1, tolerance=DEFAULT_TOLERANCE, n_probe=None):
+        with self._shared():
+            return super().match(queries, k=k, tolerance=tolerance, n_probe=n_probe)
+
+    def assign(self, queries, tolerance=DEFAULT_TOLERANCE, user_ids=None):
+        with self._shared():
+            return super().assign(queries, tolerance=tolerance, user_ids=user_ids)
+
+    def verify(self, user_id, encoding, tolerance=DEFAULT_TOLERANCE):
+        with self._shared():
+            return super().verify(user_id, encoding, tolerance=tolerance)
+
+    def match_among(self, queries, user_ids, tolerance=DEFAULT_TOLERANCE):
+        with self._shared():
+            return super().match_among(queries, user_ids, tolerance=tolerance)
@@ -0,0 +1,670 @@
+"""Storage layer for users, attendance and sessions.
+
+Two interchangeable backends expose the same methods:
+
+- `JsonStorage`   : the original `data/*.json` files (attendance in the
+                    append-only `attendance.jsonl` log).
+- `SqliteStorage` : one SQLite database in WAL mode with indexed columns
+                    and a per-thread connection.
+
+Migrasi sekali jalan dari file JSON ke SQLite:
+
+    python storage.py migrate [data_dir] [db_path]
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from attendance_log import AttendanceLog
+
+
+# Load data dari JSON
+def load_json_data(file_path):
+    try:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    except:
+        return []
+
+# Save data ke JSON (atomic: tulis ke file sementara lalu rename)
+def save_json_data(file_path, data):
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+        return True
+    except Exception as e:
+        print(f"[ERROR] Save JSON: {e}")
+        return False
+
+
+def nama_key(nama):
+    return str(nama or '').replace('_', ' ').strip().lower()
+
+
+def user_key(user):
+    """Identitas record user: ('id', id), atau ('email', email) untuk user lama tanpa id."""
+    if user.get('id'):
+        return ('id', user['id'])
+    return ('email', str(user.get('email', '')).lower())
+
+
+def courses_of(user):
+    """Mata kuliah yang diikuti user (list atau teks dipisah koma / titik koma), dinormalisasi."""
+    courses = user.get('mata_kuliah') or []
+    if isinstance(courses, str):
+        courses = courses.replace(';', ',').split(',')
+    return {nama_key(c) for c in courses if str(c).strip()}
+
+
+def _dedup_once(records, once, attended):
+    # Record di posisi `once` dilewati bila nama yang sama sudah absen di tanggal itu
+    # (di storage atau lebih awal di batch ini); hasil: satu bool (ditulis) per record
+    once = set(once)
+    seen = set()
+    written = []
+    for i, record in enumerate(records):
+        key = (record.get('tanggal'), nama_key(record.get('nama')))
+        ok = i not in once or (key not in seen and not attended(*key))
+        if ok:
+            seen.add(key)
+        written.append(ok)
+    return written
+
+
+def _close_session(session, fields, mahasiswa_absen):
+    # Tutup record sesi: gabungkan mahasiswa_absen (dari writer / memori) lalu set field akhir
+    absen = session.setdefault('mahasiswa_absen', [])
+    absen += [m for m in mahasiswa_absen if m not in absen]
+    session.update(fields)
+    session['is_active'] = False
+    return session
+
+
+class _WriteListeners:
+    """`add_listener(fn)`: fn(kind, items) dipanggil setelah tulis berhasil
+    ('users' dengan record user, 'attendance' dengan record absensi,
+    'sessions' dengan record sesi)."""
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+        return listener
+
+    def _notify(self, kind, items):
+        for listener in self._listeners:
+            try:
+                listener(kind, items)
+            except Exception as e:
+                print(f"[ERROR] Listener storage: {e}")
+
+
+class JsonStorage(_WriteListeners):
+    """Backend berbasis file JSON (perilaku lama)."""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.users_path = os.path.join(data_dir, 'users.json')
+        self.sessions_path = os.path.join(data_dir, 'sessions.json')
+        self.attendance_path = os.path.join(data_dir, 'attendance.json')
+        self.attendance = AttendanceLog(os.path.join(data_dir, 'attendance.jsonl'),
+                                        legacy_path=self.attendance_path)
+        self._lock = threading.RLock()
+        self._listeners = []
+
+    def open(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+        for path in (self.users_path, self.sessions_path, self.attendance_path):
+            if not os.path.exists(path):
+                with open(path, 'w') as f:
+                    json.dump([], f)
+        self.attendance.open()
+        return self
+
+    def close(self):
+        self.attendance.close()
+
+    # ---- users ----
+    def list_users(self, role=None):
+        users = [u for u in load_json_data(self.users_path) if isinstance(u, dict)]
+        if role:
+            users = [u for u in users if u.get('role') == role]
+        return users
+
+    def page_users(self, role=None, after=None, limit=100):
+        """Users after cursor `after` (file position); returns `(users, next_cursor)`."""
+        users = load_json_data(self.users_path)
+        start = 0 if after is None else after + 1
+        page, cursor = [], None
+        for i in range(start, len(users)):
+            user = users[i]
+            if not isinstance(user, dict) or (role and user.get('role') != role):
+                continue
+            if len(page) == limit:
+                break
+            page.append(user)
+            cursor = i
+        else:
+            cursor = None
+        return page, cursor
+
+    def find_user(self, email=None, nama=None, user_id=None):
+        for u in self.list_users():
+            if user_id is not None and u.get('id') == user_id:
+                return u
+            if email is not None and str(u.get('email', '')).lower() == email.lower():
+                return u
+            if nama is not None and nama_key(u.get('nama')) == nama_key(nama):
+                return u
+        return None
+
+    def count_users(self, role=None):
+        return len(self.list_users(role))
+
+    def save_user(self, user):
+        return self.save_users([user])
+
+    def save_users(self, users):
+        """Upsert beberapa user sekaligus (satu kali tulis file)."""
+        with self._lock:
+            current = load_json_data(self.users_path)
+            position = {}
+            for i, existing in enumerate(current):
+                if isinstance(existing, dict):
+                    position.setdefault(user_key(existing), i)
+            for user in users:
+                i = position.get(user_key(user))
+                if i is None:
+                    position[user_key(user)] = len(current)
+                    current.append(user)
+                else:
+                    current[i] = user
+            saved = save_json_data(self.users_path, current)
+            if saved:
+                self._notify('users', users)
+            return saved
+
+    # ---- attendance ----
+    def has_attended(self, tanggal, nama):
+        return self.attendance.has_attended(tanggal, nama)
+
+    def list_attendance(self, tanggal=None, mata_kuliah=None, session_id=None):
+        if session_id is not None:
+            records = self.attendance.by_session(session_id)
+            if tanggal is not None:
+                records = [a for a in records if a.get('tanggal') == tanggal]
+        elif tanggal is not None:
+            records = self.attendance.by_date(tanggal)
+        else:
+            records = self.attendance.all()
+        if mata_kuliah:
+            records = [a for a in records if a.get('mata_kuliah') == mata_kuliah]
+        return records
+
+    def iter_attendance(self, mata_kuliah=None, date_from=None, date_to=None):
+        """Stream attendance ordered by tanggal, for exports (constant memory)."""
+        for record in self.attendance.iter_dates(date_from, date_to):
+            if not mata_kuliah or record.get('mata_kuliah') == mata_kuliah:
+                yield record
+
+    def page_attendance(self, tanggal=None, mata_kuliah=None, before=None, limit=100):
+        """Newest-first attendance before cursor `before`; returns `(records, next_cursor)`."""
+        where = (lambda a: a.get('mata_kuliah') == mata_kuliah) if mata_kuliah else None
+        return self.attendance.page(tanggal=tanggal, before=before, limit=limit, where=where)
+
+    def count_attendance(self, tanggal=None):
+        return self.attendance.count_on(tanggal) if tanggal is not None else len(self.attendance)
+
+    # ---- sessions ----
+    def list_sessions(self, dosen_id=None, active=None):
+        sessions = [s for s in load_json_data(self.sessions_path) if isinstance(s, dict)]
+        if dosen_id is not None:
+            sessions = [s for s in sessions if s.get('dosen_id') == dosen_id]
+        if active is not None:
+            sessions = [s for s in sessions if bool(s.get('is_active')) == active]
+        return sessions
+
+    def get_session(self, session_id):
+        return next((s for s in self.list_sessions() if s.get('session_id') == session_id), None)
+
+    def commit_batch(self, records, session_attended, once=()):
+        """Group commit: satu append untuk semua absensi, satu rewrite sessions.json.
+
+        `session_attended` maps session_id -> list of mahasiswa_id to add to
+        the session's `mahasiswa_absen`. Records at the positions in `once`
+        are skipped if the same nama already attended on that tanggal; the
+        check runs under the same lock as the write. Returns one bool per
+        record (written or not).
+        """
+        with self._lock:
+            written = _dedup_once(records, once, self.attendance.has_attended)
+            records = [r for r, ok in zip(records, written) if ok]
+            self.attendance.append_many(records)
+            if session_attended:
+                sessions = load_json_data(self.sessions_path)
+                changed = False
+                for session in sessions:
+                    if not isinstance(session, dict):
+                        continue
+                    for mahasiswa_id in session_attended.get(session.get('session_id'), ()):
+                        absen = session.setdefault('mahasiswa_absen', [])
+                        if mahasiswa_id not in absen:
+                            absen.append(mahasiswa_id)
+                            changed = True
+                if changed and not save_json_data(self.sessions_path, sessions):
+                    raise IOError(f"Gagal menyimpan {self.sessions_path}")
+            if records:
+                self._notify('attendance', records)
+        return written
+
+    def save_session(self, session):
+        with self._lock:
+            sessions = load_json_data(self.sessions_path)
+            for i, existing in enumerate(sessions):
+                if isinstance(existing, dict) and existing.get('session_id') == session['session_id']:
+                    sessions[i] = session
+                    break
+            else:
+                sessions.append(session)
+            saved = save_json_data(self.sessions_path, sessions)
+        if saved:
+            self._notify('sessions', [session])
+        return saved
+
+    def end_session(self, session_id, fields, mahasiswa_absen=()):
+        """Akhiri sesi dalam satu read-modify-write di bawah lock commit_batch, agar
+        mahasiswa_absen yang sedang ditulis writer tidak hilang. None jika sesi tidak ada
+        atau sudah berakhir."""
+        with self._lock:
+            sessions = load_json_data(self.sessions_path)
+            session = next((s for s in sessions
+                            if isinstance(s, dict) and s.get('session_id') == session_id), None)
+            if session is None or not session.get('is_active'):
+                return None
+            _close_session(session, fields, mahasiswa_absen)
+            if not save_json_data(self.sessions_path, sessions):
+                raise IOError(f"Gagal menyimpan {self.sessions_path}")
+        self._notify('sessions', [session])
+        return session
+
+
+# Maksimum koneksi SQLite terbuka per proses (dipinjam bergantian oleh thread)
+POOL_SIZE = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT,
+    nama TEXT,
+    nama_key TEXT,
+    role TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE INDEX IF NOT EXISTS idx_users_nama ON users(nama_key);
+CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+
+CREATE TABLE IF NOT EXISTS attendance (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT,
+    tanggal TEXT,
+    waktu TEXT,
+    nama_key TEXT,
+    session_id TEXT,
+    mahasiswa_id TEXT,
+    mata_kuliah TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_tanggal ON attendance(tanggal, waktu);
+CREATE INDEX IF NOT EXISTS idx_attendance_nama ON attendance(tanggal, nama_key);
+CREATE INDEX IF NOT EXISTS idx_attendance_session ON attendance(session_id);
+CREATE INDEX IF NOT EXISTS idx_attendance_mahasiswa ON attendance(mahasiswa_id);
+CREATE INDEX IF NOT EXISTS idx_attendance_mata_kuliah ON attendance(mata_kuliah, tanggal);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    dosen_id TEXT,
+    is_active INTEGER,
+    mata_kuliah TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_dosen ON sessions(dosen_id, is_active);
+"""
+
+
+class SqliteStorage(_WriteListeners):
+    """Backend SQLite (WAL) dengan index dan pool koneksi terbatas.
+
+    Server Werkzeug membuat satu thread per request, jadi koneksi tidak
+    diikat ke thread: setiap operasi meminjam koneksi dari pool (paling
+    banyak `pool_size` terbuka) dan mengembalikannya setelah selesai.
+    """
+
+    # Database bisa dipakai beberapa proses worker sekaligus (lihat Aggregates)
+    shared = True
+
+    def __init__(self, db_path, pool_size=POOL_SIZE, pool_timeout=30):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self._idle = []
+        self._opened = 0
+        self._pool = threading.Condition()
+        self._listeners = []
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # FULL: setiap COMMIT di-fsync ke WAL, jadi absensi yang sudah di-ack writer tetap tahan crash
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    @contextmanager
+    def _conn(self):
+        """Pinjam satu koneksi dari pool; menunggu jika semua sedang dipakai."""
+        conn = None
+        with self._pool:
+            deadline = time.monotonic() + self.pool_timeout
+            while not self._idle and self._opened >= self.pool_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError("Pool koneksi SQLite habis")
+                self._pool.wait(remaining)
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._opened += 1
+        if conn is None:
+            try:
+                conn = self._connect()
+            except BaseException:
+                with self._pool:
+                    self._opened -= 1
+                    self._pool.notify()
+                raise
+        try:
+            yield conn
+        finally:
+            with self._pool:
+                self._idle.append(conn)
+                self._pool.notify()
+
+    def open(self):
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+        return self
+
+    def close(self):
+        """Tutup koneksi yang sedang menganggur di pool."""
+        with self._pool:
+            for conn in self._idle:
+                conn.close()
+            self._opened -= len(self._idle)
+            self._idle = []
+            self._pool.notify_all()
+
+    def _rows(self, sql, params=()):
+        with self._conn() as conn:
+            return [json.loads(row[0]) for row in conn.execute(sql, params)]
+
+    def _count(self, sql, params=()):
+        with self._conn() as conn:
+            return conn.execute(sql, params).fetchone()[0]
+
+    # ---- users ----
+    def list_users(self, role=None):
+        if role:
+            return self._rows('SELECT data FROM users WHERE role = ? ORDER BY rowid', (role,))
+        return self._rows('SELECT data FROM users ORDER BY rowid')
+
+    def page_users(self, role=None, after=None, limit=100):
+        where, params = ['rowid > ?'], [after if after is not None else 0]
+        if role:
+            where.append('role = ?')
+            params.append(role)
+        with self._conn() as conn:
+            rows = conn.execute(f"SELECT rowid, data FROM users WHERE {' AND '.join(where)} "
+                                'ORDER BY rowid LIMIT ?', params + [-1 if limit is None else limit + 1]).fetchall()
+        cursor = rows[limit - 1][0] if limit is not None and len(rows) > limit else None
+        return [json.loads(row[1]) for row in rows[:limit]], cursor
+
+    def find_user(self, email=None, nama=None, user_id=None):
+        if user_id is not None:
+            rows = self._rows('SELECT data FROM users WHERE id = ?', (user_id,))
+        elif email is not None:
+            rows = self._rows('SELECT data FROM users WHERE email = ? LIMIT 1', (email.lower(),))
+        else:
+            rows = self._rows('SELECT data FROM users WHERE nama_key = ? LIMIT 1', (nama_key(nama),))
+        return rows[0] if rows else None
+
+    def count_users(self, role=None):
+        if role:
+            return self._count('SELECT COUNT(*) FROM users WHERE role = ?', (role,))
+        return self._count('SELECT COUNT(*) FROM users')
+
+    def save_user(self, user):
+        return self.save_users([user])
+
+    def save_users(self, users):
+        rows = []
+        for user in users:
+            user_id = user.get('id') or user.get('email')
+            rows.append((user_id, str(user.get('email', '')).lower(), user.get('nama'),
+                         nama_key(user.get('nama')), user.get('role'), json.dumps(user)))
+        with self._conn() as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT INTO users (id, email, nama, nama_key, role, data) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET email = excluded.email, nama = excluded.nama, '
+                'nama_key = excluded.nama_key, role = excluded.role, data = excluded.data', rows)
+        self._notify('users', users)
+        return True
+
+    # ---- attendance ----
+    @staticmethod
+    def _attendance_row(record):
+        return (record.get('id'), record.get('tanggal'), record.get('waktu'), nama_key(record.get('nama')),
+                record.get('session_id'), record.get('mahasiswa_id'), record.get('mata_kuliah'),
+                json.dumps(record))
+
+    _INSERT_ATTENDANCE = ('INSERT INTO attendance (id, tanggal, waktu, nama_key, session_id, mahasiswa_id, '
+                          'mata_kuliah, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+
+    def add_attendance_many(self, records):
+        with self._conn() as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(self._INSERT_ATTENDANCE, [self._attendance_row(r) for r in records])
+        self._notify('attendance', records)
+        return len(records)
+
+    def commit_batch(self, records, session_attended, once=()):
+        """Group commit: semua absensi dan update sesi dalam satu transaksi.
+
+        Dedup `once` (lihat JsonStorage.commit_batch) dibaca di dalam transaksi yang
+        sama, jadi dua proses worker tidak bisa mencatat (tanggal, nama) yang sama.
+        """
+        with self._conn() as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+
+            def attended(tanggal, key):
+                return conn.execute('SELECT 1 FROM attendance WHERE tanggal = ? AND nama_key = ? LIMIT 1',
+                                    (tanggal, key)).fetchone() is not None
+            written = _dedup_once(records, once, attended)
+            records = [r for r, ok in zip(records, written) if ok]
+            conn.executemany(self._INSERT_ATTENDANCE, [self._attendance_row(r) for r in records])
+            for session_id, mahasiswa_ids in (session_attended or {}).items():
+                row = conn.execute('SELECT data FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+                if row is None:
+                    continue
+                session = json.loads(row[0])
+                absen = session.setdefault('mahasiswa_absen', [])
+                for mahasiswa_id in mahasiswa_ids:
+                    if mahasiswa_id not in absen:
+                        absen.append(mahasiswa_id)
+                conn.execute('UPDATE sessions SET data = ? WHERE session_id = ?', (json.dumps(session), session_id))
+        if records:
+            self._notify('attendance', records)
+        return written
+
+    def has_attended(self, tanggal, nama):
+        with self._conn() as conn:
+            row = conn.execute('SELECT 1 FROM attendance WHERE tanggal = ? AND nama_key = ? LIMIT 1',
+                               (tanggal, nama_key(nama))).fetchone()
+        return row is not None
+
+    def list_attendance(self, tanggal=None, mata_kuliah=None, session_id=None):
+        where, params = [], []
+        for column, value in (('tanggal', tanggal), ('mata_kuliah', mata_kuliah), ('session_id', session_id)):
+            if value:
+                where.append(f'{column} = ?')
+                params.append(value)
+        sql = 'SELECT data FROM attendance'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return self._rows(sql + ' ORDER BY seq', params)
+
+    def iter_attendance(self, mata_kuliah=None, date_from=None, date_to=None):
+        where, params = [], []
+        for clause, value in (('mata_kuliah = ?', mata_kuliah), ('tanggal >= ?', date_from), ('tanggal <= ?', date_to)):
+            if value:
+                where.append(clause)
+                params.append(value)
+        sql = 'SELECT data FROM attendance'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        # Cursor dibaca baris per baris, bukan fetchall; koneksi dipinjam selama iterasi
+        with self._conn() as conn:
+            cursor = conn.execute(sql + ' ORDER BY tanggal, waktu, seq', params)
+            try:
+                for row in cursor:
+                    yield json.loads(row[0])
+            finally:
+                cursor.close()
+
+    def page_attendance(self, tanggal=None, mata_kuliah=None, before=None, limit=100):
+        where, params = [], []
+        for column, value in (('tanggal', tanggal), ('mata_kuliah', mata_kuliah)):
+            if value:
+                where.append(f'{column} = ?')
+                params.append(value)
+        if before is not None:
+            where.append('seq < ?')
+            params.append(before)
+        sql = 'SELECT seq, data FROM attendance'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        with self._conn() as conn:
+            rows = conn.execute(sql + ' ORDER BY seq DESC LIMIT ?',
+                                params + [-1 if limit is None else limit + 1]).fetchall()
+        cursor = rows[limit - 1][0] if limit is not None and len(rows) > limit else None
+        return [json.loads(row[1]) for row in rows[:limit]], cursor
+
+    def count_attendance(self, tanggal=None):
+        if tanggal is not None:
+            return self._count('SELECT COUNT(*) FROM attendance WHERE tanggal = ?', (tanggal,))
+        return self._count('SELECT COUNT(*) FROM attendance')
+
+    def attendance_summary(self, tanggal=None, mata_kuliah=None):
+        """Per (mata_kuliah, tanggal): jumlah hadir dan jumlah sesi, terbaru dulu."""
+        where, params = [], []
+        for column, value in (('mata_kuliah', mata_kuliah), ('tanggal', tanggal)):
+            if value is not None:
+                where.append(f'{column} = ?')
+                params.append(value)
+        sql = 'SELECT mata_kuliah, tanggal, COUNT(*), COUNT(DISTINCT session_id) FROM attendance'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        with self._conn() as conn:
+            rows = conn.execute(sql + ' GROUP BY mata_kuliah, tanggal', params).fetchall()
+        rows = [{'mata_kuliah': course, 'tanggal': day, 'hadir': hadir, 'sesi': sesi}
+                for course, day, hadir, sesi in rows]
+        rows.sort(key=lambda r: (str(r['tanggal'] or ''), str(r['mata_kuliah'] or '')), reverse=True)
+        return rows
+
+    # ---- sessions ----
+    def list_sessions(self, dosen_id=None, active=None):
+        where, params = [], []
+        if dosen_id is not None:
+            where.append('dosen_id = ?')
+            params.append(dosen_id)
+        if active is not None:
+            where.append('is_active = ?')
+            params.append(1 if active else 0)
+        sql = 'SELECT data FROM sessions'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return self._rows(sql + ' ORDER BY rowid', params)
+
+    def get_session(self, session_id):
+        rows = self._rows('SELECT data FROM sessions WHERE session_id = ?', (session_id,))
+        return rows[0] if rows else None
+
+    def save_session(self, session):
+        with self._conn() as conn, conn:
+            conn.execute(
+                'INSERT INTO sessions (session_id, dosen_id, is_active, mata_kuliah, data) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(session_id) DO UPDATE SET dosen_id = excluded.dosen_id, is_active = excluded.is_active, '
+                'mata_kuliah = excluded.mata_kuliah, data = excluded.data',
+                (session['session_id'], session.get('dosen_id'), 1 if session.get('is_active') else 0,
+                 session.get('mata_kuliah'), json.dumps(session)))
+        self._notify('sessions', [session])
+        return True
+
+    def end_session(self, session_id, fields, mahasiswa_absen=()):
+        """Akhiri sesi dalam satu transaksi (seperti commit_batch); None jika sesi tidak ada
+        atau sudah berakhir."""
+        with self._conn() as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT data FROM sessions WHERE session_id = ? AND is_active = 1',
+                               (session_id,)).fetchone()
+            if row is None:
+                return None
+            session = _close_session(json.loads(row[0]), fields, mahasiswa_absen)
+            conn.execute('UPDATE sessions SET is_active = 0, data = ? WHERE session_id = ?',
+                         (json.dumps(session), session_id))
+        self._notify('sessions', [session])
+        return session
+
+
+def create_storage(backend, data_dir, db_path=None):
+    if backend == 'sqlite':
+        return SqliteStorage(db_path or os.path.join(data_dir, 'absensi.db'))
+    if backend == 'json':
+        return JsonStorage(data_dir)
+    raise ValueError(f"Storage backend tidak dikenal: {backend}")
+
+
+def migrate_json_to_sqlite(data_dir, db_path):
+    """Salin users, sessions dan attendance dari file JSON ke database SQLite."""
+    source = JsonStorage(data_dir).open()
+    target = SqliteStorage(db_path).open()
+    users = source.list_users()
+    target.save_users(users)
+    for session in source.list_sessions():
+        if session.get('session_id'):
+            target.save_session(session)
+    attendance = source.list_attendance()
+    target.add_attendance_many(attendance)
+    source.close()
+    target.close()
+    return len(users), len(attendance)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        print("Usage: python storage.py migrate [data_dir] [db_path]")
+        sys.exit(1)
+    data_dir = sys.argv[2] if len(sys.argv) > 2 else 'data'
+    db_path = sys.argv[3] if len(sys.argv) > 3 else os.path.join(data_dir, 'absensi.db')
+    n_users, n_attendance = migrate_json_to_sqlite(data_dir, db_path)
+    print(f"[OK] {n_users} user dan {n_attendance} absensi dipindahkan ke {db_path}")
@@ -0,0 +1,63 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aggregates import Aggregates
+from storage import JsonStorage, SqliteStorage
+
+
+def _check(storage):
+    storage.save_users([{'id': 'M1', 'nama': 'Budi', 'role': 'mahasiswa'},
+                        {'id': 'D1', 'nama': 'Ahmad', 'role': 'dosen'}])
+    storage.commit_batch([{'id': 'A1', 'nama': 'Budi', 'tanggal': '2025-11-12', 'session_id': 'S1',
+                           'mata_kuliah': 'Basis Data'}], {})
+    aggregates = Aggregates().attach(storage)
+    assert aggregates.count_users() == 2 and aggregates.count_users('mahasiswa') == 1
+
+    # Update in-place: role berubah, bukan user baru
+    storage.save_user({'id': 'D1', 'nama': 'Ahmad', 'role': 'mahasiswa'})
+    storage.save_user({'id': 'M2', 'nama': 'Ani', 'role': 'mahasiswa'})
+    assert aggregates.count_users() == 3 and aggregates.count_users('mahasiswa') == 3
+    assert aggregates.count_users('dosen') == 0
+
+    storage.commit_batch([
+        {'id': 'A2', 'nama': 'Ani', 'tanggal': '2025-11-12', 'session_id': 'S2', 'mata_kuliah': 'Basis Data'},
+        {'id': 'A3', 'nama': 'Ani', 'tanggal': '2025-11-13', 'session_id': 'S3', 'mata_kuliah': 'AI'},
+    ], {})
+    assert aggregates.count_attendance() == 3
+    assert aggregates.count_attendance('2025-11-12') == 2
+    assert aggregates.summary() == [
+        {'mata_kuliah': 'AI', 'tanggal': '2025-11-13', 'hadir': 1, 'sesi': 1},
+        {'mata_kuliah': 'Basis Data', 'tanggal': '2025-11-12', 'hadir': 2, 'sesi': 2},
+    ]
+    assert aggregates.summary(mata_kuliah='AI', tanggal='2025-11-12') == []
+
+    # Rebuild dari storage menghasilkan angka yang sama
+    rebuilt = Aggregates().attach(storage)
+    assert rebuilt.summary() == aggregates.summary()
+    assert [rebuilt.count_users(r) for r in (None, 'mahasiswa', 'dosen')] == [3, 3, 0]
+
+
+def test_aggregates_json(tmp_path, monkeypatch):
+    storage = JsonStorage(str(tmp_path)).open()
+
+    def list_attendance(*args, **kwargs):
+        raise AssertionError('attach() harus membaca log absensi satu per satu')
+    monkeypatch.setattr(storage, 'list_attendance', list_attendance)
+    _check(storage)
+    print("[OK] Aggregates (JSON)")
+
+
+def test_aggregates_sqlite(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "absensi.db")).open()
+    _check(storage)
+    # Proses worker lain menulis ke database yang sama: angka tetap konsisten
+    aggregates = Aggregates().attach(storage)
+    other = SqliteStorage(str(tmp_path / "absensi.db")).open()
+    other.commit_batch([{'id': 'A9', 'nama': 'Budi', 'tanggal': '2025-11-13', 'session_id': 'S3',
+                         'mata_kuliah': 'AI'}], {})
+    assert aggregates.count_attendance() == 4
+    assert aggregates.summary(mata_kuliah='AI') == [{'mata_kuliah': 'AI', 'tanggal': '2025-11-13', 'hadir': 2, 'sesi': 1}]
+    other.close()
+    storage.close()
+    print("[OK] Aggregates (SQLite, dari storage)")
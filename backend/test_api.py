@@ -0,0 +1,152 @@
+import io
+import sys
+import os
+from urllib.parse import urlencode
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pytest
+
+from benchmark import IMAGE_SHAPE, install_stub, synthetic_encodings, synthetic_image
+
+
+@pytest.fixture(scope='module')
+def api(tmp_path_factory):
+    """Backend di direktori data sementara dengan model stub dan inference inline."""
+    encodings = synthetic_encodings(8, seed=1)
+    install_stub(encodings)
+    os.environ['ABSEN_INFERENCE_WORKERS'] = '0'
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('api'))
+    import flask_api_backend as backend
+    # Modul bisa sudah diimport test lain sebelum env di atas di-set
+    backend.inference_engine.workers = 0
+    app = backend.create_app(background=False)
+    assert backend.readiness.is_ready()
+    backend.update_known_face({'id': 'M-ANI', 'nama': 'Ani'}, encodings[0])
+    try:
+        yield backend, app.test_client(), encodings
+    finally:
+        os.chdir(cwd)
+
+
+def test_client_cannot_loosen_tolerance(api):
+    backend, client, _ = api
+    assert backend.get_tolerance({}) == backend.MATCH_TOLERANCE
+    assert backend.get_tolerance({'tolerance': 1.0}) == backend.MATCH_TOLERANCE
+    assert backend.get_tolerance({'tolerance': 'nan'}) == backend.MATCH_TOLERANCE
+    assert backend.get_tolerance({'tolerance': 0.4}) == 0.4
+
+    # Wajah orang lain (jarak ~0.9) tidak boleh cocok walau klien mengirim tolerance=1.0
+    r = client.post('/api/recognize?tolerance=1.0', data=synthetic_image(1, variant=7), content_type='image/png')
+    assert r.status_code == 200 and not r.json['success']
+    r = client.post('/api/recognize?tolerance=1.0', data=synthetic_image(0, variant=7), content_type='image/png')
+    assert r.json['success'] and r.json['data'][0]['nama'] == 'Ani'
+    print("[OK] Toleransi hanya bisa diperketat klien")
+
+
+def test_session_roster_is_opt_in_and_evicted(api, monkeypatch):
+    backend, _, _ = api
+    session = backend.session_registry.start('D-1', 'Dosen', 'Basis Data')
+    assert backend.session_roster(session) is None
+
+    monkeypatch.setattr(backend, 'RESTRICT_SESSION_TO_COURSE', True)
+    backend.storage.save_user({'id': 'M-BUDI', 'nama': 'Budi', 'email': 'budi@kampus.id', 'role': 'mahasiswa',
+                               'mata_kuliah': ['Basis Data']})
+    assert backend.session_roster(session) == {'M-BUDI'}
+    assert session['session_id'] in backend.session_rosters
+    # User berubah -> roster dihitung ulang
+    backend.storage.save_user({'id': 'M-CITRA', 'nama': 'Citra', 'email': 'citra@kampus.id', 'role': 'mahasiswa',
+                               'mata_kuliah': 'Basis Data'})
+    assert session['session_id'] not in backend.session_rosters
+    assert backend.session_roster(session) == {'M-BUDI', 'M-CITRA'}
+    # Sesi berakhir -> roster dibuang
+    backend.session_registry.end(session['session_id'])
+    assert session['session_id'] not in backend.session_rosters
+    print("[OK] Roster sesi opt-in dan dibuang saat sesi / user berubah")
+
+
+def test_class_photo_timeout_is_503(api, monkeypatch):
+    from concurrent.futures import Future
+    backend, client, _ = api
+    session = backend.session_registry.start('D-1', 'Dosen', 'Jaringan')
+    # Task yang tidak pernah selesai dalam batas waktu engine
+    monkeypatch.setattr(backend.inference_engine, 'submit_batch', lambda *args, **kwargs: Future())
+    monkeypatch.setattr(backend.inference_engine, 'timeout', 0.01)
+    r = client.post(f"/api/sessions/class-photo?session_id={session['session_id']}",
+                    data=synthetic_image(0, variant=3), content_type='image/png')
+    assert r.status_code == 503 and r.headers['Retry-After']
+    backend.session_registry.end(session['session_id'])
+    print("[OK] Timeout inference foto kelas -> 503 + Retry-After")
+
+
+def test_engine_busy_is_503(api, monkeypatch):
+    backend, client, _ = api
+    engine = backend.inference_engine
+    monkeypatch.setattr(backend.recognition_batcher, 'timeout', 0.05)
+    engine._acquire(engine.max_pending)
+    try:
+        r = client.post('/api/recognize', data=synthetic_image(2, variant=11), content_type='image/png')
+    finally:
+        engine._release(engine.max_pending)
+    assert r.status_code == 503 and int(r.headers['Retry-After']) >= 1
+    assert not r.json['success']
+    print("[OK] Slot inference habis -> 503 + Retry-After")
+
+
+def _jpeg_of_identity_0():
+    """JPEG yang tetap dikenali stub sebagai identitas 0 (blok hitam di pojok tidak berubah oleh kompresi)."""
+    import cv2
+    rgb = np.random.default_rng(5).integers(60, 200, size=IMAGE_SHAPE, dtype=np.uint8)
+    rgb[:16, :16] = 0
+    ok, jpeg = cv2.imencode('.jpg', cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return jpeg.tobytes()
+
+
+def test_multipart_upload(api):
+    _, client, _ = api
+    r = client.post('/api/recognize', content_type='multipart/form-data',
+                    data={'image': (io.BytesIO(synthetic_image(0, variant=21)), 'wajah.png'), 'tolerance': '0.5'})
+    assert r.status_code == 200 and r.json['success'] and r.json['data'][0]['nama'] == 'Ani'
+    r = client.post('/api/recognize', content_type='multipart/form-data', data={'tolerance': '0.5'})
+    assert r.status_code == 400
+    print("[OK] Upload multipart")
+
+
+def test_raw_jpeg_with_query_fields(api):
+    backend, client, _ = api
+    session = backend.session_registry.start('D-1', 'Dosen', 'Pemrograman')
+    barcode, _ = backend.session_registry.barcode_data(session['session_id'])
+    query = urlencode({'session_id': session['session_id'], 'mahasiswa_id': 'M-ANI', 'barcode_data': barcode})
+    r = client.post(f'/api/mahasiswa/attendance?{query}', data=_jpeg_of_identity_0(), content_type='image/jpeg')
+    assert r.status_code == 200 and r.json['success'], r.json
+    assert [a['mahasiswa_id'] for a in backend.storage.list_attendance(session_id=session['session_id'])] == ['M-ANI']
+    backend.session_registry.end(session['session_id'])
+    print("[OK] Body image/jpeg mentah + field di query string")
+
+
+def test_known_id_without_face_is_rejected(api):
+    backend, client, _ = api
+    backend.storage.save_user({'id': 'M-DEWI', 'nama': 'Dewi', 'email': 'dewi@kampus.id', 'role': 'mahasiswa'})
+    session = backend.session_registry.start('D-1', 'Dosen', 'Statistika')
+    barcode, _ = backend.session_registry.barcode_data(session['session_id'])
+    # Wajah Ani (terdaftar) dipakai untuk akun Dewi yang belum punya encoding
+    query = urlencode({'session_id': session['session_id'], 'mahasiswa_id': 'M-DEWI', 'barcode_data': barcode})
+    r = client.post(f'/api/mahasiswa/attendance?{query}', data=synthetic_image(0, variant=5), content_type='image/png')
+    assert r.status_code == 400 and 'belum terdaftar' in r.json['message']
+    assert backend.storage.list_attendance(session_id=session['session_id']) == []
+    backend.session_registry.end(session['session_id'])
+    print("[OK] Akun tanpa encoding tidak jatuh ke pencocokan nama")
+
+
+def test_upload_too_large_is_413(api):
+    backend, client, _ = api
+    oversized = b'\xff' * (backend.MAX_UPLOAD_BYTES + 1)
+    r = client.post('/api/recognize', data=oversized, content_type='image/jpeg')
+    assert r.status_code == 413 and not r.json['success']
+    r = client.post('/api/recognize', content_type='multipart/form-data',
+                    data={'image': (io.BytesIO(oversized), 'besar.jpg')})
+    assert r.status_code == 413
+    r = client.post('/api/recognize', data=b'\xff' * (backend.MAX_REQUEST_BYTES + 1), content_type='image/jpeg')
+    assert r.status_code == 413
+    print("[OK] Upload melebihi MAX_UPLOAD_BYTES -> 413")
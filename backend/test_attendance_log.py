@@ -0,0 +1,58 @@
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from attendance_log import AttendanceLog
+
+
+def test_legacy_import_and_indexes(tmp_path):
+    """attendance.json lama diimpor sekali, index dibangun ulang saat open()"""
+    legacy = tmp_path / "attendance.json"
+    legacy.write_text(json.dumps([
+        {'id': '1', 'nama': 'Budi Santoso', 'tanggal': '2025-11-10', 'session_id': 'S1', 'mahasiswa_id': 'M1'},
+        {'id': '2', 'nama': 'Ani', 'tanggal': '2025-11-11', 'type': 'direct'},
+    ]))
+    log_path = str(tmp_path / "attendance.jsonl")
+
+    log = AttendanceLog(log_path, legacy_path=str(legacy)).open()
+    assert len(log) == 2
+    assert log.has_attended('2025-11-10', 'budi_santoso')
+    assert not log.has_attended('2025-11-11', 'Budi Santoso')
+    assert [a['id'] for a in log.by_session('S1')] == ['1']
+    assert [a['id'] for a in log.by_mahasiswa('M1')] == ['1']
+
+    log.append({'id': '3', 'nama': 'Ani', 'tanggal': '2025-11-12', 'session_id': 'S2'})
+    assert log.has_attended('2025-11-12', 'ANI')
+
+    reopened = AttendanceLog(log_path, legacy_path=str(legacy)).open()
+    assert [a['id'] for a in reopened.all()] == ['1', '2', '3']
+    assert reopened.count_on('2025-11-12') == 1
+    print("[OK] Attendance log test passed!")
+
+
+def test_skips_truncated_line(tmp_path):
+    log_path = tmp_path / "attendance.jsonl"
+    log_path.write_text('{"id": "1", "nama": "Ani", "tanggal": "2025-11-12"}\n{"id": "2", "na')
+    log = AttendanceLog(str(log_path)).open()
+    assert len(log) == 1
+    log.append({'id': '3', 'nama': 'Budi', 'tanggal': '2025-11-12'})
+    assert [a['id'] for a in AttendanceLog(str(log_path)).open().all()] == ['1', '3']
+    print("[OK] Baris terpotong dilewati")
+
+
+def test_records_are_read_from_file(tmp_path):
+    """Hanya offset yang disimpan di memori; record dibaca dari file saat diminta"""
+    log_path = tmp_path / "attendance.jsonl"
+    log = AttendanceLog(str(log_path)).open()
+    log.append_many([{'id': '1', 'nama': 'Ani', 'tanggal': '2025-11-12', 'session_id': 'S1', 'status': 'hadir'},
+                     {'id': '2', 'nama': 'Budi', 'tanggal': '2025-11-12', 'session_id': 'S1', 'status': 'hadir'}])
+    # Ubah isi baris di disk (panjang sama): hasil query mengikuti file
+    log_path.write_text(log_path.read_text().replace('"hadir"', '"izin!"'))
+    assert [a['status'] for a in log.by_session('S1')] == ['izin!', 'izin!']
+    records, cursor = log.page(tanggal='2025-11-12', limit=1)
+    assert [a['id'] for a in records] == ['2'] and cursor == 1
+    assert [a['id'] for a in log.page(tanggal='2025-11-12', before=cursor)[0]] == ['1']
+    assert [a['id'] for a in log.iter_dates()] == ['1', '2']
+    log.close()
+    print("[OK] Record absensi dibaca dari file sesuai offset")
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import attendance_report
+from attendance_report import PresenceMatrix, csv_chunks, jsonl_chunks
+from storage import JsonStorage, SqliteStorage
+
+
+def _records():
+    return [
+        {'id': 'A1', 'mahasiswa_id': 'M1', 'nama': 'Budi', 'tanggal': '2025-09-08', 'waktu': '08:00:00', 'mata_kuliah': 'AI'},
+        {'id': 'A2', 'mahasiswa_id': 'M2', 'nama': 'Ani', 'tanggal': '2025-09-01', 'waktu': '08:01:00', 'mata_kuliah': 'AI'},
+        {'id': 'A3', 'mahasiswa_id': 'M1', 'nama': 'Budi', 'tanggal': '2025-09-01', 'waktu': '08:02:00', 'mata_kuliah': 'AI'},
+        {'id': 'A4', 'mahasiswa_id': 'M1', 'nama': 'Budi', 'tanggal': '2025-09-02', 'waktu': '10:00:00', 'mata_kuliah': 'Basis Data'},
+    ]
+
+
+def test_iter_attendance_both_backends(tmp_path):
+    for storage in (JsonStorage(str(tmp_path)).open(), SqliteStorage(str(tmp_path / "absensi.db")).open()):
+        storage.commit_batch(_records(), {})
+        assert [a['id'] for a in storage.iter_attendance()] == ['A2', 'A3', 'A4', 'A1']
+        assert [a['id'] for a in storage.iter_attendance('AI', date_from='2025-09-02')] == ['A1']
+        assert [a['id'] for a in storage.iter_attendance(date_to='2025-09-01')] == ['A2', 'A3']
+    print("[OK] iter_attendance urut tanggal")
+
+
+def test_streaming_chunks(monkeypatch):
+    monkeypatch.setattr(attendance_report, 'CHUNK_BYTES', 64)
+    chunks = list(csv_chunks(iter(_records())))
+    assert len(chunks) > 1
+    rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+    assert [r['mahasiswa_id'] for r in rows] == ['M1', 'M2', 'M1', 'M1'] and rows[0]['dosen'] == ''
+    lines = ''.join(jsonl_chunks(iter(_records()))).splitlines()
+    assert [json.loads(line)['id'] for line in lines] == ['A1', 'A2', 'A3', 'A4']
+    print("[OK] Ekspor CSV / JSON-lines per potongan")
+
+
+def test_presence_matrix():
+    records = [r for r in _records() if r['mata_kuliah'] == 'AI']
+    roster = [{'id': 'M3', 'nama': 'Citra'}, {'id': 'M1', 'nama': 'Budi'}]
+    report = PresenceMatrix(iter(records), roster)
+    assert report.dates == ['2025-09-01', '2025-09-08']
+    assert report.student_ids == ['M3', 'M1', 'M2']
+    assert report.matrix.astype(int).tolist() == [[0, 0], [1, 1], [1, 0]]
+    data = report.to_dict()
+    assert [(m['id'], m['hadir'], m['persen']) for m in data['mahasiswa']] == [('M3', 0, 0.0), ('M1', 2, 100.0), ('M2', 1, 50.0)]
+    rows = list(csv.reader(io.StringIO(''.join(report.csv_chunks()))))
+    assert rows[0] == ['id', 'nama', '2025-09-01', '2025-09-08', 'hadir', 'persen']
+    assert rows[2] == ['M1', 'Budi', '1', '1', '2', '100.0']
+    assert PresenceMatrix([]).matrix.shape == (0, 0)
+    print("[OK] Matriks kehadiran mahasiswa x tanggal")
+
+
+def test_cli_presence_includes_roster(tmp_path):
+    """CLI dan endpoint memakai roster yang sama: mahasiswa yang tidak pernah hadir tetap muncul"""
+    import subprocess
+    from attendance_report import course_roster
+    storage = JsonStorage(str(tmp_path)).open()
+    storage.save_users([{'id': 'M3', 'nama': 'Citra', 'role': 'mahasiswa', 'mata_kuliah': 'ai; Basis Data'},
+                        {'id': 'M4', 'nama': 'Dedi', 'role': 'mahasiswa', 'mata_kuliah': ['Basis Data']}])
+    storage.commit_batch(_records(), {})
+    assert [u['id'] for u in course_roster(storage, 'AI')] == ['M3']
+
+    output = tmp_path / "ai.csv"
+    subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'attendance_report.py'),
+                    '--data-dir', str(tmp_path), '-o', str(output), 'presence', 'AI'], check=True, capture_output=True)
+    expected = ''.join(PresenceMatrix(storage.iter_attendance('AI'), course_roster(storage, 'AI')).csv_chunks())
+    assert output.read_bytes().decode() == expected
+    rows = list(csv.reader(io.StringIO(expected)))
+    assert rows[1] == ['M3', 'Citra', '0', '0', '0', '0.0']
+    print("[OK] Rekap kehadiran CLI menyertakan roster")
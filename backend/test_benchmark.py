@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import compare, generate_data, measure
+from embedding_store import EmbeddingStore
+from storage import JsonStorage
+
+
+def test_generate_data(tmp_path):
+    storage = JsonStorage(str(tmp_path)).open()
+    store = EmbeddingStore(str(tmp_path / "embeddings.f32"), str(tmp_path / "embeddings_index.json")).open()
+    encodings = generate_data(storage, store, n_users=50, n_attendance=120, chunk=40)
+    assert encodings.shape == (50, 128)
+    users = storage.list_users('mahasiswa')
+    assert len(users) == 50 and len(store) == 50
+    assert (store.rows([users[7]['encoding_row']])[0] == encodings[7]).all()
+    assert storage.count_attendance() == 120
+    # Deterministik untuk seed yang sama
+    again = JsonStorage(str(tmp_path / "lagi")).open()
+    store2 = EmbeddingStore(str(tmp_path / "e2.f32"), str(tmp_path / "e2.json")).open()
+    assert (generate_data(again, store2, 50, 120) == encodings).all()
+    assert [a['tanggal'] for a in again.list_attendance()] == [a['tanggal'] for a in storage.list_attendance()]
+    print("[OK] Generator data sintetis")
+
+
+def test_measure_and_compare():
+    calls = []
+    stats = measure(calls.append, 20, warmup=2, concurrency=3)
+    assert stats['n'] == 20 and len(calls) == 22 and sorted(calls[2:]) == list(range(20))
+    assert stats['p50_ms'] <= stats['p99_ms'] <= stats['max_ms']
+    baseline = {'results': {'a': {'p50_ms': 1.0}, 'b': {'p50_ms': 1.0}}}
+    report = {'results': {'a': {'p50_ms': 1.1}, 'b': {'p50_ms': 2.0}, 'c': {'p50_ms': 5.0}}}
+    assert compare(report, baseline) == ['b']
+    print("[OK] Pengukuran dan perbandingan hasil")
+
+
+def test_measure_counts_non_2xx_separately():
+    class Response:
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    stats = measure(lambda i: Response(401 if i % 4 == 0 else 200), 20, warmup=0)
+    assert stats['n'] == 15 and stats['errors'] == 5
+    stats = measure(lambda i: Response(503), 5, warmup=0)
+    assert stats['n'] == 0 and stats['errors'] == 5 and stats['p50_ms'] is None
+    assert compare({'results': {'a': stats}}, {'results': {'a': {'p50_ms': 1.0}}}) == []
+    print("[OK] Respons non-2xx dihitung terpisah dari latency")
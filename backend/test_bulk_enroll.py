@@ -0,0 +1,147 @@
+import io
+import json
+import sys
+import os
+import tarfile
+import zipfile
+from concurrent.futures import Future
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from bulk_enroll import BulkEnroller, PhotoBundle
+from embedding_store import EmbeddingStore
+from inference_engine import InferenceEngine
+from storage import JsonStorage
+
+CSV = """nama,nim,email
+Budi Santoso,2301,budi@kampus.id
+Ani Lestari,2302,ani@kampus.id
+Ani Duplikat,2303,ANI@kampus.id
+Citra Tanpa Foto,2304,citra@kampus.id
+Dedi Lama,2305,dedi@kampus.id
+"""
+
+
+class _FakeEngine:
+    """Setiap gambar 1 wajah, encoding = rata-rata piksel (tanpa dlib)."""
+    workers = 2
+    max_pending = 16
+    split_batch = InferenceEngine.split_batch
+
+    def __init__(self):
+        self.calls = 0
+
+    def submit_batch(self, images, model='hog', upsample=1, wait=0, reserve=0):
+        self.calls += 1
+        assert wait is None and len(images) <= self.max_pending - reserve
+        future = Future()
+        future.set_result([([(0, img.shape[1], img.shape[0], 0)], [np.full(128, img.mean() / 255.0)])
+                           for img in images])
+        return future
+
+
+def _jpeg(value):
+    ok, buf = cv2.imencode('.jpg', np.full((64, 64, 3), value, dtype=np.uint8))
+    return buf.tobytes()
+
+
+def _zip_bundle():
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as zf:
+        zf.writestr('daftar.csv', CSV)
+        zf.writestr('foto/2301.jpg', _jpeg(50))
+        zf.writestr('foto/ani.jpg', _jpeg(100))
+        zf.writestr('foto/2305.jpg', _jpeg(150))
+    data.seek(0)
+    return PhotoBundle(data)
+
+
+def _setup(tmp_path):
+    storage = JsonStorage(str(tmp_path)).open()
+    storage.save_user({'id': 'M0', 'nama': 'Dedi Lama', 'email': 'dedi@kampus.id', 'role': 'mahasiswa'})
+    store = EmbeddingStore(str(tmp_path / 'embeddings.f32'), str(tmp_path / 'embeddings_index.json')).open()
+    return storage, store
+
+
+def test_bulk_enroll_zip_with_dedup(tmp_path):
+    storage, store = _setup(tmp_path)
+    engine = _FakeEngine()
+    progress_path = str(tmp_path / 'job.json')
+    enroller = BulkEnroller(storage, store, engine, chunk_size=10)
+    chunks = []
+    with _zip_bundle() as bundle:
+        enrolled = enroller.run(bundle, progress_path, job_id='job1', on_chunk=chunks.append)
+
+    assert sorted(u['email'] for u, _ in enrolled) == ['ani@kampus.id', 'budi@kampus.id']
+    # Gallery bisa diperbarui per chunk, bukan hanya di akhir job
+    assert [pair for chunk in chunks for pair in chunk] == enrolled
+    progress = json.load(open(progress_path))
+    assert progress['status'] == 'done' and progress['processed'] == 5
+    assert progress['skipped'] == {'ani@kampus.id': 'duplikat_di_csv', 'dedi@kampus.id': 'sudah_terdaftar'}
+    assert progress['failed'] == {'citra@kampus.id': 'foto_tidak_ditemukan'}
+    # Dua gambar dikirim ke engine dalam satu chunk, dibagi ke 2 worker
+    assert engine.calls == 2
+
+    budi = storage.find_user(email='budi@kampus.id')
+    assert budi['nim'] == '2301' and 'encoding' not in budi
+    assert np.allclose(store.get(budi['id']), 50 / 255.0, atol=0.02)
+    print(f"[OK] Bulk enroll zip: {len(enrolled)} terdaftar")
+
+
+def test_bulk_enroll_resume_and_update_existing(tmp_path):
+    storage, store = _setup(tmp_path)
+    progress_path = str(tmp_path / 'job.json')
+    with _zip_bundle() as bundle:
+        BulkEnroller(storage, store, _FakeEngine()).run(bundle, progress_path)
+
+    # Jalankan ulang job yang sama: yang sudah terdaftar tidak diproses lagi
+    engine = _FakeEngine()
+    with _zip_bundle() as bundle:
+        assert BulkEnroller(storage, store, engine).run(bundle, progress_path) == []
+    assert engine.calls == 0
+
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode='w:gz') as tf:
+        for name, payload in (('daftar.csv', CSV.encode()), ('2305.jpg', _jpeg(200))):
+            info = tarfile.TarInfo(name)
+            info.size = len(payload)
+            tf.addfile(info, io.BytesIO(payload))
+    data.seek(0)
+    with PhotoBundle(data) as bundle:
+        enrolled = BulkEnroller(storage, store, _FakeEngine()).run(bundle, update_existing=True)
+    dedi = [u for u, _ in enrolled if u['email'] == 'dedi@kampus.id'][0]
+    assert dedi['id'] == 'M0' and dedi['nim'] == '2305'
+    assert storage.count_users() == 3
+    print("[OK] Resume job dan update user lama dari arsip tar")
+
+
+
+def test_bulk_job_leaves_slots_for_live_requests():
+    """Job massal memakai paling banyak max_slots; request live tetap mendapat slot"""
+    import threading
+    import time
+    import inference_engine
+    from benchmark import install_stub, synthetic_encodings
+    install_stub(synthetic_encodings(2, seed=3))
+    inference_engine._init_worker()
+    engine = InferenceEngine(workers=0, max_pending=4)
+    enroller = BulkEnroller(None, None, engine)
+    assert enroller.max_slots == 2
+    assert engine.split_batch(10, enroller.max_slots) == [(0, 2), (2, 4), (4, 6), (6, 8), (8, 10)]
+
+    # Request live memegang 2 slot: potongan job menunggu (tanpa EngineBusy) sampai slot dilepas
+    engine._acquire(2)
+    images = [np.zeros((64, 64, 3), dtype=np.uint8)] * 2
+    done = []
+    job = threading.Thread(target=lambda: done.append(enroller._encode(images)))
+    job.start()
+    time.sleep(0.1)
+    assert not done and engine.pending == 2
+    # Sisa slot di atas bagian job tetap bisa dipakai request live
+    engine._acquire(2)
+    engine._release(4)
+    job.join(5)
+    assert done and len(done[0]) == 2 and engine.rejected == 0
+    print("[OK] Job massal menyisakan slot untuk request live")
@@ -0,0 +1,79 @@
+import numpy as np
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from embedding_store import EmbeddingStore, migrate_users
+
+
+def _open_store(tmp_path):
+    return EmbeddingStore(str(tmp_path / "embeddings.f32"),
+                          str(tmp_path / "embeddings_index.json")).open()
+
+
+def test_migrate_and_reopen(tmp_path):
+    """Encoding di users.json dipindah ke file biner dan terbaca lagi lewat memmap"""
+    rng = np.random.default_rng(0)
+    encodings = rng.normal(0, 0.1, size=(3, 128))
+    users = [
+        {'id': f"M{i}", 'nama': f"Mhs {i}", 'encoding': encodings[i].tolist()}
+        for i in range(3)
+    ]
+    users.append({'id': 'D1', 'nama': 'Dosen tanpa wajah'})
+
+    store = _open_store(tmp_path)
+    assert migrate_users(users, store) == 3
+    assert all('encoding' not in u for u in users)
+    assert [u.get('encoding_row') for u in users] == [0, 1, 2, None]
+
+    store = _open_store(tmp_path)
+    assert len(store) == 3
+    matrix = store.rows([0, 1, 2])
+    assert isinstance(matrix, np.memmap)
+    assert np.allclose(matrix, encodings, atol=1e-6)
+    print("[OK] Embedding migration test passed!")
+
+
+def test_reenroll_appends_new_row(tmp_path):
+    store = _open_store(tmp_path)
+    a = np.full(128, 0.25)
+    b = np.full(128, -0.5)
+
+    assert store.put("M1", a) == 0
+    assert store.put("M2", b) == 1
+    view = store.rows([0, 1])
+    # Registrasi ulang menulis baris baru; baris lama (dan view di atasnya) tidak berubah
+    assert store.put("M1", b) == 2
+    assert np.allclose(store.get("M1"), b)
+    assert np.allclose(view[0], a)
+
+    store = _open_store(tmp_path)
+    assert store.row_of("M2") == 1
+    assert np.allclose(store.get("M2"), b)
+    assert store.remove("M2") and store.get("M2") is None
+
+
+def test_put_many_single_write(tmp_path):
+    store = _open_store(tmp_path)
+    store.put("M1", np.full(128, 0.1))
+    rows = store.put_many([("M2", np.full(128, 0.2)), ("M1", np.full(128, 0.3)), ("M3", np.full(128, 0.4))])
+    assert rows == [1, 2, 3]
+
+    store = _open_store(tmp_path)
+    assert len(store) == 4
+    assert np.allclose(store.get("M1"), 0.3) and np.allclose(store.get("M3"), 0.4)
+    print("[OK] put_many: semua baris di-append dalam satu tulis")
+
+
+def test_two_writers_share_rows_and_index(tmp_path):
+    """Dua proses server menulis ke store yang sama tanpa saling menimpa baris / index"""
+    a = _open_store(tmp_path)
+    b = _open_store(tmp_path)
+    assert a.put("M1", np.full(128, 0.1)) == 0
+    assert b.put("M2", np.full(128, 0.2)) == 1
+    assert b.row_of("M1") == 0
+    assert a.put_many([("M3", np.full(128, 0.3))]) == [2]
+
+    store = _open_store(tmp_path)
+    assert {k: store.row_of(k) for k in ("M1", "M2", "M3")} == {"M1": 0, "M2": 1, "M3": 2}
+    assert np.allclose(store.get("M2"), 0.2)
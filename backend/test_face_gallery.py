@@ -0,0 +1,155 @@
+import numpy as np
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from face_gallery import FaceGallery
+from ann_index import IVFIndex
+
+
+def _random_gallery(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0, 0.1, size=(n, 128))
+    names = [f"mhs_{i}" for i in range(n)]
+    gallery = FaceGallery()
+    gallery.rebuild(encodings, names, [f"M{i:08d}" for i in range(n)])
+    return gallery, encodings
+
+
+def test_match_equals_brute_force():
+    """Top-k dari gallery harus sama dengan scan brute force"""
+    gallery, encodings = _random_gallery()
+    rng = np.random.default_rng(1)
+    queries = encodings[:5] + rng.normal(0, 0.01, size=(5, 128))
+
+    results = gallery.match(queries, k=3, tolerance=0.6)
+    for q, rows in zip(queries, results):
+        brute = np.linalg.norm(encodings - q, axis=1)
+        expected = np.argsort(brute)[:3]
+        assert [r['index'] for r in rows] == expected.tolist()
+        assert np.allclose([r['distance'] for r in rows], brute[expected], atol=1e-4)
+        assert all(abs(r['confidence'] - (1 - r['distance'])) < 1e-9 for r in rows)
+    print("[OK] Gallery top-k matches brute force")
+
+
+def test_tolerance_per_request():
+    gallery, encodings = _random_gallery()
+    query = encodings[7] + 0.02
+    best = gallery.match([query], tolerance=0.6)[0][0]
+    assert best['match'] and best['nama'] == 'mhs_7'
+    assert not gallery.match([query], tolerance=0.0)[0][0]['match']
+    print("[OK] Per-request tolerance respected")
+
+
+def test_incremental_upsert_and_remove():
+    """Upsert/remove harus sama hasilnya dengan rebuild penuh"""
+    gallery, encodings = _random_gallery(n=10)
+    rng = np.random.default_rng(2)
+    new_enc = rng.normal(0, 0.1, size=128)
+
+    gallery.upsert("M00000003", "mhs_3_baru", new_enc)
+    gallery.upsert("MNEW", "mhs_new", encodings[0] + 0.5)
+    assert gallery.remove("M00000001")
+    assert not gallery.remove("M-TIDAK-ADA")
+    assert len(gallery) == 10
+
+    expected = {uid: enc for uid, enc in zip([f"M{i:08d}" for i in range(10)], encodings)}
+    expected["M00000003"] = new_enc
+    expected["MNEW"] = encodings[0] + 0.5
+    del expected["M00000001"]
+
+    for uid, enc in expected.items():
+        row = gallery.row_of(uid)
+        assert gallery.user_ids[row] == uid
+        assert np.allclose(gallery.matrix[row], enc, atol=1e-6)
+        assert np.isclose(gallery.sq_norms[row], np.dot(enc, enc), rtol=1e-4)
+    assert gallery.match([new_enc])[0][0]['nama'] == "mhs_3_baru"
+    print("[OK] Incremental gallery updates")
+
+
+def test_ivf_index_exact_rerank():
+    """Dengan semua list diprobe, hasil IVF harus sama dengan brute force"""
+    _, encodings = _random_gallery(n=300)
+    names = [f"mhs_{i}" for i in range(300)]
+    ids = [f"M{i:08d}" for i in range(300)]
+    brute = FaceGallery()
+    brute.rebuild(encodings, names, ids)
+    ivf = FaceGallery(index=IVFIndex(n_lists=10), index_min_size=100)
+    ivf.rebuild(encodings, names, ids)
+    # Belum dilatih: match tetap exact (brute force) dan tidak melatih di dalam lock
+    assert ivf.match(encodings[:1])[0][0]['index'] == 0
+    ivf.train_index()
+    assert not ivf._index_stale
+
+    queries = encodings[:20] + 0.01
+    exact = brute.match(queries, k=3)
+    approx = ivf.match(queries, k=3, n_probe=10)
+    assert [[r['index'] for r in row] for row in approx] == [[r['index'] for r in row] for row in exact]
+
+    # Update incremental tetap terlihat lewat index
+    ivf.upsert("MNEW", "mhs_new", encodings[5] + 0.3)
+    ivf.remove("M00000000")
+    assert ivf.match([encodings[5] + 0.3])[0][0]['nama'] == "mhs_new"
+    assert ivf.match([encodings[0]], n_probe=10)[0][0]['user_id'] != "M00000000"
+    print("[OK] IVF index re-rank matches brute force")
+
+
+def test_empty_gallery():
+    gallery = FaceGallery()
+    assert gallery.match(np.zeros((2, 128))) == [[], []]
+    assert gallery.match([np.zeros(128)]) == [[]]
+
+
+def test_assign_one_to_one():
+    """Dua wajah yang mirip orang yang sama: hanya yang terdekat dapat identitasnya"""
+    gallery, encodings = _random_gallery(n=20)
+    queries = np.stack([encodings[3] + 0.001, encodings[3] + 0.01, encodings[7], np.full(128, 5.0)])
+    result = gallery.assign(queries, tolerance=0.6)
+    assert result[0]['index'] == 3 and result[2]['index'] == 7
+    assert result[1] is None or result[1]['index'] not in (3, 7)
+    assert result[3] is None
+    ids = [r['user_id'] for r in result if r]
+    assert len(ids) == len(set(ids))
+    assert gallery.assign(np.zeros((0, 128))) == []
+    print("[OK] Assignment satu-ke-satu")
+
+
+def test_assign_is_optimal_not_greedy():
+    """A paling dekat ke X, tapi B hanya cocok dengan X: A harus ke Y agar keduanya dikenali"""
+    axis = np.zeros(128, dtype=np.float32)
+    axis[0] = 1.0
+    gallery = FaceGallery()
+    gallery.rebuild(np.stack([axis * 0.0, axis * 0.8]), ['x', 'y'], ['X', 'Y'])
+    a, b = axis * 0.3, axis * -0.35
+    result = gallery.assign(np.stack([a, b]), tolerance=0.6)
+    assert [r['user_id'] for r in result] == ['Y', 'X']
+    # Dibatasi roster: Y bukan peserta, hanya satu wajah yang bisa dapat X
+    result = gallery.assign(np.stack([a, b]), tolerance=0.6, user_ids=['X'])
+    assert result[0]['user_id'] == 'X' and result[1] is None
+    print("[OK] Assignment optimal (bukan greedy) dan dibatasi roster")
+
+
+def test_verify_and_match_among():
+    gallery, encodings = _random_gallery(n=30)
+    ok = gallery.verify("M00000004", encodings[4] + 0.001)
+    assert ok['match'] and ok['index'] == 4
+    # Wajah teman (M5) untuk akun M4 ditolak
+    assert not gallery.verify("M00000004", encodings[5])['match']
+    assert gallery.verify("TIDAK_ADA", encodings[0]) is None
+
+    roster = ["M00000001", "M00000002", "TIDAK_ADA"]
+    result = gallery.match_among(np.stack([encodings[2], encodings[9]]), roster)
+    assert result[0]['user_id'] == "M00000002" and result[0]['match']
+    assert result[1]['user_id'] in roster and not result[1]['match']
+    assert gallery.match_among(encodings[:1], []) == [None]
+    print("[OK] Verifikasi 1:1 dan pencarian dalam roster")
+
+
+if __name__ == "__main__":
+    test_match_equals_brute_force()
+    test_tolerance_per_request()
+    test_incremental_upsert_and_remove()
+    test_ivf_index_exact_rerank()
+    test_empty_gallery()
+    test_assign_one_to_one()
+    test_verify_and_match_among()
@@ -0,0 +1,37 @@
+import numpy as np
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from file_encoding_cache import FileEncodingCache
+
+
+def test_cache_roundtrip_and_eviction(tmp_path):
+    """Cache hit untuk file yang tidak berubah, miss jika berubah, evict jika dihapus"""
+    img_a = tmp_path / "budi_1.jpg"
+    img_b = tmp_path / "ani_1.jpg"
+    img_a.write_bytes(b"aaaa")
+    img_b.write_bytes(b"bbbb")
+    cache_path = str(tmp_path / "encoding_cache.json")
+
+    cache = FileEncodingCache(cache_path).load()
+    assert cache.lookup(str(img_a)) == (False, None)
+    cache.store(str(img_a), np.arange(128, dtype=float))
+    cache.store(str(img_b), None)
+    cache.save()
+
+    cache = FileEncodingCache(cache_path).load()
+    hit, enc = cache.lookup(str(img_a))
+    assert hit and np.allclose(enc, np.arange(128))
+    assert cache.lookup(str(img_b)) == (True, None)
+
+    # File berubah -> miss
+    img_a.write_bytes(b"aaaa-changed")
+    assert cache.lookup(str(img_a))[0] is False
+
+    # File hilang -> dibuang saat prune
+    img_b.unlink()
+    assert cache.prune([str(img_a)]) == 1
+    cache.save()
+    assert str(img_b) not in FileEncodingCache(cache_path).load().entries
+    print("[OK] File encoding cache test passed!")
@@ -0,0 +1,112 @@
+import pickle
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from frame_quality import FrameFilter, FrameRejected
+
+
+def _textured(value=128, size=480):
+    rng = np.random.default_rng(0)
+    noise = rng.integers(-60, 60, size=(size, size, 1))
+    return np.clip(value + noise, 0, 255).astype(np.uint8).repeat(3, axis=2)
+
+
+def _reason(frame_filter, rgb):
+    try:
+        frame_filter.check_image(rgb)
+    except FrameRejected as e:
+        return e.reason
+    return None
+
+
+def test_brightness_and_blur_checks():
+    frame_filter = FrameFilter()
+    sharp = _textured()
+    assert _reason(frame_filter, sharp) is None
+    assert _reason(frame_filter, np.full((480, 480, 3), 10, dtype=np.uint8)) == 'too_dark'
+    assert _reason(frame_filter, np.full((480, 480, 3), 250, dtype=np.uint8)) == 'too_bright'
+    blurred = cv2.GaussianBlur(sharp, (0, 0), 8)
+    assert _reason(frame_filter, blurred) == 'blurry'
+    assert _reason(FrameFilter(min_sharpness=0), blurred) is None
+    print("[OK] Cek kecerahan dan blur")
+
+
+def test_min_face_size():
+    frame_filter = FrameFilter(min_face_size=60)
+    big, small = (0, 100, 100, 0), (0, 30, 30, 0)
+    assert frame_filter.check_faces([big, small]) == [big]
+    assert frame_filter.check_faces([]) == []
+    try:
+        frame_filter.check_faces([small])
+        assert False, 'wajah kecil harus ditolak'
+    except FrameRejected as e:
+        assert e.reason == 'face_too_small'
+    print("[OK] Ukuran wajah minimum")
+
+
+class _Detector:
+    """face_locations palsu: wajah hanya terlihat dengan upsample >= `needs_upsample`."""
+
+    def __init__(self, needs_upsample):
+        self.needs_upsample = needs_upsample
+        self.calls = []
+
+    def face_locations(self, img, number_of_times_to_upsample=1, model='hog'):
+        self.calls.append((max(img.shape[:2]), number_of_times_to_upsample, model))
+        if self.needs_upsample is None or number_of_times_to_upsample < self.needs_upsample:
+            return []
+        h, w = img.shape[:2]
+        return [(h // 4, w * 3 // 4, h * 3 // 4, w // 4)]
+
+
+def _locate_with(detector, model='cnn', upsample=1):
+    import inference_engine
+    saved = inference_engine._face_recognition, inference_engine._detect_max_dim, inference_engine._frame_filter
+    inference_engine._face_recognition = detector
+    inference_engine._detect_max_dim = 640
+    inference_engine._frame_filter = FrameFilter(min_face_size=0)
+    try:
+        return inference_engine._locate(np.zeros((960, 1280, 3), dtype=np.uint8), model, upsample)
+    finally:
+        inference_engine._face_recognition, inference_engine._detect_max_dim, inference_engine._frame_filter = saved
+
+
+def test_fast_pass_falls_back_to_configured_pass():
+    # Pass cepat menemukan wajah: dipakai langsung, tanpa pass kedua
+    detector = _Detector(needs_upsample=0)
+    assert len(_locate_with(detector)) == 1
+    assert detector.calls == [(320, 0, 'hog')]
+
+    # Pass cepat kosong, pass terkonfigurasi (640px, upsample, model) menemukan wajah
+    detector = _Detector(needs_upsample=1)
+    locations = _locate_with(detector)
+    assert detector.calls == [(320, 0, 'hog'), (640, 1, 'cnn')]
+    assert locations == [(240, 960, 720, 320)]
+
+    # Kedua pass kosong -> no_face
+    detector = _Detector(needs_upsample=None)
+    try:
+        _locate_with(detector)
+        assert False, 'frame tanpa wajah harus ditolak'
+    except FrameRejected as e:
+        assert e.reason == 'no_face'
+    assert len(detector.calls) == 2
+    print("[OK] Pass cepat hanya prefilter; fallback ke pass terkonfigurasi")
+
+
+def test_rejection_survives_pickle():
+    # FrameRejected dikirim balik dari proses worker lewat pickle
+    e = pickle.loads(pickle.dumps(FrameRejected('blurry')))
+    assert e.reason == 'blurry' and str(e) == e.message
+    assert pickle.loads(pickle.dumps(FrameFilter(min_face_size=90))).min_face_size == 90
+    print("[OK] FrameRejected / FrameFilter bisa di-pickle")
+
+
+if __name__ == '__main__':
+    test_brightness_and_blur_checks()
+    test_min_face_size()
+    test_rejection_survives_pickle()
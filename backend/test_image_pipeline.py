@@ -0,0 +1,59 @@
+import base64
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from image_pipeline import decode_base64_image, decode_image_bytes, downscale_for_detection, rescale_locations
+
+
+def _jpeg(width, height):
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[:, :, 2] = 255  # merah dalam BGR
+    ok, buf = cv2.imencode('.jpg', img)
+    assert ok
+    return buf.tobytes()
+
+
+def test_decode_returns_rgb():
+    rgb = decode_image_bytes(_jpeg(64, 48))
+    assert rgb.shape == (48, 64, 3)
+    assert rgb[0, 0, 0] > 200 and rgb[0, 0, 2] < 50
+    print("[OK] Decode langsung ke RGB")
+
+
+def test_decode_reduced_resolution():
+    rgb = decode_image_bytes(_jpeg(4000, 3000), max_dim=1000)
+    assert max(rgb.shape[:2]) >= 1000
+    assert max(rgb.shape[:2]) <= 2000
+    print(f"[OK] Decode resolusi dikurangi: {rgb.shape}")
+
+
+def test_decode_base64_data_url_and_invalid():
+    b64 = 'data:image/jpeg;base64,' + base64.b64encode(_jpeg(32, 32)).decode()
+    assert decode_base64_image(b64).shape == (32, 32, 3)
+    assert decode_base64_image('bukan-gambar!!') is None
+    assert decode_base64_image(base64.b64encode(b'xxxx').decode()) is None
+    print("[OK] Base64 data URL dan input tidak valid")
+
+
+def test_downscale_and_rescale_roundtrip():
+    rgb = np.zeros((1280, 960, 3), dtype=np.uint8)
+    small, scale = downscale_for_detection(rgb, 640)
+    assert max(small.shape[:2]) == 640
+    assert scale == 2.0
+    boxes = rescale_locations([(10, 100, 60, 50)], scale, rgb.shape)
+    assert boxes == [(20, 200, 120, 100)]
+
+    same, scale = downscale_for_detection(small, 640)
+    assert same is small and scale == 1.0
+    print("[OK] Downscale untuk deteksi dan rescale lokasi")
+
+
+if __name__ == '__main__':
+    test_decode_returns_rgb()
+    test_decode_reduced_resolution()
+    test_decode_base64_data_url_and_invalid()
+    test_downscale_and_rescale_roundtrip()
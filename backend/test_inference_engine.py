@@ -0,0 +1,121 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import inference_engine
+from benchmark import install_stub, synthetic_encodings, synthetic_image
+from inference_engine import EngineBusy, InferenceEngine
+
+ENCODINGS = synthetic_encodings(4, seed=3)
+
+
+@pytest.fixture(autouse=True)
+def stub_models():
+    """Model wajah stub untuk proses ini (worker 'pool' di bawah jalan di thread yang sama)."""
+    install_stub(ENCODINGS, noise=0.0)
+    saved = inference_engine._face_recognition, inference_engine._detect_max_dim, inference_engine._frame_filter
+    inference_engine._init_worker()
+    yield
+    inference_engine._face_recognition, inference_engine._detect_max_dim, inference_engine._frame_filter = saved
+
+
+class _FakePool:
+    """Pengganti ProcessPoolExecutor: task jalan langsung (atau gagal / tidak pernah selesai);
+    nama segmen shared memory yang dikirim dicatat."""
+
+    def __init__(self, mode='ok'):
+        self.mode = mode
+        self.segments = []
+
+    def submit(self, fn, *args):
+        specs = args[0] if isinstance(args[0], list) else [(args[0], args[1])]
+        self.segments.extend(name for name, _ in specs)
+        if self.mode == 'submit_error':
+            raise RuntimeError('pool rusak')
+        future = Future()
+        if self.mode == 'ok':
+            future.set_result(fn(*args))
+        elif self.mode == 'task_error':
+            future.set_exception(RuntimeError('worker mati'))
+        return future
+
+
+def _unlinked(name):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return True
+    shm.close()
+    return False
+
+
+def _rgb(identity):
+    import cv2
+    return cv2.cvtColor(cv2.imdecode(np.frombuffer(synthetic_image(identity), np.uint8), cv2.IMREAD_COLOR),
+                        cv2.COLOR_BGR2RGB)
+
+
+def test_inline_path():
+    engine = InferenceEngine(workers=0)
+    locations, encodings = engine.detect_and_encode(_rgb(2))
+    assert len(locations) == 1 and np.allclose(encodings[0], ENCODINGS[2], atol=1e-5)
+    results = engine.submit_batch([_rgb(1), _rgb(3)]).result()
+    assert [np.allclose(r[1][0], ENCODINGS[i], atol=1e-5) for r, i in zip(results, (1, 3))] == [True, True]
+    assert engine.pending == 0 and engine.warm_up() == 0
+    print("[OK] Inference inline (workers=0)")
+
+
+def test_engine_busy_when_slots_exhausted():
+    engine = InferenceEngine(workers=0, max_pending=2)
+    engine._acquire(2)
+    with pytest.raises(EngineBusy) as busy:
+        engine.detect_and_encode(_rgb(0))
+    with pytest.raises(EngineBusy):
+        engine.submit_batch([_rgb(0)])
+    assert busy.value.retry_after >= 1 and engine.rejected == 2
+    engine._release(2)
+    assert engine.submit_batch([_rgb(0)]).result()
+    print("[OK] EngineBusy saat slot habis")
+
+
+@pytest.mark.parametrize('mode', ['ok', 'submit_error', 'task_error'])
+def test_batch_segments_unlinked(mode):
+    engine = InferenceEngine(workers=2)
+    engine._pool = pool = _FakePool(mode)
+    if mode == 'submit_error':
+        with pytest.raises(RuntimeError):
+            engine.submit_batch([_rgb(0), _rgb(1)])
+    else:
+        future = engine.submit_batch([_rgb(0), _rgb(1)])
+        if mode == 'ok':
+            assert len(future.result()) == 2
+        else:
+            with pytest.raises(RuntimeError):
+                future.result()
+    assert len(pool.segments) == 2 and all(_unlinked(name) for name in pool.segments)
+    assert engine.pending == 0
+    print(f"[OK] Segmen shared memory di-unlink ({mode})")
+
+
+@pytest.mark.parametrize('mode', ['ok', 'task_error', 'hang'])
+def test_single_segment_unlinked(mode):
+    engine = InferenceEngine(workers=2, timeout=0.05)
+    engine._pool = pool = _FakePool(mode)
+    if mode == 'ok':
+        assert len(engine.detect_and_encode(_rgb(2))[1]) == 1
+    elif mode == 'task_error':
+        with pytest.raises(RuntimeError):
+            engine.detect_and_encode(_rgb(2))
+    else:
+        # Worker tidak menjawab dalam batas waktu -> sibuk (503), bukan 500
+        with pytest.raises(EngineBusy):
+            engine.detect_and_encode(_rgb(2))
+    assert len(pool.segments) == 1 and _unlinked(pool.segments[0])
+    assert engine.pending == 0
+    print(f"[OK] Segmen shared memory tunggal di-unlink ({mode})")
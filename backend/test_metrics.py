@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import Metrics, _NULL_TIMER
+
+
+def test_histograms_counters_and_gauges():
+    metrics = Metrics(buckets=(0.01, 0.1))
+    metrics.observe('stage_duration_seconds', 0.005, stage='decode')
+    metrics.observe('stage_duration_seconds', 0.05, stage='decode')
+    metrics.observe('stage_duration_seconds', 1.0, stage='decode')
+    metrics.inc('http_requests_total', endpoint='/api/health', status=200)
+    metrics.inc('http_requests_total', endpoint='/api/health', status=200)
+    metrics.gauge('gallery_faces', lambda: 42, 'Jumlah wajah')
+    metrics.gauge('store_file_bytes', lambda: {'users.json': 10}, label='file')
+    metrics.gauge('rusak', lambda: 1 / 0)
+
+    lines = metrics.render().splitlines()
+    assert 'absen_stage_duration_seconds_bucket{stage="decode",le="0.01"} 1' in lines
+    assert 'absen_stage_duration_seconds_bucket{stage="decode",le="0.1"} 2' in lines
+    assert 'absen_stage_duration_seconds_bucket{stage="decode",le="+Inf"} 3' in lines
+    assert 'absen_stage_duration_seconds_count{stage="decode"} 3' in lines
+    assert 'absen_http_requests_total{endpoint="/api/health",status="200"} 2' in lines
+    assert '# HELP absen_gallery_faces Jumlah wajah' in lines and 'absen_gallery_faces 42' in lines
+    assert 'absen_store_file_bytes{file="users.json"} 10' in lines
+    assert not any(line.startswith('absen_rusak') for line in lines)
+    print("[OK] Metrics format Prometheus")
+
+
+def test_stage_breakdown_per_request():
+    metrics = Metrics()
+    metrics.begin_request()
+    with metrics.stage('decode'):
+        pass
+    metrics.observe_stage('face_locations', 0.02)
+    stages = metrics.end_request()
+    assert [name for name, _ in stages] == ['decode', 'face_locations']
+    # Di luar request (thread lain / callback) tidak ada rincian yang dikumpulkan
+    metrics.observe_stage('batch_match', 0.001)
+    assert metrics.end_request() == []
+    assert 'stage="batch_match"' in metrics.render()
+    print("[OK] Rincian tahap per request")
+
+
+def test_disabled_is_noop():
+    metrics = Metrics(enabled=False)
+    metrics.begin_request()
+    assert metrics.stage('decode') is _NULL_TIMER
+    with metrics.stage('decode'):
+        pass
+    metrics.observe('x', 1.0)
+    metrics.inc('y')
+    assert metrics.end_request() == [] and metrics.render() == '\n'
+    print("[OK] Metrics nonaktif tanpa overhead pencatatan")
@@ -0,0 +1,148 @@
+import numpy as np
+import sys
+import os
+import threading
+from concurrent.futures import Future
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from face_gallery import FaceGallery
+from inference_engine import EngineBusy, InferenceEngine
+from micro_batcher import MicroBatcher, _Request
+
+
+class _EchoEngine:
+    """Engine sederhana: setiap gambar 1 wajah, encoding = nilai piksel pertama."""
+    rejected = 0
+    max_pending = 64
+    split_batch = InferenceEngine.split_batch
+
+    def __init__(self, workers=1):
+        self.workers = workers
+        self.batch_sizes = []
+
+    def submit_batch(self, images, model='hog', upsample=1, wait=0):
+        self.batch_sizes.append(len(images))
+        future = Future()
+        future.set_result([([(0, 1, 1, 0)], [np.full(128, img.flat[0] / 255.0)]) for img in images])
+        return future
+
+
+def test_concurrent_requests_share_one_batch():
+    gallery = FaceGallery()
+    gallery.rebuild(np.stack([np.full(128, v / 255.0) for v in (10, 100, 200)]), ['a', 'b', 'c'])
+    engine = _EchoEngine(workers=2)
+    batcher = MicroBatcher(engine, gallery, window=0.05, max_batch=8)
+    values = [10, 100, 200, 10, 100, 200]
+    out = [None] * len(values)
+
+    def worker(i):
+        img = np.full((4, 4, 3), values[i], dtype=np.uint8)
+        out[i] = batcher.recognize(img, tolerance=0.6)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(values))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert [o[2][0]['nama'] for o in out] == ['a', 'b', 'c', 'a', 'b', 'c']
+    assert sum(engine.batch_sizes) == len(values) and len(engine.batch_sizes) < len(values)
+    stats = batcher.stats()
+    assert stats['requests'] == len(values) and stats['max_batch_size'] > 1
+    print(f"[OK] Micro-batching: {stats}")
+
+
+def test_encode_only_skips_matching():
+    gallery = FaceGallery()
+    gallery.rebuild(np.stack([np.full(128, 10 / 255.0)]), ['a'])
+    batcher = MicroBatcher(_EchoEngine(), gallery, window=0.01)
+    locations, encodings, matches = batcher.recognize(np.full((4, 4, 3), 10, dtype=np.uint8), match=False)
+    assert len(encodings) == 1 and matches == []
+    assert batcher.match(encodings, tolerance=0.6)[0]['nama'] == 'a'
+    print("[OK] recognize(match=False) hanya menghitung encoding")
+
+
+class _Rejected(Exception):
+    """Pengganti FrameRejected (frame_quality butuh cv2)."""
+
+
+class _RejectDarkEngine(_EchoEngine):
+    """Gambar dengan piksel 0 ditolak cascade, sisanya seperti _EchoEngine."""
+
+    def submit_batch(self, images, model='hog', upsample=1, wait=0):
+        future = super().submit_batch(images, model, upsample)
+        results = [_Rejected('too_dark') if img.flat[0] == 0 else r for img, r in zip(images, future.result())]
+        future = Future()
+        future.set_result(results)
+        return future
+
+
+def test_rejected_frame_fails_only_its_request():
+    gallery = FaceGallery()
+    gallery.rebuild(np.stack([np.full(128, 100 / 255.0)]), ['b'])
+    batcher = MicroBatcher(_RejectDarkEngine(), gallery, window=0.05, max_batch=8)
+    out = {}
+
+    def worker(value):
+        try:
+            out[value] = batcher.recognize(np.full((4, 4, 3), value, dtype=np.uint8))
+        except _Rejected as e:
+            out[value] = e
+
+    threads = [threading.Thread(target=worker, args=(v,)) for v in (0, 100)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert isinstance(out[0], _Rejected) and str(out[0]) == 'too_dark'
+    assert out[100][2][0]['nama'] == 'b'
+    print("[OK] Frame ditolak tidak menggagalkan request lain di batch yang sama")
+
+
+def test_batch_is_split_over_workers():
+    gallery = FaceGallery()
+    gallery.rebuild(np.stack([np.full(128, 10 / 255.0)]), ['a'])
+    engine = _EchoEngine(workers=3)
+    batcher = MicroBatcher(engine, gallery)
+    batch = [_Request(np.full((4, 4, 3), 10, dtype=np.uint8), 0.6) for _ in range(5)]
+    batcher._dispatch(batch)
+    # 5 gambar ke 3 worker: satu task per worker, bukan satu task untuk semua
+    assert engine.batch_sizes == [2, 2, 1]
+    assert all(r.future.result()[2][0]['nama'] == 'a' for r in batch)
+    print("[OK] Batch dibagi ke semua worker")
+
+
+def test_engine_slots_count_images():
+    engine = InferenceEngine(workers=2, max_pending=4)
+    engine._acquire(3)
+    try:
+        engine._acquire(2)
+        assert False, "5 gambar melebihi max_pending=4"
+    except EngineBusy:
+        pass
+    engine._acquire(1)
+    assert engine.pending == 4
+    engine._release(4)
+    # Batch lebih besar dari max_pending tetap bisa jalan saat pool kosong
+    engine._acquire(6)
+    engine._release(6)
+    assert engine.pending == 0 and engine.rejected == 1
+    print("[OK] Slot engine dihitung per gambar")
+
+
+class _StuckEngine(_EchoEngine):
+    """Task yang tidak pernah selesai (pool penuh)."""
+
+    def submit_batch(self, images, model='hog', upsample=1, wait=0):
+        return Future()
+
+
+def test_timeout_raises_engine_busy():
+    batcher = MicroBatcher(_StuckEngine(), FaceGallery(), window=0.001, timeout=0.05)
+    try:
+        batcher.recognize(np.full((4, 4, 3), 10, dtype=np.uint8))
+        assert False, "timeout harus menjadi EngineBusy (503)"
+    except EngineBusy:
+        pass
+    print("[OK] Timeout micro-batcher -> EngineBusy")
@@ -0,0 +1,53 @@
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from readiness import NotReady, Readiness
+
+
+def test_steps_run_in_background_in_order():
+    release = threading.Event()
+    order = []
+
+    def slow_gallery():
+        release.wait(5)
+        order.append('gallery')
+        return {'faces': 3}
+
+    readiness = Readiness(('storage', 'gallery'))
+    readiness.start([('storage', lambda: order.append('storage')), ('gallery', slow_gallery)])
+    assert not readiness.wait(0.05)
+    assert readiness.snapshot()['components']['gallery']['status'] == 'loading'
+    readiness.require('storage')
+    try:
+        readiness.require('storage', 'gallery')
+        assert False, "gallery belum siap"
+    except NotReady as e:
+        assert e.components == ['gallery'] and e.retry_after > 0
+
+    release.set()
+    assert readiness.wait(5)
+    state = readiness.snapshot()
+    assert state['ready'] and readiness.is_ready()
+    assert state['components']['gallery']['faces'] == 3
+    assert order == ['storage', 'gallery']
+    print("[OK] Loading background berurutan")
+
+
+def test_failed_step_does_not_block_others_and_start_is_once():
+    calls = []
+
+    def broken():
+        raise RuntimeError("model rusak")
+
+    readiness = Readiness(('model', 'gallery'))
+    readiness.start([('model', broken), ('gallery', lambda: calls.append(1))], background=False)
+    readiness.start([('gallery', lambda: calls.append(2))], background=False)
+    state = readiness.snapshot()
+    assert state['components']['model'] == {'status': 'failed', 'error': 'model rusak',
+                                             'seconds': state['components']['model']['seconds']}
+    assert state['components']['gallery']['status'] == 'ready'
+    assert not state['ready'] and readiness.is_ready('gallery')
+    assert calls == [1]
+    print("[OK] Step gagal dilaporkan, start hanya sekali")
@@ -0,0 +1,58 @@
+import numpy as np
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from recognition_cache import RecognitionCache, image_key
+
+
+def _enc(v):
+    return np.full(128, v, dtype=np.float64)
+
+
+def test_hit_miss_and_key():
+    cache = RecognitionCache()
+    key = image_key(b'\xff\xd8gambar')
+    assert key == image_key(b'\xff\xd8gambar') and key != image_key(b'\xff\xd8lain')
+    assert image_key('data:image/jpeg;base64,AAAA') == image_key('data:image/jpeg;base64,AAAA')
+    assert cache.get(key) is None
+    cache.put(key, [(0, 10, 10, 0)], [_enc(0.1)])
+    locations, encodings = cache.get(key)
+    assert locations == [(0, 10, 10, 0)] and np.allclose(encodings[0], 0.1)
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['entries'] == 1
+    print(f"[OK] Hit/miss: {stats}")
+
+
+def test_ttl_expiry():
+    cache = RecognitionCache(ttl=0.05)
+    cache.put('a', [], [])
+    assert cache.get('a') is not None
+    time.sleep(0.1)
+    assert cache.get('a') is None and len(cache) == 0
+    print("[OK] Entry kadaluarsa setelah TTL")
+
+
+def test_lru_eviction_by_count_and_bytes():
+    cache = RecognitionCache(max_entries=2)
+    cache.put('a', [], [_enc(1)])
+    cache.put('b', [], [_enc(2)])
+    cache.get('a')  # 'a' jadi paling baru dipakai
+    cache.put('c', [], [_enc(3)])
+    assert cache.get('b') is None and cache.get('a') is not None and cache.get('c') is not None
+
+    one = RecognitionCache._size([], [_enc(1)])
+    cache = RecognitionCache(max_bytes=one * 3)
+    for k in 'abcde':
+        cache.put(k, [], [_enc(1)])
+    assert len(cache) == 3 and cache.stats()['bytes'] <= one * 3
+    assert cache.get('a') is None and cache.get('e') is not None
+    assert cache.evictions == 2
+    print("[OK] Eviction LRU berdasarkan jumlah entry dan ukuran memori")
+
+
+if __name__ == '__main__':
+    test_hit_miss_and_key()
+    test_ttl_expiry()
+    test_lru_eviction_by_count_and_bytes()
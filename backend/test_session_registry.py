@@ -0,0 +1,108 @@
+import json
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from session_registry import SessionRegistry
+from storage import JsonStorage, SqliteStorage
+
+
+def _registry(tmp_path, **kwargs):
+    storage = JsonStorage(str(tmp_path)).open()
+    renders = []
+
+    def render(text):
+        renders.append(text)
+        return b'PNG:' + text.encode()
+
+    return SessionRegistry(storage, secret='rahasia', render_qr=render, **kwargs).load(), storage, renders
+
+
+def test_start_lookup_and_end(tmp_path):
+    registry, storage, _ = _registry(tmp_path)
+    session = registry.start('D1', 'Dr. Ahmad', 'Basis Data')
+    sid = session['session_id']
+    assert registry.get(sid) is session
+    assert storage.get_session(sid)['is_active']
+    assert [s['session_id'] for s in registry.list_sessions(dosen_id='D1')] == [sid]
+    assert registry.list_sessions(dosen_id='D2') == []
+
+    # Writer menulis mahasiswa_absen ke storage; end() menggabungkannya
+    stored = storage.get_session(sid)
+    stored['mahasiswa_absen'] = ['M9']
+    storage.save_session(stored)
+    registry.mark_attended(sid, ['M1'])
+    ended = registry.end(sid)
+    assert not ended['is_active'] and sorted(ended['mahasiswa_absen']) == ['M1', 'M9']
+    assert registry.list_sessions(dosen_id='D1') == [] and not registry.get(sid)['is_active']
+
+    # Sesi aktif dimuat ulang dari storage setelah restart
+    other = registry.start('D1', 'Dr. Ahmad', 'AI')
+    reloaded, _, _ = _registry(tmp_path)
+    assert reloaded.get(other['session_id'])['mata_kuliah'] == 'AI'
+    print("[OK] Registry sesi: start, lookup, end, reload")
+
+
+def test_automatic_expiry(tmp_path):
+    registry, storage, _ = _registry(tmp_path)
+    registry.start_reaper()
+    session = registry.start('D1', 'Dr. Ahmad', 'Basis Data', duration=0.1)
+    time.sleep(0.3)
+    assert len(registry) == 0
+    stored = storage.get_session(session['session_id'])
+    assert not stored['is_active'] and stored['end_reason'] == 'expired'
+    print("[OK] Sesi berakhir otomatis")
+
+
+def test_sessions_shared_between_workers(tmp_path):
+    """Dua worker (registry) di atas SQLite yang sama: sesi worker lain bisa dilihat dan diakhiri"""
+    db = str(tmp_path / "absensi.db")
+    worker_a = SessionRegistry(SqliteStorage(db).open(), secret='rahasia').load()
+    worker_b = SessionRegistry(SqliteStorage(db).open(), secret='rahasia').load()
+    session = worker_a.start('D1', 'Dr. Ahmad', 'Basis Data')
+    sid = session['session_id']
+    assert [s['session_id'] for s in worker_b.list_sessions(dosen_id='D1')] == [sid]
+    assert worker_b.get(sid)['is_active']
+
+    # Writer worker A mencatat absensi; worker B mengakhiri sesi tanpa kehilangan datanya
+    worker_a.storage.commit_batch([{'id': 'A1', 'nama': 'Ani', 'tanggal': '2025-11-12', 'session_id': sid}],
+                                  {sid: ['M1']})
+    ended = worker_b.end(sid)
+    assert ended and not ended['is_active'] and ended['mahasiswa_absen'] == ['M1']
+    assert worker_b.end(sid) is None
+    assert not worker_a.get(sid)['is_active'] and len(worker_a) == 0
+    assert worker_a.list_sessions(dosen_id='D1') == []
+
+    # Sesi kadaluarsa milik worker lain diakhiri saat dibaca dari storage
+    expired = worker_a.start('D1', 'Dr. Ahmad', 'AI')
+    stored = worker_a.storage.get_session(expired['session_id'])
+    worker_a.storage.save_session(dict(stored, expires_ts=time.time() - 1))
+    assert worker_b.list_sessions(dosen_id='D1') == []
+    stored = worker_b.get(expired['session_id'])
+    assert not stored['is_active'] and stored['end_reason'] == 'expired'
+    worker_a.storage.close()
+    worker_b.storage.close()
+    print("[OK] Registry sesi dengan storage bersama")
+
+
+def test_rotating_signed_qr(tmp_path):
+    registry, _, renders = _registry(tmp_path, token_period=30)
+    sid = registry.start('D1', 'Dr. Ahmad', 'Basis Data')['session_id']
+    now = 1_000_000.0
+    png, payload, expires_in = registry.qr_png(sid, now=now)
+    assert png.startswith(b'PNG:') and 0 < expires_in <= 30
+    # Satu render per rotasi
+    assert registry.qr_png(sid, now=now + 1)[0] is png and len(renders) == 1
+
+    scanned = json.loads(payload)
+    assert registry.verify_barcode(sid, scanned, now=now)
+    assert registry.verify_barcode(sid, scanned, now=now + 30)      # token sebelumnya masih berlaku
+    assert not registry.verify_barcode(sid, scanned, now=now + 90)  # kadaluarsa
+    assert not registry.verify_barcode(sid, dict(scanned, sig='palsu'), now=now)
+    assert not registry.verify_barcode(sid, {'session_id': sid}, now=now)
+    assert not registry.verify_barcode('S_lain', scanned, now=now)
+
+    registry.qr_png(sid, now=now + 30)
+    assert len(renders) == 2
+    print("[OK] QR token bertanda tangan dan berotasi")
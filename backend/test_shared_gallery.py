@@ -0,0 +1,109 @@
+import mmap
+import multiprocessing
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from shared_gallery import SharedFaceGallery
+
+
+def _gallery(tmp_path):
+    return SharedFaceGallery(str(tmp_path / "gallery.bin"), str(tmp_path / "gallery.journal"))
+
+
+def _vec(seed):
+    return np.random.default_rng(seed).normal(0, 0.1, 128).astype(np.float32)
+
+
+def _enroll_in_child(tmp_path, user_id, seed):
+    worker = _gallery(tmp_path)
+    assert not worker.open(build=lambda: None)
+    worker.upsert(user_id, user_id.lower(), _vec(seed))
+    worker.close()
+
+
+def test_second_worker_attaches_without_building(tmp_path):
+    first = _gallery(tmp_path)
+    assert first.open(build=lambda: first.rebuild(np.stack([_vec(0), _vec(1)]), ['a', 'b'], ['A', 'B']))
+
+    def fail():
+        raise AssertionError("worker kedua tidak boleh membaca storage")
+
+    second = _gallery(tmp_path)
+    assert not second.open(build=fail)
+    assert second.names == ['a', 'b'] and len(second) == 2
+    base = second.matrix
+    while isinstance(base, np.ndarray):
+        base = base.base
+    assert isinstance(base, mmap.mmap)
+    assert second.match([_vec(1)])[0][0]['user_id'] == 'B'
+    first.close()
+    second.close()
+    print("[OK] Worker kedua memakai gallery bersama")
+
+
+def test_changes_are_seen_by_other_workers(tmp_path):
+    first = _gallery(tmp_path)
+    first.open(build=lambda: first.rebuild(np.stack([_vec(0)]), ['a'], ['A']))
+    second = _gallery(tmp_path)
+    second.open(build=lambda: None)
+
+    row = first.upsert('C', 'c', _vec(2))
+    assert second.verify('C', _vec(2))['match'] and second.row_of('C') == row
+    start = first.generation
+    # Lewati kapasitas awal: file diperbesar dan worker lain memetakan ulang
+    ids = [f'U{i}' for i in range(100)]
+    second.upsert_many(ids, [i.lower() for i in ids], [_vec(10 + i) for i in range(100)])
+    assert first.match([_vec(57)])[0][0]['user_id'] == 'U47'
+    assert first.generation == start + 1
+
+    assert first.remove('A')
+    assert 'A' not in second and len(second) == len(first) == 101
+    assert second.match([_vec(2)])[0][0]['nama'] == 'c'
+    assert np.allclose(first.sq_norms, second.sq_norms)
+    first.close()
+    second.close()
+    print("[OK] Registrasi di satu worker terlihat di worker lain")
+
+
+def test_journal_is_compacted(tmp_path):
+    first = SharedFaceGallery(str(tmp_path / "gallery.bin"), str(tmp_path / "gallery.journal"), compact_min_lines=20)
+    first.open(build=lambda: first.rebuild(np.stack([_vec(0), _vec(1)]), ['a', 'b'], ['A', 'B']))
+    second = _gallery(tmp_path)
+    second.open(build=lambda: None)
+    epoch = first._epoch
+    # Re-enroll berulang untuk user yang sama: journal tidak tumbuh tanpa batas
+    for i in range(100):
+        first.upsert('C', f'c{i}', _vec(100 + i))
+        if i == 30:
+            assert second.names[-1] == 'c30'
+    assert first._epoch > epoch
+    with open(tmp_path / "gallery.journal") as f:
+        assert len(f.readlines()) <= 20
+    assert second.names == ['a', 'b', 'c99'] and second.row_of('C') == 2
+    assert second.match([_vec(199)])[0][0]['user_id'] == 'C'
+    assert np.allclose(first.sq_norms, second.sq_norms)
+    first.close()
+    second.close()
+    print("[OK] Journal gallery bersama dipadatkan")
+
+
+def test_enrollment_from_other_process_and_cold_start(tmp_path):
+    first = _gallery(tmp_path)
+    first.open(build=lambda: first.rebuild(np.stack([_vec(0)]), ['a'], ['A']))
+    child = multiprocessing.get_context('spawn').Process(target=_enroll_in_child, args=(tmp_path, 'P', 5))
+    child.start()
+    child.join(60)
+    assert child.exitcode == 0
+    assert first.match([_vec(5)])[0][0]['user_id'] == 'P'
+    first.close()
+
+    # Tidak ada worker yang hidup: proses berikutnya membangun ulang dari storage
+    built = []
+    fresh = _gallery(tmp_path)
+    assert fresh.open(build=lambda: built.append(fresh.rebuild(np.stack([_vec(9)]), ['z'], ['Z'])))
+    assert built and fresh.names == ['z']
+    fresh.close()
+    print("[OK] Gallery bersama antar proses dan cold start")
@@ -0,0 +1,110 @@
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from storage import JsonStorage, SqliteStorage, migrate_json_to_sqlite
+
+
+def _check_backend(storage):
+    storage.save_user({'id': 'M1', 'nama': 'Budi Santoso', 'email': 'Budi@kampus.id', 'role': 'mahasiswa'})
+    storage.save_user({'id': 'D1', 'nama': 'Dr. Ahmad', 'email': 'ahmad@kampus.id', 'role': 'dosen'})
+    storage.save_user({'id': 'M1', 'nama': 'Budi Santoso', 'email': 'budi@kampus.id', 'role': 'mahasiswa', 'nim': '123'})
+    assert storage.count_users() == 2
+    assert storage.count_users('mahasiswa') == 1
+    assert storage.find_user(email='BUDI@kampus.id')['nim'] == '123'
+    assert storage.find_user(nama='budi_santoso')['id'] == 'M1'
+    assert storage.find_user(email='tidak@ada.id') is None
+    assert storage.find_user(user_id='D1')['email'] == 'ahmad@kampus.id'
+    assert storage.find_user(user_id='X9') is None
+
+    record = {'id': 'A1', 'nama': 'Budi Santoso', 'tanggal': '2025-11-12', 'waktu': '08:00:00',
+              'session_id': 'S1', 'mata_kuliah': 'Basis Data'}
+    storage.commit_batch([record], {})
+    assert storage.has_attended('2025-11-12', 'budi santoso')
+    storage.commit_batch([{'id': 'A3', 'nama': 'Ani', 'tanggal': '2025-11-12', 'waktu': '08:05:00'}], {})
+    assert storage.count_attendance('2025-11-12') == 2
+    assert [a['id'] for a in storage.list_attendance(mata_kuliah='Basis Data')] == ['A1']
+    assert [a['id'] for a in storage.list_attendance(session_id='S1')] == ['A1']
+    assert len(storage.list_attendance()) == 2
+
+    # Cursor pagination: user urut masuk, absensi terbaru dulu
+    storage.save_user({'id': 'M2', 'nama': 'Ani', 'email': 'ani@kampus.id', 'role': 'mahasiswa'})
+    page, cursor = storage.page_users(role='mahasiswa', limit=1)
+    assert [u['id'] for u in page] == ['M1'] and cursor is not None
+    page, cursor = storage.page_users(role='mahasiswa', after=cursor, limit=1)
+    assert [u['id'] for u in page] == ['M2'] and cursor is None
+    assert len(storage.page_users(limit=10)[0]) == 3
+    page, cursor = storage.page_attendance(tanggal='2025-11-12', limit=1)
+    assert [a['id'] for a in page] == ['A3'] and cursor is not None
+    page, cursor = storage.page_attendance(tanggal='2025-11-12', before=cursor, limit=1)
+    assert [a['id'] for a in page] == ['A1'] and cursor is None
+    assert storage.page_attendance(mata_kuliah='Basis Data', limit=5) == ([record], None)
+    assert [a['id'] for a in storage.page_attendance(limit=None)[0]] == ['A3', 'A1']
+
+    session = {'session_id': 'S1', 'dosen_id': 'D1', 'is_active': True, 'mata_kuliah': 'Basis Data',
+               'mahasiswa_absen': []}
+    storage.save_session(session)
+    session['mahasiswa_absen'].append('M1')
+    storage.save_session(session)
+    assert storage.get_session('S1')['mahasiswa_absen'] == ['M1']
+    assert len(storage.list_sessions(dosen_id='D1', active=True)) == 1
+    session['is_active'] = False
+    storage.save_session(session)
+    assert storage.list_sessions(dosen_id='D1', active=True) == []
+
+
+def test_json_backend(tmp_path):
+    _check_backend(JsonStorage(str(tmp_path)).open())
+    print("[OK] JSON storage backend")
+
+
+def test_sqlite_backend(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "absensi.db")).open()
+    _check_backend(storage)
+    with storage._conn() as conn:
+        mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+    assert mode == 'wal'
+    assert synchronous == 2  # FULL
+    storage.close()
+    print("[OK] SQLite storage backend")
+
+
+def test_migrate_json_to_sqlite(tmp_path):
+    (tmp_path / "users.json").write_text(json.dumps([
+        {'id': 'M1', 'nama': 'Budi', 'email': 'budi@kampus.id', 'role': 'mahasiswa'}
+    ]))
+    (tmp_path / "attendance.json").write_text(json.dumps([
+        {'id': 'A1', 'nama': 'Budi', 'tanggal': '2025-11-12', 'waktu': '08:00:00'}
+    ]))
+    (tmp_path / "sessions.json").write_text(json.dumps([
+        {'session_id': 'S1', 'dosen_id': 'D1', 'is_active': True}
+    ]))
+    db_path = str(tmp_path / "absensi.db")
+    assert migrate_json_to_sqlite(str(tmp_path), db_path) == (1, 1)
+
+    storage = SqliteStorage(db_path).open()
+    assert storage.find_user(email='budi@kampus.id')['id'] == 'M1'
+    assert storage.has_attended('2025-11-12', 'Budi')
+    assert storage.get_session('S1')['dosen_id'] == 'D1'
+    storage.close()
+
+
+def test_sqlite_connection_pool_is_bounded(tmp_path):
+    import threading
+    storage = SqliteStorage(str(tmp_path / 'absensi.db'), pool_size=4).open()
+    storage.save_user({'id': 'M1', 'nama': 'Budi', 'email': 'budi@kampus.id', 'role': 'mahasiswa'})
+    # Satu thread per request (seperti server Werkzeug) tidak boleh menambah koneksi
+    threads = [threading.Thread(target=storage.count_users) for _ in range(300)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert storage._opened <= 4
+    # Iterator memegang koneksinya sampai selesai lalu mengembalikannya
+    assert list(storage.iter_attendance()) == []
+    assert len(storage._idle) == storage._opened
+    storage.close()
+    assert storage._opened == 0
+    print("[OK] Pool koneksi SQLite terbatas")
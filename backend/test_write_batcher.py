@@ -0,0 +1,97 @@
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from storage import JsonStorage, SqliteStorage
+from write_batcher import GroupCommitWriter
+
+
+def _burst(storage, n=100):
+    storage.save_session({'session_id': 'S1', 'dosen_id': 'D1', 'is_active': True, 'mahasiswa_absen': []})
+    writer = GroupCommitWriter(storage, max_batch=32, interval=0.02).start()
+    results = [None] * n
+
+    def check_in(i):
+        record = {'id': f"A{i}", 'nama': f"Mhs {i}", 'tanggal': '2025-11-12', 'waktu': '08:00:00', 'session_id': 'S1'}
+        results[i] = writer.add_attendance(record, session_id='S1', mahasiswa_id=f"M{i}")
+
+    threads = [threading.Thread(target=check_in, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Duplikat pada hari yang sama ditolak saat once=True
+    assert not writer.add_attendance({'id': 'X', 'nama': 'mhs_0', 'tanggal': '2025-11-12'}, once=True)
+    writer.stop()
+
+    assert all(results)
+    assert storage.count_attendance('2025-11-12') == n
+    assert sorted(storage.get_session('S1')['mahasiswa_absen']) == sorted(f"M{i}" for i in range(n))
+    assert writer.batches < n
+    return writer
+
+
+def test_group_commit_json(tmp_path):
+    writer = _burst(JsonStorage(str(tmp_path)).open())
+    print(f"[OK] JSON group commit: {writer.records} record dalam {writer.batches} batch")
+
+
+def test_group_commit_sqlite(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "absensi.db")).open()
+    _burst(storage)
+    storage.close()
+
+
+def test_add_many_single_batch(tmp_path):
+    storage = JsonStorage(str(tmp_path)).open()
+    storage.save_session({'session_id': 'S2', 'dosen_id': 'D1', 'is_active': True, 'mahasiswa_absen': []})
+    writer = GroupCommitWriter(storage, max_batch=64, interval=0.02).start()
+    items = [({'id': f"B{i}", 'nama': f"Mhs {i}", 'tanggal': '2025-11-13', 'session_id': 'S2'}, False, 'S2', f"M{i}")
+             for i in range(40)]
+    items.append(({'id': 'B0x', 'nama': 'Mhs 0', 'tanggal': '2025-11-13'}, True, None, None))
+    results = writer.add_attendance_many(items)
+    writer.stop()
+
+    assert results == [True] * 40 + [False]
+    assert writer.batches == 1
+    assert len(storage.get_session('S2')['mahasiswa_absen']) == 40
+    print("[OK] add_attendance_many: satu group commit")
+
+
+def test_once_dedup_across_processes(tmp_path):
+    """Dua proses worker (dua koneksi + writer) di database yang sama: (tanggal, nama) hanya tercatat sekali"""
+    db = str(tmp_path / "absensi.db")
+    storages = [SqliteStorage(db).open(), SqliteStorage(db).open()]
+    writers = [GroupCommitWriter(storage, interval=0.001).start() for storage in storages]
+    results = []
+
+    def check_in(i):
+        record = {'id': f"D{i}", 'nama': 'Budi', 'tanggal': '2025-11-14', 'type': 'direct'}
+        results.append(writers[i % 2].add_attendance(record, once=True))
+
+    threads = [threading.Thread(target=check_in, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for writer in writers:
+        writer.stop()
+    assert sorted(results) == [False] * 19 + [True]
+    assert storages[0].count_attendance('2025-11-14') == 1
+    for storage in storages:
+        storage.close()
+    print("[OK] Dedup once di dalam transaksi storage")
+
+
+def test_atexit_registered_once(tmp_path, monkeypatch):
+    import atexit
+    registered = []
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    writer = GroupCommitWriter(JsonStorage(str(tmp_path)).open())
+    for _ in range(3):
+        writer.start()
+        writer.stop()
+    assert registered == [writer.stop]
+    print("[OK] atexit hanya didaftarkan sekali")
@@ -0,0 +1,126 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class GroupCommitWriter:
+    """Single writer thread that group-commits attendance writes.
+
+    Request threads enqueue their attendance record (and the session it
+    belongs to) and block until the batch containing it is durable. The
+    writer drains the queue for up to `interval` seconds or `max_batch`
+    items and hands the whole batch to `storage.commit_batch`, so a burst
+    of N check-ins costs one fsync / one sessions rewrite instead of N.
+    Because there is only one writer, concurrent check-ins can no longer
+    overwrite each other's session updates.
+    """
+
+    def __init__(self, storage, max_batch=64, interval=0.01):
+        self.storage = storage
+        self.max_batch = max_batch
+        self.interval = interval
+        self.batches = 0
+        self.records = 0
+        self.last_batch_size = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopped = False
+        self._atexit_registered = False
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+                self._thread.start()
+                if not self._atexit_registered:
+                    atexit.register(self.stop)
+                    self._atexit_registered = True
+        return self
+
+    def stop(self, timeout=5):
+        if self._thread is None:
+            return
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def add_attendance(self, record, once=False, session_id=None, mahasiswa_id=None, timeout=None):
+        """Queue one record and wait until it is committed.
+
+        With `once=True` the record is skipped if the same nama already
+        attended on that tanggal (checked by storage inside the commit);
+        such records are meant for check-ins outside a session and never
+        update `mahasiswa_absen`. Returns True if the record was written. The wait has no timeout by
+        default: a record that is already queued is committed anyway, so
+        giving up early would report a failure for a check-in that lands.
+        """
+        future = Future()
+        self._queue.put((record, once, session_id, mahasiswa_id, future))
+        if self._thread is None:
+            self.start()
+        return future.result(timeout)
+
+    def add_attendance_many(self, items, timeout=None):
+        """Queue several `(record, once, session_id, mahasiswa_id)` items at
+        once so they land in the same group commit; returns one bool each."""
+        futures = []
+        for record, once, session_id, mahasiswa_id in items:
+            future = Future()
+            self._queue.put((record, once, session_id, mahasiswa_id, future))
+            futures.append(future)
+        if self._thread is None:
+            self.start()
+        return [future.result(timeout) for future in futures]
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                if self._stopped:
+                    return
+                continue
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if self._stopped and self._queue.empty():
+                return
+
+    def _commit(self, batch):
+        records = [record for record, *_ in batch]
+        once = [i for i, (_, once, *_) in enumerate(batch) if once]
+        session_attended = {}
+        for _, once_item, session_id, mahasiswa_id, _ in batch:
+            # Record `once` bisa dilewati storage, jadi tidak ikut mengubah mahasiswa_absen
+            if session_id and mahasiswa_id and not once_item:
+                session_attended.setdefault(session_id, []).append(mahasiswa_id)
+        try:
+            results = self.storage.commit_batch(records, session_attended, once=once)
+        except Exception as e:
+            print(f"[ERROR] Group commit: {e}")
+            for *_, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.records += sum(results)
+        self.last_batch_size = len(batch)
+        for (*_, future), written in zip(batch, results):
+            future.set_result(written)
@@ -1,5 +1,6 @@
 import 'package:flutter/material.dart';
 import 'package:camera/camera.dart';
+import 'dart:async';
 import 'dart:convert';
 import '../services/api_service.dart';
 import '../models/user.dart';
@@ -18,6 +19,7 @@ class _DosenAttendanceSessionState extends State<DosenAttendanceSession> {
   bool _isCameraInitialized = false;
   bool _isProcessing = false;
   Map<String, dynamic>? _sessionData;
+  Timer? _qrTimer;
   String? _statusMessage;
   bool _isSuccess = false;
 
@@ -75,6 +77,7 @@ class _DosenAttendanceSessionState extends State<DosenAttendanceSession> {
             _statusMessage = 'Sesi absen berhasil dimulai!';
             _isSuccess = true;
           });
+          _scheduleQrRefresh();
         } else {
           _showMessage(result['message'] ?? 'Gagal memulai sesi absen', false);
         }
@@ -88,6 +91,31 @@ class _DosenAttendanceSessionState extends State<DosenAttendanceSession> {
     }
   }
 
+  // Token di QR code berganti berkala; ambil QR baru saat token lama kadaluarsa
+  void _scheduleQrRefresh() {
+    _qrTimer?.cancel();
+    final expiresIn = (_sessionData?['expires_in'] as num?)?.toInt() ?? 60;
+    _qrTimer = Timer(Duration(seconds: expiresIn + 1), _refreshQr);
+  }
+
+  Future<void> _refreshQr() async {
+    final sessionId = _sessionData?['session_id'];
+    if (sessionId == null) return;
+    final result = await ApiService.getSessionQr(sessionId);
+    if (!mounted) return;
+    if (result['success'] == true) {
+      setState(() {
+        _sessionData = {..._sessionData!, ...result['data']};
+      });
+      _scheduleQrRefresh();
+    } else if (result['message'] != null &&
+        result['message'].toString().contains('berakhir')) {
+      _showMessage(result['message'], false);
+    } else {
+      _qrTimer = Timer(const Duration(seconds: 5), _refreshQr);
+    }
+  }
+
   void _showMessage(String message, bool isSuccess) {
     setState(() {
       _statusMessage = message;
@@ -106,6 +134,7 @@ class _DosenAttendanceSessionState extends State<DosenAttendanceSession> {
 
   @override
   void dispose() {
+    _qrTimer?.cancel();
     _cameraController.dispose();
     super.dispose();
   }
@@ -118,6 +118,18 @@ class ApiService {
     }
   }
 
+  // QR CODE SESI (token berganti berkala)
+  static Future<Map<String, dynamic>> getSessionQr(String sessionId) async {
+    try {
+      final response = await http.get(
+        Uri.parse('$baseUrl/sessions/$sessionId/qr'),
+      );
+      return jsonDecode(response.body);
+    } catch (e) {
+      return {'success': false, 'message': 'Koneksi gagal: ${e.toString()}'};
+    }
+  }
+
   // ABSENSI MAHASISWA
   static Future<Map<String, dynamic>> mahasiswaAttendance(String mahasiswaId,
       String sessionId, String barcodeData, String imageBase64) async {